@@ -13,13 +13,13 @@
 #    under the License.
 
 import os
-import time
 import unittest
 
 from keystoneclient.v2_0 import client as keystone_client
 from novaclient import client as nova_client
 from cinderclient import client as cinder_client
 
+from mos_tests.functions import bulk
 from mos_tests.functions import common as common_functions
 
 
@@ -71,8 +71,8 @@ class CinderIntegrationTests(unittest.TestCase):
 
     def tearDown(self):
         try:
-            for snapshot in self.snapshot_list:
-                common_functions.delete_volume_snapshot(self.cinder, snapshot)
+            bulk.delete_snapshots(self.cinder,
+                                  [x.id for x in self.snapshot_list])
             self.snapshot_list = []
             for volume in self.volume_list:
                 common_functions.delete_volume(self.cinder, volume)
@@ -99,41 +99,23 @@ class CinderIntegrationTests(unittest.TestCase):
 
         # 2. Creation of 70 snapshots
         count = 70
-        initial_snapshot_lst = []
-        for num in xrange(count):
-            snapshot_id = self.cinder.volume_snapshots \
-                .create(volume.id, name='1st_creation_{0}'.format(num))
-            initial_snapshot_lst.append(snapshot_id)
-            self.assertTrue(
-                common_functions.check_volume_snapshot_status(self.cinder,
-                                                              snapshot_id,
-                                                              'available',
-                                                              timeout=60))
-        self.snapshot_list.extend(initial_snapshot_lst)
+        metrics = bulk.BulkMetrics()
+        with metrics.phase('1st_creation', count):
+            snapshots, latencies = bulk.create_snapshots(
+                self.cinder, volume.id, count, name='1st_creation',
+                timeout=count * 10, snapshot_list=self.snapshot_list)
+            metrics.add('1st_creation', latencies.values())
 
         # 3. Delete all snapshots
-        for snapshot in initial_snapshot_lst:
-            self.cinder.volume_snapshots.delete(snapshot)
+        bulk.delete_snapshots(self.cinder, [x.id for x in snapshots],
+                              wait=False)
 
         # 4. Launch creation of 50 snapshot without waiting of deletion
         new_count = 50
-        new_snapshot_lst = []
-        for num in xrange(new_count):
-            snapshot_id = self.cinder.volume_snapshots \
-                .create(volume.id, name='2nd_creation_{0}'.format(num))
-            new_snapshot_lst.append(snapshot_id)
-        self.snapshot_list.extend(new_snapshot_lst)
-
-        timeout = time.time() + (new_count + count) * 10
-        while [s.status for s in self.cinder.volume_snapshots.list() if
-               s in new_snapshot_lst].count('available') != new_count:
-            if time.time() < timeout:
-                time.sleep(10)
-            else:
-                unavailable = [s.id for s in
-                               self.cinder.volume_snapshots.list() if
-                               s.status != 'available']
-                raise AssertionError(
-                    "All snapshots must be available. "
-                    "List of unavailable snapshots:\n\t{0}".format(
-                        "\n\t".join(unavailable)))
+        with metrics.phase('2nd_creation', new_count):
+            _, latencies = bulk.create_snapshots(
+                self.cinder, volume.id, new_count, name='2nd_creation',
+                timeout=(new_count + count) * 10,
+                snapshot_list=self.snapshot_list)
+            metrics.add('2nd_creation', latencies.values())
+        metrics.log_report()
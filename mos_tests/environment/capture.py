@@ -0,0 +1,169 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import socket
+import threading
+import time
+
+from mos_tests.functions import pcap
+
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureError(Exception):
+    """Raised if tcpdump can't be started"""
+
+
+class LiveCapture(object):
+    """Remote tcpdump, which streams packets over ssh channel
+
+    pcap data is read from tcpdump stdout and decoded on the fly, so nothing
+    is written to node disk and test can wait for expected packet instead
+    of capturing for fixed time:
+
+        with LiveCapture(remote, '-i any port 4789') as capture:
+            # generate traffic
+            packet = capture.wait_for(pcap.icmp(src, dst, vni=vni))
+    """
+
+    chunk_size = 32 * 1024
+
+    def __init__(self, remote, args='', count=None, max_bytes=None,
+                 start_timeout=30):
+        """
+        :param remote: SSHClient instance
+        :param args: tcpdump arguments (interface, BPF filter, etc)
+        :param count: stop capture after `count` packets
+        :param max_bytes: stop capture after `max_bytes` bytes of pcap data
+        :param start_timeout: time to wait for tcpdump start listening
+        """
+        self.remote = remote
+        self.args = args
+        self.count = count
+        self.max_bytes = max_bytes
+        self.start_timeout = start_timeout
+        self.packets = []
+        self.bytes_read = 0
+        self.finished = False
+        self.pid = None
+        self._chan = None
+        self._thread = None
+        self._stream = pcap.PcapStream()
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *err):
+        self.stop()
+
+    def _make_command(self):
+        cmd = 'tcpdump -U -w - {0}'.format(self.args)
+        if self.count is not None:
+            cmd += ' -c {0}'.format(self.count)
+        # pid is printed to stderr to keep stdout clean pcap stream
+        return 'echo $$ >&2; exec {0}'.format(cmd)
+
+    def start(self):
+        self._chan, _, _, stderr = self.remote.execute_async(
+            self._make_command())
+        self._chan.settimeout(self.start_timeout)
+        lines = []
+        try:
+            self.pid = int(stderr.readline())
+            # tcpdump reports to stderr when it's ready to capture
+            while True:
+                line = stderr.readline()
+                if not line or 'listening on' in line:
+                    break
+                lines.append(line)
+        except (socket.timeout, ValueError) as e:
+            self._chan.close()
+            raise CaptureError('tcpdump is not started: {0!r}'.format(e))
+        if not line:
+            self._chan.close()
+            raise CaptureError('tcpdump is not started: {0}'.format(
+                ''.join(lines)))
+        self._chan.settimeout(None)
+        logger.info('Capture started on {0.host}: {1}'.format(self.remote,
+                                                              line.strip()))
+        self._thread = threading.Thread(target=self._read)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read(self):
+        try:
+            while True:
+                data = self._chan.recv(self.chunk_size)
+                if not data:
+                    break
+                self.bytes_read += len(data)
+                packets = self._stream.feed(data)
+                if packets:
+                    with self._cond:
+                        self.packets.extend(packets)
+                        self._cond.notify_all()
+                if (self.max_bytes is not None and
+                        self.bytes_read >= self.max_bytes):
+                    logger.info('Capture bytes limit is reached')
+                    break
+        except Exception:
+            logger.exception('Capture reading failed')
+        finally:
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+
+    def stop(self, timeout=10):
+        """Stop tcpdump and wait for the rest of captured packets"""
+        if self._thread is None:
+            return
+        # SIGINT makes tcpdump to flush buffers and exit, it can be already
+        # stopped by packets count limit
+        self.remote.execute('kill -INT {0} 2>/dev/null'.format(self.pid))
+        self._thread.join(timeout)
+        self._chan.close()
+        self._thread = None
+        logger.info('Capture stopped on {0.host}: {1} packets, {2} '
+                    'bytes'.format(self.remote, len(self.packets),
+                                   self.bytes_read))
+
+    def filter(self, predicate):
+        """Returns list of captured packets for which predicate is True"""
+        with self._cond:
+            return [x for x in self.packets if predicate(x)]
+
+    def wait_for(self, predicate, timeout=30):
+        """Wait for packet matched to predicate
+
+        Returns as soon as such packet is captured, or on timeout or capture
+        end.
+
+        :returns: matched packet or None
+        """
+        deadline = time.time() + timeout
+        checked = 0
+        with self._cond:
+            while True:
+                for packet in self.packets[checked:]:
+                    if predicate(packet):
+                        return packet
+                checked = len(self.packets)
+                remaining = deadline - time.time()
+                if self.finished or remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
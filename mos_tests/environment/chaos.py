@@ -0,0 +1,351 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+from collections import OrderedDict
+import itertools
+import logging
+import threading
+import time
+
+from waiting import wait
+
+from mos_tests.functions import stats
+
+
+logger = logging.getLogger(__name__)
+
+
+class Fault(object):
+    """Fault action, injected on node `node` (fqdn)
+
+    `rollback_command` is executed after `hold` seconds, faults without it
+    are reverted by cluster itself (pacemaker restarts killed process).
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    action = None
+
+    def __init__(self, node, hold=5):
+        self.node = node
+        self.hold = hold
+
+    @abc.abstractproperty
+    def command(self):
+        """Shell command, which injects fault"""
+
+    rollback_command = None
+
+    def __repr__(self):
+        return '<{0} {1}>'.format(self.action, self.node)
+
+
+class PcsBan(Fault):
+    """Ban pacemaker resource on node, rollback - clear ban"""
+
+    action = 'pcs_ban'
+
+    def __init__(self, node, resource, hold=5):
+        super(PcsBan, self).__init__(node, hold=hold)
+        self.resource = resource
+
+    @property
+    def command(self):
+        return 'pcs resource ban {0} {1}'.format(self.resource, self.node)
+
+    @property
+    def rollback_command(self):
+        return 'pcs resource clear {0} {1}'.format(self.resource, self.node)
+
+    def __repr__(self):
+        return '<{0} {1} {2}>'.format(self.action, self.resource, self.node)
+
+
+class PcsClear(PcsBan):
+    """Clear ban of pacemaker resource on node"""
+
+    action = 'pcs_clear'
+    rollback_command = None
+
+    @property
+    def command(self):
+        return 'pcs resource clear {0} {1}'.format(self.resource, self.node)
+
+
+class KillProcess(Fault):
+    """Kill process by name (`killall dnsmasq`, agent kill)"""
+
+    action = 'kill'
+
+    def __init__(self, node, process, signal='KILL', hold=0):
+        super(KillProcess, self).__init__(node, hold=hold)
+        self.process = process
+        self.signal = signal
+
+    @property
+    def command(self):
+        # bracket expression prevents matching of ssh shell command line,
+        # missing process is not an error
+        return "pkill -{0} -f '[{1}]{2}' || true".format(
+            self.signal, self.process[0], self.process[1:])
+
+    def __repr__(self):
+        return '<{0} {1} {2}>'.format(self.action, self.process, self.node)
+
+
+class KillAll(KillProcess):
+    """Kill all processes with exact name"""
+
+    action = 'killall'
+
+    @property
+    def command(self):
+        return 'killall -{0} {1} || true'.format(self.signal, self.process)
+
+
+class IptablesDrop(Fault):
+    """Drop outgoing tcp traffic to port (rabbit 5673 by default)"""
+
+    action = 'iptables_drop'
+
+    def __init__(self, node, port=5673, hold=30):
+        super(IptablesDrop, self).__init__(node, hold=hold)
+        self.port = port
+
+    @property
+    def command(self):
+        return 'iptables -I OUTPUT 1 -p tcp --dport {0} -j DROP'.format(
+            self.port)
+
+    @property
+    def rollback_command(self):
+        return 'iptables -D OUTPUT -p tcp --dport {0} -j DROP'.format(
+            self.port)
+
+
+FAULTS = {cls.action: cls for cls in (PcsBan, PcsClear, KillProcess, KillAll,
+                                      IptablesDrop)}
+
+
+def make_fault(spec):
+    """Create fault from dict like
+    {'action': 'pcs_ban', 'node': 'node-1.test.domain.local',
+     'resource': 'p_neutron-dhcp-agent', 'hold': 10}
+    """
+    spec = dict(spec)
+    return FAULTS[spec.pop('action')](**spec)
+
+
+class ChaosScheduler(object):
+    """Run fault cycles with fixed rate and concurrency across nodes
+
+        faults = [{'action': 'pcs_ban', 'node': fqdn,
+                   'resource': 'p_neutron-dhcp-agent'},
+                  {'action': 'killall', 'node': fqdn, 'process': 'dnsmasq'}]
+        with ChaosScheduler(env, faults, rate=0.5, concurrency=2,
+                            converge=is_converged) as chaos:
+            chaos.run(count=20)
+        assert not chaos.failed
+
+    Each cycle injects fault, holds it, rolls it back and waits until
+    `converge(fault)` is True. New cycle is started each `1 / rate` seconds
+    if there are less than `concurrency` cycles in progress and fault node
+    is not busy with other cycle. Faults are taken from list in round-robin
+    manner. Injected faults are tracked and rolled back on exit, even if
+    test fails in the middle of storm.
+    """
+
+    def __init__(self, env, faults, rate=1., concurrency=1, converge=None,
+                 converge_timeout=3 * 60, poll_interval=1):
+        """
+        :param env: fuel_client.Environment instance
+        :param faults: list of Fault instances or dicts for `make_fault`
+        :param rate: count of cycles to start per second
+        :param concurrency: max count of simultaneous cycles
+        :param converge: callable, takes fault and returns True if system
+            is recovered after it
+        """
+        self.env = env
+        self.faults = [x if isinstance(x, Fault) else make_fault(x)
+                       for x in faults]
+        self.rate = rate
+        self.concurrency = concurrency
+        self.converge = converge
+        self.converge_timeout = converge_timeout
+        self.poll_interval = poll_interval
+        self.cycles = []
+        self.injected = []
+        self.started_at = None
+        self.finished_at = None
+        self._busy = set()
+        self._threads = []
+        self._lock = threading.Condition()
+
+    def _execute(self, node, command):
+        logger.info('Chaos: `{0}` on {1}'.format(command, node))
+        with self.env.find_node_by_fqdn(node).ssh() as remote:
+            return remote.check_call(command)
+
+    def _inject(self, fault):
+        with self._lock:
+            self.injected.append(fault)
+        self._execute(fault.node, fault.command)
+        if fault.rollback_command is None:
+            with self._lock:
+                self.injected.remove(fault)
+
+    def _rollback(self, fault):
+        with self._lock:
+            if fault not in self.injected:
+                return
+            self.injected.remove(fault)
+        self._execute(fault.node, fault.rollback_command)
+
+    def _cycle(self, fault, cycle):
+        start = time.time()
+        try:
+            self._inject(fault)
+            cycle['injected'] = time.time() - start
+            time.sleep(fault.hold)
+            self._rollback(fault)
+            cycle['rolled_back'] = time.time() - start
+            if self.converge is not None:
+                wait(lambda: self.converge(fault),
+                     timeout_seconds=self.converge_timeout,
+                     sleep_seconds=self.poll_interval,
+                     expected_exceptions=Exception,
+                     waiting_for='convergence after {0!r}'.format(fault))
+            cycle['converged'] = time.time() - start
+            cycle['convergence'] = cycle['converged'] - cycle['rolled_back']
+        except Exception as e:
+            logger.exception('Chaos cycle {0!r} failed'.format(fault))
+            cycle['error'] = repr(e)
+        finally:
+            with self._lock:
+                self._busy.discard(fault.node)
+                self._lock.notify_all()
+
+    def _next_fault(self, faults):
+        """Returns next fault, which node is free, or None"""
+        for _ in range(len(self.faults)):
+            fault = next(faults)
+            if fault.node not in self._busy:
+                return fault
+        return None
+
+    def run(self, count=None, duration=None):
+        """Run fault cycles
+
+        :param count: count of cycles, len(faults) by default
+        :param duration: stop start new cycles after `duration` seconds
+        """
+        if count is None and duration is None:
+            count = len(self.faults)
+        self.started_at = time.time()
+        deadline = None if duration is None else self.started_at + duration
+        faults = itertools.cycle(self.faults)
+        next_start = self.started_at
+        while count is None or len(self.cycles) < count:
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(max(next_start - time.time(), 0))
+            # cycles can't take longer than join timeout, so if there is no
+            # free node after it, some cycle hangs
+            free_deadline = time.time() + self.cycle_timeout
+            if deadline is not None:
+                free_deadline = min(free_deadline, deadline)
+            with self._lock:
+                fault = None
+                while fault is None and time.time() < free_deadline:
+                    if len(self._busy) < self.concurrency:
+                        fault = self._next_fault(faults)
+                    if fault is None:
+                        self._lock.wait(self.poll_interval)
+                if fault is None:
+                    logger.warning('Chaos: there is no free node to inject '
+                                   'fault, stop storm')
+                    break
+                self._busy.add(fault.node)
+            cycle = OrderedDict([('fault', repr(fault)),
+                                 ('started', time.time() - self.started_at)])
+            self.cycles.append(cycle)
+            thread = threading.Thread(target=self._cycle, args=(fault, cycle))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+            next_start = max(next_start + 1. / self.rate, time.time())
+        self.join()
+
+    @property
+    def cycle_timeout(self):
+        """Max expected duration of one cycle"""
+        return (max(x.hold for x in self.faults) + self.converge_timeout +
+                60)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join(self.cycle_timeout)
+        self.finished_at = time.time()
+
+    def rollback_all(self):
+        """Rollback all faults which are still injected"""
+        for fault in list(self.injected):
+            try:
+                self._rollback(fault)
+            except Exception:
+                logger.exception('Rollback of {0!r} failed'.format(fault))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.rollback_all()
+        self.log_report()
+
+    @property
+    def failed(self):
+        return [x for x in self.cycles if 'error' in x or
+                'converged' not in x]
+
+    def report(self):
+        """Returns convergence statistics of storm
+
+        `throughput` is count of converged cycles per minute.
+        """
+        converged = [x for x in self.cycles if 'converged' in x]
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return OrderedDict([
+            ('cycles', len(self.cycles)),
+            ('converged', len(converged)),
+            ('failed', len(self.failed)),
+            ('elapsed', elapsed),
+            ('throughput', 60. * len(converged) / elapsed if elapsed else 0),
+            ('convergence', stats.summary(
+                [x['convergence'] for x in converged])),
+        ])
+
+    def log_report(self):
+        if self.started_at is None:
+            return
+        result = self.report()
+        convergence = result['convergence']
+        logger.info(
+            'Chaos: {converged} of {cycles} cycles converged in '
+            '{elapsed:.1f}s ({throughput:.2f} per minute), convergence '
+            'p50/p95/max {p50}/{p95}/{max}s'.format(
+                p50=convergence.get('p50'), p95=convergence.get('p95'),
+                max=convergence.get('max'), **result))
+        for cycle in self.failed:
+            logger.info('Chaos failed cycle: {0}'.format(dict(cycle)))
@@ -0,0 +1,97 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import time
+
+from mos_tests.environment.devops_client import DevopsClient
+from mos_tests.environment.fuel_client import FuelClient
+from mos_tests.environment.os_actions import OpenStackActions
+from mos_tests.settings import KEYSTONE_PASS
+from mos_tests.settings import KEYSTONE_USER
+from mos_tests.settings import SSH_CREDENTIALS
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClientsCache(object):
+    """Cache of Fuel and OpenStack clients for several tests
+
+    Before returning cached client it is cheaply checked for validity. Client
+    is rebuilt after snapshot revert, cluster change, nodes power actions or
+    keystone token expiration.
+    """
+
+    # rebuild OpenStack clients if token will expire in this time (seconds)
+    token_stale_duration = 5 * 60
+
+    def __init__(self):
+        self.fuel = None
+        self.env = None
+        self.os_conn = None
+        self._fuel_built_at = 0
+        self._os_conn_built_at = 0
+
+    def get_fuel(self, ip):
+        """Returns FuelClient for Fuel master ip"""
+        if (self.fuel is None or self.fuel.admin_ip != ip or
+                DevopsClient.last_revert_time > self._fuel_built_at):
+            logger.debug('Build new Fuel client')
+            self.fuel = FuelClient(ip=ip,
+                                   login=KEYSTONE_USER,
+                                   password=KEYSTONE_PASS,
+                                   ssh_login=SSH_CREDENTIALS['login'],
+                                   ssh_password=SSH_CREDENTIALS['password'])
+            self._fuel_built_at = time.time()
+            self.env = None
+        return self.fuel
+
+    def get_env(self, fuel):
+        """Returns Environment of latest cluster"""
+        if self.env is None or self.env.connection is not fuel.api:
+            self.env = fuel.get_last_created_cluster()
+        else:
+            clusters = fuel.api.get_request('clusters/')
+            if not clusters or clusters[-1]['id'] != self.env.id:
+                logger.debug('Latest cluster is changed')
+                self.env = fuel.get_last_created_cluster()
+        return self.env
+
+    def _is_os_conn_valid(self, env):
+        if self.os_conn is None or self.os_conn.env is not env:
+            return False
+        if DevopsClient.last_revert_time > self._os_conn_built_at:
+            return False
+        if env.last_power_event > self._os_conn_built_at:
+            return False
+        auth_ref = self.os_conn.keystone.auth_ref
+        return not auth_ref.will_expire_soon(
+            stale_duration=self.token_stale_duration)
+
+    def get_os_conn(self, env):
+        """Returns OpenStackActions for env"""
+        if not self._is_os_conn_valid(env):
+            logger.debug('Build new OpenStack clients')
+            if self.os_conn is not None:
+                self.os_conn.close()
+            self.os_conn = OpenStackActions(
+                controller_ip=env.get_primary_controller_ip(),
+                cert=env.certificate, env=env)
+            self._os_conn_built_at = time.time()
+        return self.os_conn
+
+    def close(self):
+        if self.os_conn is not None:
+            self.os_conn.close()
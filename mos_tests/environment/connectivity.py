@@ -0,0 +1,179 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+import logging
+import re
+import time
+
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_ping_output(lines):
+    """Parse busybox or iputils ping output
+
+    :returns: dict with `transmitted`, `received`, `loss` (percents) and
+        `rtt` (average round trip time in ms or None) keys
+    """
+    text = '\n'.join(lines)
+    result = {'transmitted': 0, 'received': 0, 'loss': 100, 'rtt': None}
+    stats = re.search(r'(\d+) packets transmitted, (\d+) (?:packets )?'
+                      r'received', text)
+    if stats:
+        transmitted, received = [int(x) for x in stats.groups()]
+        result.update(transmitted=transmitted, received=received)
+        if transmitted:
+            result['loss'] = 100 * (transmitted - received) // transmitted
+    rtt = re.search(r'min/avg/max[^=]*= [\d.]+/([\d.]+)/', text)
+    if rtt:
+        result['rtt'] = float(rtt.group(1))
+    return result
+
+
+class ConnectivityMesh(object):
+    """All-pairs connectivity check between instances
+
+    Each source instance is accessed with one ssh session and pings all
+    its targets simultaneously in background, all sources are processed
+    in parallel. Result is matrix of cells:
+
+        {'server01': {'192.168.1.4': {'reachable': True, 'loss': 0,
+                                      'rtt': 0.83, 'error': None}}}
+
+    Only failed cells are rechecked until timeout is reached.
+    """
+
+    def __init__(self, os_conn, env, vm_keypair=None, username='cirros',
+                 password='cubswin:)', count=3):
+        """
+        :param os_conn: OpenStackActions instance
+        :param env: fuel_client.Environment instance
+        :param vm_keypair: keypair used during instances creating
+        :param count: count of ping packets to each target
+        """
+        self.os_conn = os_conn
+        self.env = env
+        self.vm_keypair = vm_keypair
+        self.username = username
+        self.password = password
+        self.count = count
+
+    def _make_command(self, ips):
+        ips = ' '.join(ips)
+        return ('cd /tmp; '
+                'for ip in {ips}; do '
+                'ping -c {count} $ip > mesh_$ip.log 2>&1 & '
+                'done; wait; '
+                'for ip in {ips}; do '
+                'echo "### $ip"; cat mesh_$ip.log; rm -f mesh_$ip.log; '
+                'done').format(ips=ips, count=self.count)
+
+    def ping_from(self, server, ips):
+        """Ping all `ips` from server simultaneously
+
+        :returns: dict with ip as key and cell as value
+        """
+        with self.os_conn.ssh_to_instance(self.env, server, self.vm_keypair,
+                                          username=self.username,
+                                          password=self.password) as remote:
+            result = remote.execute(self._make_command(ips))
+        outputs = OrderedDict((ip, []) for ip in ips)
+        current = None
+        for line in result['stdout']:
+            if line.startswith('### '):
+                current = outputs.get(line[4:].strip())
+            elif current is not None:
+                current.append(line)
+        cells = {}
+        for ip, lines in outputs.items():
+            stats = parse_ping_output(lines)
+            cells[ip] = {'reachable': stats['received'] > 0,
+                         'loss': stats['loss'],
+                         'rtt': stats['rtt'],
+                         'error': None}
+        return cells
+
+    def get_targets(self, servers, extra_ips=()):
+        """Returns list of (server, ips to ping from it) pairs"""
+        servers_ips = {
+            x.id: list(self.os_conn.get_nova_instance_ips(x).values())
+            for x in servers}
+        targets = []
+        for server in servers:
+            ips = list(extra_ips)
+            for other in servers:
+                if other.id != server.id:
+                    ips += servers_ips[other.id]
+            targets.append((server, ips))
+        return targets
+
+    def check(self, servers, extra_ips=(), timeout=3 * 60, interval=5):
+        """Check connectivity from each server to other servers and ips
+
+        :param servers: list of nova servers
+        :param extra_ips: list of additional ips to ping from each server
+        :param timeout: time to wait for all cells to become reachable
+        :returns: connectivity matrix
+        """
+        targets = self.get_targets(servers, extra_ips)
+        matrix = OrderedDict(
+            (server.name, OrderedDict(
+                (ip, {'reachable': False, 'loss': 100, 'rtt': None,
+                      'error': 'not checked'}) for ip in ips))
+            for server, ips in targets)
+        deadline = time.time() + timeout
+        while True:
+            pending = [(server, [ip for ip in ips
+                                 if not matrix[server.name][ip]['reachable']])
+                       for server, ips in targets]
+            pending = [(server, ips) for server, ips in pending if ips]
+            if not pending:
+                break
+            logger.info('Check connectivity from {0}'.format(
+                [x.name for x, _ in pending]))
+            results = parallel_map(lambda x: self.ping_from(*x), pending,
+                                   raise_on_error=False)
+            for (server, ips), cells in zip(pending, results):
+                if isinstance(cells, Exception):
+                    for ip in ips:
+                        matrix[server.name][ip]['error'] = repr(cells)
+                else:
+                    matrix[server.name].update(cells)
+            if time.time() + interval > deadline:
+                break
+            time.sleep(interval)
+        return matrix
+
+    @staticmethod
+    def get_failed(matrix):
+        """Returns list of (source, destination, cell) for failed cells"""
+        return [(source, ip, cell)
+                for source, cells in matrix.items()
+                for ip, cell in cells.items()
+                if not cell['reachable']]
+
+    @staticmethod
+    def format_matrix(matrix):
+        """Returns text table with loss and rtt for each cell"""
+        lines = []
+        for source, cells in matrix.items():
+            lines.append('{0}:'.format(source))
+            for ip, cell in cells.items():
+                lines.append('    {0:<16} {1}'.format(
+                    ip, 'loss {loss}%, rtt {rtt} ms'.format(**cell)
+                    if cell['error'] is None else cell['error']))
+        return '\n'.join(lines)
@@ -12,9 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 """Virtual test env setup and so on."""
+from collections import OrderedDict
+import json
 import logging
+import socket
+import time
 
 from devops.models import Environment
+from waiting import wait
+
+from mos_tests.environment.readiness import PACEMAKER_FAILURE_RE
+from mos_tests.functions.parallel import parallel_map
 
 logger = logging.getLogger(__name__)
 
@@ -22,14 +30,24 @@ logger = logging.getLogger(__name__)
 class DevopsClient(object):
     """Method to work with the virtual env over fuel-devops."""
 
+    # caches of devops envs and node indexes, key is env_name
+    _envs = {}
+    _indexes = {}
+
+    # time of last snapshot revert start
+    last_revert_time = 0
+
     @classmethod
     def get_env(cls, env_name=''):
         """Find and return env by name.
 
         If name is empty will try to find the last created env.
         Will return None is failed to find any env at all.
+        Found env is cached, use `invalidate` to drop cache.
         """
-        env = None
+        env = cls._envs.get(env_name)
+        if env is not None:
+            return env
         try:
             if env_name:
                 env = Environment.get(name=env_name)
@@ -39,37 +57,192 @@ class DevopsClient(object):
             logger.error('failed to find the last created environment{}'.
                          format(e))
             raise
+        if env is not None:
+            cls._envs[env_name] = env
         return env
 
     @classmethod
-    def revert_snapshot(cls, env_name='', snapshot_name=''):
-        """Resume the env and revert the snapshot.
+    def invalidate(cls, env_name=None):
+        """Drop cached env and node indexes (all if env_name is None)"""
+        if env_name is None:
+            cls._envs.clear()
+            cls._indexes.clear()
+        else:
+            cls._envs.pop(env_name, None)
+            cls._indexes.pop(env_name, None)
+
+    @classmethod
+    def _get_indexes(cls, env_name, rebuild=False):
+        """Returns dict with nodes indexes by admin mac and by name"""
+        if rebuild or env_name not in cls._indexes:
+            env = cls.get_env(env_name)
+            by_mac = {}
+            for node in env.nodes().slaves:
+                for interface in node.interface_by_network_name('admin'):
+                    by_mac[interface.mac_address] = node
+            by_name = {node.name: node for node in env.get_nodes()}
+            cls._indexes[env_name] = {'mac': by_mac, 'name': by_name}
+        return cls._indexes[env_name]
+
+    @classmethod
+    def _find_node(cls, env_name, index, key):
+        node = cls._get_indexes(env_name)[index].get(key)
+        if node is None:
+            # env nodes can be changed, so try to rebuild indexes once
+            node = cls._get_indexes(env_name, rebuild=True)[index].get(key)
+        return node
+
+    @classmethod
+    def get_last_snapshot_name(cls, env):
+        """Returns name of latest created snapshot of env"""
+        not_interested = ('ready', 'empty')
+        node = env.get_nodes()[0]
+        snapshots = [x for x in node.get_snapshots()
+                     if x.name not in not_interested]
+        snapshots.sort(key=lambda x: getattr(x, 'created', None))
+        return snapshots[-1].name
+
+    @classmethod
+    def revert_snapshot(cls, env_name='', snapshot_name='', timeout=20 * 60):
+        """Revert the snapshot, resume the env and wait it become ready.
 
         If the snapshot_name is empty
-        than just find the last created snaphost
-        Return True if the resume-revert is successfully done
-        False otherwise.
+        than just find the last created snaphost.
+        All nodes are reverted and resumed simultaneously, after that env
+        is considered ready when admin node accepts ssh connections, all
+        slaves are online in Fuel and pacemaker resources are started.
+        Return OrderedDict with duration (in seconds) of each stage.
         """
         env = cls.get_env(env_name)
-        not_interested = ['ready', 'empty']
-        snapshots = []
+        cls.last_revert_time = time.time()
+        deadline = time.time() + timeout
+        timings = OrderedDict()
+
+        def stage(name, func, *args):
+            start = time.time()
+            result = func(*args)
+            timings[name] = round(time.time() - start, 3)
+            return result
+
+        def remaining():
+            return max(deadline - time.time(), 1)
+
         try:
             if not snapshot_name:
-                for node in env.get_nodes():
-                    for snapshot in node.get_snapshots():
-                        if snapshot.name not in not_interested:
-                            snapshots.append(snapshot.name)
-                            not_interested.append(snapshot.name)
-                snapshot_name = snapshots[-1]
-            # TBD the calls below are non blocking once, need to add wait
+                snapshot_name = stage('find_snapshot',
+                                      cls.get_last_snapshot_name, env)
             logger.info("Reverting snapshot {0}".format(snapshot_name))
-            env.revert(snapshot_name, flag=False)
-            env.resume(verbose=False)
-            cls.sync_tyme(env)
+            nodes = env.get_nodes()
+            stage('revert', parallel_map,
+                  lambda node: node.revert(snapshot_name, destroy=True),
+                  nodes)
+            stage('resume', parallel_map,
+                  lambda node: node.resume(verbose=False), nodes)
+            admin_ip = cls.get_admin_node_ip(env_name=env.name)
+            stage('admin_ssh', cls.wait_ssh_banner, admin_ip, remaining())
+            with env.get_admin_remote() as remote:
+                slaves = stage('slaves_online', cls.wait_slaves_online,
+                               remote, remaining())
+                stage('time_sync', cls.sync_tyme, env, remote, slaves)
+                stage('pacemaker', cls.wait_pacemaker, remote, slaves,
+                      remaining())
         except Exception as e:
             logger.error('Can\'t revert snapshot due to error: {}'.
                          format(e))
             raise
+        logger.info('Snapshot {0} is reverted, timings: {1}'.format(
+            snapshot_name, dict(timings)))
+        return timings
+
+    @classmethod
+    def wait_ssh_banner(cls, ip, timeout=10 * 60, port=22):
+        """Wait until ssh server on ip sends protocol banner"""
+        def is_ssh_ready():
+            try:
+                sock = socket.create_connection((ip, port), timeout=5)
+            except socket.error:
+                return False
+            try:
+                return sock.recv(64).startswith(b'SSH-')
+            except socket.error:
+                return False
+            finally:
+                sock.close()
+
+        wait(is_ssh_ready, timeout_seconds=timeout, sleep_seconds=2,
+             waiting_for='ssh on {0} is ready'.format(ip))
+
+    @classmethod
+    def get_slaves(cls, remote):
+        """Returns list with Fuel nodes data (`fuel node --json`)"""
+        result = remote.execute('fuel node --json')
+        if result['exit_code'] != 0:
+            return None
+        return json.loads(''.join(result['stdout']))
+
+    @classmethod
+    def get_cluster_id(cls, remote):
+        """Returns id of latest cluster (`fuel env --json`) or None if
+        there is no clusters
+        """
+        result = remote.execute('fuel env --json')
+        if result['exit_code'] != 0:
+            raise ValueError('fuel env failed: {0}'.format(
+                ''.join(result['stderr'])))
+        clusters = json.loads(''.join(result['stdout']))
+        return clusters[-1]['id'] if clusters else None
+
+    @classmethod
+    def wait_slaves_online(cls, remote, timeout=10 * 60, cluster_id=None):
+        """Wait until all Fuel nodes of cluster are online
+
+        :param remote: ssh connection to admin node
+        :param cluster_id: id of cluster under test, latest cluster by
+            default
+        :returns: list with Fuel nodes data
+        """
+        slaves = []
+        cluster = {}
+        if cluster_id is not None:
+            cluster['id'] = cluster_id
+
+        def is_online():
+            try:
+                if 'id' not in cluster:
+                    cluster['id'] = cls.get_cluster_id(remote)
+                slaves[:] = [x for x in cls.get_slaves(remote) or [None]
+                             if x is None or cluster['id'] is None or
+                             x['cluster'] == cluster['id']]
+            except ValueError:
+                return False
+            return all(x and x['online'] for x in slaves)
+
+        wait(is_online, timeout_seconds=timeout, sleep_seconds=5,
+             waiting_for='all slaves are online')
+        return slaves
+
+    @classmethod
+    def wait_pacemaker(cls, remote, slaves, timeout=10 * 60):
+        """Wait until all pacemaker resources are started
+
+        :param remote: ssh connection to admin node
+        :param slaves: list with Fuel nodes data
+        """
+        controllers = [x['ip'] for x in slaves
+                       if 'controller' in x['roles']]
+        if not controllers:
+            return
+        cmd = 'ssh {0} "crm_mon -1 -r"'.format(controllers[0])
+
+        def is_converged():
+            result = remote.execute(cmd)
+            if result['exit_code'] != 0:
+                return False
+            return not any(PACEMAKER_FAILURE_RE.search(x)
+                           for x in result['stdout'])
+
+        wait(is_converged, timeout_seconds=timeout, sleep_seconds=10,
+             waiting_for='pacemaker resources are started')
 
     @classmethod
     def get_admin_node_ip(cls, env_name=''):
@@ -87,29 +260,24 @@ class DevopsClient(object):
         return admin_ip
 
     @classmethod
-    def sync_tyme(cls, env):
-        with env.get_admin_remote() as remote:
-            slaves_count = len(env.nodes().all) - 1
-            logger.info("sync time on master")
-            remote.execute('hwclock --hctosys')
-            logger.info("sync time on {} slaves".format(slaves_count))
-            remote.execute(
-                'for i in {{1..{0}}}; do ('
-                    'ssh node-$i "hwclock --hctosys"'
-                ') done'.format(slaves_count))
+    def sync_tyme(cls, env, remote=None, slaves=None):
+        """Sync time from hardware clock on all nodes simultaneously"""
+        if remote is None:
+            with env.get_admin_remote() as remote:
+                return cls.sync_tyme(env, remote, slaves)
+        if slaves is None:
+            slaves = cls.get_slaves(remote) or []
+        logger.info("sync time on master and {} slaves".format(len(slaves)))
+        remote.execute('hwclock --hctosys')
+        remote.execute(
+            'for ip in {0}; do '
+            'ssh $ip "hwclock --hctosys" & '
+            'done; wait'.format(' '.join(x['ip'] for x in slaves)))
 
     @classmethod
     def get_node_by_mac(cls, env_name, mac):
-        env = cls.get_env(env_name=env_name)
-        for node in env.nodes().slaves:
-            interfaces = node.interface_by_network_name('admin')
-            mac_addresses = [x.mac_address for x in interfaces]
-            if mac in mac_addresses:
-                return node
+        return cls._find_node(env_name, 'mac', mac)
 
     @classmethod
     def get_devops_node(cls, node_name='', env_name=''):
-        env = cls.get_env(env_name)
-        for node in env.get_nodes():
-            if node_name == node.name:
-                return node
+        return cls._find_node(env_name, 'name', node_name)
@@ -0,0 +1,222 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import Counter
+from collections import namedtuple
+from collections import OrderedDict
+import logging
+import time
+
+from mos_tests.environment.ssh import SSHClientPool
+from mos_tests.functions import stats
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+Lease = namedtuple('Lease', ['vm', 'ok', 'ip', 'server_id', 'server_host',
+                             'lease_time', 'latency', 'error'])
+
+# udhcpc script, which only prints lease without interface reconfiguration,
+# so ssh connection to instance is not affected
+SCRIPT_PATH = '/tmp/dhcp_probe.sh'
+SCRIPT = ('#!/bin/sh\n'
+          'echo "dhcp_probe $1 ip=$ip serverid=$serverid lease=$lease"\n')
+
+
+def parse_lease_line(line):
+    """Parse probe script output line
+
+    :returns: tuple (event, dict with ip, serverid, lease) or None
+    """
+    parts = line.split()
+    if len(parts) < 2 or parts[0] != 'dhcp_probe':
+        return None
+    values = dict(x.split('=', 1) for x in parts[2:] if '=' in x)
+    return parts[1], values
+
+
+class DhcpProber(object):
+    """Request DHCP leases on many instances at once
+
+    udhcpc runs on each instance with script, which prints lease instead of
+    interface configuring. Result of each probe is Lease with latency (from
+    request send to lease receive), DHCP server ip and host of DHCP agent
+    with this ip. One ssh session for each instance is kept in pool, so
+    repeated probes don't pay for connection.
+
+        prober = DhcpProber(os_conn, env, keypair)
+        leases = prober.probe(servers)
+        prober.check(leases)
+        prober.close()
+    """
+
+    def __init__(self, os_conn, env, keypair=None, username='cirros',
+                 password='cubswin:)', ssh_factory=None, interface='eth0',
+                 timeout=30, pool=None):
+        """
+        :param ssh_factory: callable, takes instance and returns SSHClient,
+            direct connection through DHCP namespace by default
+        :param timeout: udhcpc time limit for one probe in seconds
+        """
+        self.os_conn = os_conn
+        self.env = env
+        self.keypair = keypair
+        self.username = username
+        self.password = password
+        self.ssh_factory = ssh_factory or self._ssh_to_instance
+        self.interface = interface
+        self.timeout = timeout
+        self.pool = pool or SSHClientPool()
+        self._prepared = set()
+
+    def _ssh_to_instance(self, vm):
+        return self.os_conn.ssh_to_instance(self.env, vm, self.keypair,
+                                            username=self.username,
+                                            password=self.password)
+
+    def get_remote(self, vm):
+        return self.pool.get(vm.id, lambda: self.ssh_factory(vm))
+
+    @property
+    def command(self):
+        # 3 discover tries with `timeout / 3` seconds between them
+        return 'sudo udhcpc -f -q -n -i {0} -t 3 -T {1} -s {2}'.format(
+            self.interface, max(self.timeout // 3, 1), SCRIPT_PATH)
+
+    def _prepare(self, vm, remote):
+        if vm.id in self._prepared:
+            return
+        remote.check_call("printf '{0}' > {1} && chmod +x {1}".format(
+            SCRIPT.replace('\n', '\\n'), SCRIPT_PATH))
+        self._prepared.add(vm.id)
+
+    def get_dhcp_hosts(self):
+        """Returns dict with (network id, DHCP port ip) as keys and hosts of
+        DHCP ports as values (same ip may be used in different networks)
+        """
+        ports = self.os_conn.neutron.list_ports(
+            device_owner='network:dhcp')['ports']
+        return {(port['network_id'], ip['ip_address']): port['binding:host_id']
+                for port in ports for ip in port['fixed_ips']}
+
+    def get_networks(self, vms):
+        """Returns dict with (instance id, fixed ip) as keys and network ids
+        as values
+        """
+        if not vms:
+            return {}
+        ports = self.os_conn.neutron.list_ports(
+            device_id=[x.id for x in vms])['ports']
+        return {(port['device_id'], ip['ip_address']): port['network_id']
+                for port in ports for ip in port['fixed_ips']}
+
+    def _probe(self, vm):
+        remote = self.get_remote(vm)
+        self._prepare(vm, remote)
+        start = time.time()
+        chan, _, stdout, stderr = remote.execute_async(self.command)
+        values = None
+        latency = None
+        for line in stdout:
+            parsed = parse_lease_line(line)
+            if parsed is not None and parsed[0] in ('bound', 'renew'):
+                latency = time.time() - start
+                values = parsed[1]
+        errors = stderr.read().strip()
+        exit_code = chan.recv_exit_status()
+        chan.close()
+        if values is None:
+            return Lease(vm=vm.name, ok=False, ip=None, server_id=None,
+                         server_host=None, lease_time=None, latency=None,
+                         error='udhcpc exited with {0}: {1}'.format(
+                             exit_code, errors))
+        return Lease(vm=vm.name, ok=True, ip=values.get('ip'),
+                     server_id=values.get('serverid'), server_host=None,
+                     lease_time=int(values.get('lease') or 0),
+                     latency=latency, error=None)
+
+    def probe(self, vms, workers=None):
+        """Request lease on each of `vms` simultaneously
+
+        :returns: list of Lease in same order as `vms`
+        """
+        vms = list(vms)
+        results = parallel_map(self._probe, vms, workers=workers,
+                               raise_on_error=False)
+        hosts = self.get_dhcp_hosts()
+        networks = self.get_networks(vms)
+        leases = []
+        for vm, result in zip(vms, results):
+            if isinstance(result, Exception):
+                # connection may be broken, use new one on next probe
+                self.pool.drop(vm.id)
+                self._prepared.discard(vm.id)
+                result = Lease(vm=vm.name, ok=False, ip=None, server_id=None,
+                               server_host=None, lease_time=None,
+                               latency=None, error=repr(result))
+            else:
+                network_id = networks.get((vm.id, result.ip))
+                result = result._replace(
+                    server_host=hosts.get((network_id, result.server_id)))
+            leases.append(result)
+        self.log_report(leases)
+        return leases
+
+    @staticmethod
+    def report(leases):
+        """Returns OrderedDict with probes count, latency statistics and
+        count of leases from each DHCP agent host
+        """
+        received = [x for x in leases if x.ok]
+        return OrderedDict([
+            ('count', len(leases)),
+            ('received', len(received)),
+            ('failed', [x.vm for x in leases if not x.ok]),
+            ('latency', stats.summary([x.latency for x in received])),
+            ('servers', dict(Counter(x.server_host or x.server_id
+                                     for x in received))),
+        ])
+
+    def log_report(self, leases):
+        result = self.report(leases)
+        latency = result['latency']
+        logger.info(
+            'DHCP probe: {received} of {count} leases received, latency '
+            'p50/p95/max {p50}/{p95}/{max}s, servers {servers}, '
+            'failed {failed}'.format(p50=latency.get('p50'),
+                                     p95=latency.get('p95'),
+                                     max=latency.get('max'), **result))
+        for lease in leases:
+            if not lease.ok:
+                logger.info('DHCP probe on {0} failed: {1}'.format(
+                    lease.vm, lease.error))
+
+    @staticmethod
+    def check(leases):
+        """Assert that all instances received leases"""
+        failed = ['{0}: {1}'.format(x.vm, x.error) for x in leases
+                  if not x.ok]
+        assert not failed, 'DHCP client can\'t get ip:\n{0}'.format(
+            '\n'.join(failed))
+
+    def close(self):
+        self.pool.close()
+        self._prepared.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
@@ -12,25 +12,49 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import logging
-import os
+import time
 
 from fuelclient import client
 from fuelclient import fuelclient_settings
 from fuelclient.objects.environment import Environment as EnvironmentBase
 from paramiko import RSAKey
+from six.moves.urllib.parse import urljoin
 from waiting import wait
 
+from mos_tests.environment.power import PowerOrchestrator
 from mos_tests.environment.ssh import SSHClient
 
 
 logger = logging.getLogger(__name__)
 
 
+class FuelApiClient(client.Client):
+    """Fuelclient API client with own connection settings
+
+    Unlike fuelclient `APIClient` singleton it doesn't depend on global
+    settings, so several Fuel masters can be used in one process.
+    """
+
+    def __init__(self, ip, login, password, port=None):
+        super(FuelApiClient, self).__init__()
+        if port is None:
+            port = fuelclient_settings.get_settings().LISTEN_PORT
+        self.root = 'http://{0}:{1}'.format(ip, port)
+        self.keystone_base = urljoin(self.root, '/keystone/v2.0')
+        self.api_root = urljoin(self.root, '/api/v1/')
+        self.ostf_root = urljoin(self.root, '/ostf/')
+        self.user = login
+        self.password = password
+        self._keystone_client = None
+
+
 class NodeProxy(object):
     """Fuelclient Node proxy model with some helpful methods"""
 
     def __init__(self, orig_node, env):
+        orig_node.connection = env.connection
         self._orig_node = orig_node
         self._env = env
 
@@ -56,13 +80,86 @@ class Environment(EnvironmentBase):
 
     admin_ssh_keys = None
 
+    # time of last nodes power action
+    last_power_event = 0
+
+    # how long (in seconds) cluster revision is considered actual
+    revision_ttl = 10
+
+    # cluster data cache shared between Environment instances, key is
+    # (fuel api root, cluster id)
+    _data_caches = {}
+
+    @property
+    def _data_cache(self):
+        key = (self.connection.root, self.id)
+        return self._data_caches.setdefault(
+            key, {'revision': None, 'checked_at': 0, 'data': {}})
+
+    def get_revision(self):
+        """Returns tuple, which changes after each cluster (re)deployment
+
+        It contains cluster status, pending changes and id and status of
+        last cluster task.
+        """
+        cluster = self.connection.get_request(
+            'clusters/{0}/'.format(self.id))
+        tasks = self.connection.get_request(
+            'tasks/?cluster_id={0}'.format(self.id))
+        last_task = max(tasks, key=lambda x: x['id']) if tasks else {}
+        changes = sorted((x['name'], x.get('node_id'))
+                         for x in cluster.get('changes', []))
+        return (cluster['status'], tuple(changes), last_task.get('id'),
+                last_task.get('status'))
+
+    def invalidate_cache(self):
+        """Drop all cached cluster data"""
+        self._data_caches.pop((self.connection.root, self.id), None)
+
+    def _get_cached(self, name, getter):
+        """Returns copy of cached `getter` result
+
+        Cache is dropped if cluster revision is changed. Revision is
+        rechecked not often than once per `revision_ttl` seconds.
+        """
+        cache = self._data_cache
+        if time.time() - cache['checked_at'] > self.revision_ttl:
+            revision = self.get_revision()
+            if revision != cache['revision']:
+                logger.debug('Cluster {0} revision is changed to {1}'.format(
+                    self.id, revision))
+                cache['data'].clear()
+                cache['revision'] = revision
+            cache['checked_at'] = time.time()
+        if name not in cache['data']:
+            cache['data'][name] = getter()
+        return copy.deepcopy(cache['data'][name])
+
+    @property
+    def network_data(self):
+        """Cached cluster network configuration"""
+        return self._get_cached('network_data', self.get_network_data)
+
+    @property
+    def settings_data(self):
+        """Cached cluster attributes"""
+        return self._get_cached('settings_data', self.get_settings_data)
+
+    @property
+    def public_vip(self):
+        return self.network_data['public_vip']
+
+    @property
+    def management_vip(self):
+        return self.network_data['management_vip']
+
     def get_all_nodes(self):
         nodes = super(Environment, self).get_all_nodes()
         return [NodeProxy(x, self) for x in nodes]
 
     def get_primary_controller_ip(self):
         """Return public ip of primary controller"""
-        return self.get_network_data()['public_vip']
+        return self.public_vip
 
     def find_node_by_fqdn(self, fqdn):
         """Returns list of fuelclient.objects.Node instances for cluster"""
@@ -121,12 +218,12 @@ class Environment(EnvironmentBase):
 
     @property
     def network_segmentation_type(self):
-        return self.get_network_data()[
+        return self.network_data[
             'networking_parameters']['segmentation_type']
 
     @property
     def certificate(self):
-        ssl = self.get_settings_data()['editable']['public_ssl']
+        ssl = self.settings_data['editable']['public_ssl']
         if ssl['services']['value']:
             return ssl['cert_data']['value']['content']
 
@@ -152,42 +249,38 @@ class Environment(EnvironmentBase):
                 if 'primary-controller' in stdout:
                     return controller
 
-    def destroy_nodes(self, devops_nodes):
-        logger.info('wait until the nodes get offline state')
-        node_ips = [node.get_ip_address_by_network_name('admin')
-                    for node in devops_nodes]
-        for node in devops_nodes:
-            node.destroy()
-        wait(lambda: self.check_nodes_get_offline_state(node_ips),
-             timeout_seconds=10 * 60)
+    def _power_action(self, devops_nodes, action, timeout=10 * 60):
+        """Run PowerOrchestrator `action` for all devops_nodes at once
+
+        :returns: per node timings dict
+        """
+        orchestrator = PowerOrchestrator(self, devops_nodes, timeout=timeout)
+        try:
+            getattr(orchestrator, action)()
+        finally:
+            self.last_power_event = time.time()
+            orchestrator.log_timings()
         for node in self.get_all_nodes():
             logger.info('online state of node {0} now is {1}'
                         .format(node.data['name'], node.data['online']))
+        return orchestrator.timings
+
+    def destroy_nodes(self, devops_nodes):
+        return self._power_action(devops_nodes, 'destroy')
 
     def warm_shutdown_nodes(self, devops_nodes):
-        for node in devops_nodes:
-            node_ip = node.get_ip_address_by_network_name('admin')
-            logger.info('Shutdown node {0} with ip {1}'
-                        .format(node.name, node_ip))
-            with self.get_ssh_to_node(node_ip) as remote:
-                remote.check_call('/sbin/shutdown -Ph now')
-        self.destroy_nodes(devops_nodes)
+        return self._power_action(devops_nodes, 'shutdown')
 
     def warm_start_nodes(self, devops_nodes):
-        for node in devops_nodes:
-            logger.info('Starting node {}'.format(node.name))
-            node.create()
-        wait(self.check_nodes_get_online_state, timeout_seconds=10 * 60)
-        logger.info('wait until the nodes get online state')
-        for node in self.get_all_nodes():
-            logger.info('online state of node {0} now is {1}'
-                        .format(node.data['name'], node.data['online']))
+        return self._power_action(devops_nodes, 'start')
 
     def warm_restart_nodes(self, devops_nodes):
         logger.info('Reboot (warm restart) nodes %s',
                     [n.name for n in devops_nodes])
-        self.warm_shutdown_nodes(devops_nodes)
-        self.warm_start_nodes(devops_nodes)
+        return self._power_action(devops_nodes, 'restart')
+
+    def reset_nodes(self, devops_nodes):
+        return self._power_action(devops_nodes, 'reset')
 
     def check_nodes_get_offline_state(self, node_ips=[]):
         nodes_states = [not x.data['online']
@@ -211,28 +304,25 @@ class FuelClient(object):
     """Fuel API client"""
     def __init__(self, ip, login, password, ssh_login, ssh_password):
         logger.debug('Init fuel client on {0}'.format(ip))
-        self.reconfigure_fuelclient(ip, login, password)
+        self.api = FuelApiClient(ip, login, password)
         self.admin_ip = ip
         self.ssh_login = ssh_login
         self.ssh_password = ssh_password
         self._admin_keys = None
 
-    @staticmethod
-    def reconfigure_fuelclient(ip, login, password):
-        """There is ugly way to reconfigure fuelclient APIClient singleton"""
-        os.environ.update({
-            'SERVER_ADDRESS': ip,
-            'KEYSTONE_USER': login,
-            'KEYSTONE_PASS': password,
-        })
-        fuelclient_settings._SETTINGS = None
-        client.APIClient.__init__()
+    def get_clusters(self):
+        """Returns list of Environment instances bound to this client"""
+        clusters = []
+        for data in self.api.get_request(Environment.class_api_path):
+            env = Environment.init_with_data(data)
+            env.connection = self.api
+            env.admin_ssh_keys = self.admin_keys
+            clusters.append(env)
+        return clusters
 
     def get_last_created_cluster(self):
         """Returns Environment instance for latest deployed cluster"""
-        env = Environment.get_all()[-1]
-        env.admin_ssh_keys = self.admin_keys
-        return env
+        return self.get_clusters()[-1]
 
     @property
     def admin_keys(self):
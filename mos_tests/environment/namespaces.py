@@ -0,0 +1,218 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import namedtuple
+from collections import OrderedDict
+import logging
+import threading
+
+from six.moves import shlex_quote
+
+from mos_tests.environment.ssh import SSHClientPool
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+# `kind` is 'router' or 'network', `host` - fqdn of agent node, `ip` - its
+# admin ip
+Namespace = namedtuple('Namespace', ['kind', 'resource_id', 'host', 'ip',
+                                     'name'])
+
+NAMESPACE_PREFIX = {'router': 'qrouter-', 'network': 'qdhcp-'}
+
+# `ip netns exec` error for absent namespace
+MISSING_NAMESPACE_MARKER = 'Cannot open network namespace'
+
+RESULT_MARKER = '### netns result'
+
+
+class NamespaceRegistry(object):
+    """Resolve routers and networks to (node, namespace) and run commands
+    in namespaces
+
+        namespaces = os_conn.get_namespaces(env)
+        ns = namespaces.get_router(router_id)[0]
+        namespaces.execute(ns, 'ping -c1 10.0.0.3')
+        namespaces.execute_many([(ns, 'ip a'), (other_ns, 'ip r')])
+
+    Hosting agents of each router and network are requested from neutron
+    once and cached. Cache is updated each time, when OpenStackActions
+    lists hosting agents (for example in rescheduling checks), and can be
+    invalidated explicitly after agent ban. If namespace is absent on node
+    during execution, resource is resolved again and command is retried
+    on new node. Commands are executed over pooled ssh sessions, commands
+    for one node are executed as single batch.
+    """
+
+    def __init__(self, os_conn, env, pool=None):
+        self.os_conn = os_conn
+        self.env = env
+        self.pool = pool or SSHClientPool()
+        self._cache = {}
+        self._node_ips = None
+        self._lock = threading.Lock()
+
+    def _get_node_ip(self, fqdn):
+        if self._node_ips is None or fqdn not in self._node_ips:
+            self._node_ips = {x.data['fqdn']: x.data['ip']
+                              for x in self.env.get_all_nodes()}
+        return self._node_ips[fqdn]
+
+    def _make(self, kind, resource_id, agents):
+        """Returns list of Namespace for alive hosting agents
+
+        Agents in HA `active` state are placed first.
+        """
+        agents = sorted((x for x in agents if x['alive']),
+                        key=lambda x: x.get('ha_state') != 'active')
+        return [Namespace(kind=kind,
+                          resource_id=resource_id,
+                          host=x['host'],
+                          ip=self._get_node_ip(x['host']),
+                          name=NAMESPACE_PREFIX[kind] + resource_id)
+                for x in agents]
+
+    def update(self, kind, resource_id, agents):
+        """Update cache with hosting agents list from neutron"""
+        namespaces = self._make(kind, resource_id, agents)
+        with self._lock:
+            if self._cache.get((kind, resource_id)) != namespaces:
+                logger.debug('{0} {1} is hosted on {2}'.format(
+                    kind, resource_id, [x.host for x in namespaces]))
+            self._cache[(kind, resource_id)] = namespaces
+
+    def invalidate(self, kind=None, resource_id=None):
+        """Remove cached resolutions (all by default)"""
+        with self._lock:
+            for key in list(self._cache):
+                if kind in (None, key[0]) and resource_id in (None, key[1]):
+                    del self._cache[key]
+
+    def _get(self, kind, resource_id):
+        with self._lock:
+            namespaces = self._cache.get((kind, resource_id))
+        if namespaces is None:
+            if kind == 'router':
+                agents = self.os_conn.neutron.list_l3_agent_hosting_routers(
+                    resource_id)['agents']
+            else:
+                agents = self.os_conn.neutron.list_dhcp_agent_hosting_networks(
+                    resource_id)['agents']
+            self.update(kind, resource_id, agents)
+            with self._lock:
+                namespaces = self._cache[(kind, resource_id)]
+        return list(namespaces)
+
+    def get_router(self, router_id):
+        """Returns list of qrouter Namespace, active HA router is first"""
+        return self._get('router', router_id)
+
+    def get_network(self, net_id):
+        """Returns list of qdhcp Namespace"""
+        return self._get('network', net_id)
+
+    def get_remote(self, ip):
+        return self.pool.get(ip, lambda: self.env.get_ssh_to_node(ip))
+
+    @staticmethod
+    def _build_batch(commands):
+        lines = []
+        for index, (ns, command) in commands:
+            # marker is printed on its own line even if command output has
+            # no trailing newline, extra empty line is dropped by parser
+            lines.append("ip netns exec {0} sh -c {1} 2>&1; "
+                         "printf '\\n%s %d %d\\n' '{2}' {3} $?".format(
+                             ns.name, shlex_quote(command), RESULT_MARKER,
+                             index))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _parse_batch(lines):
+        results = {}
+        output = []
+        for line in lines:
+            if line.startswith(RESULT_MARKER):
+                if output and not output[-1].strip('\r\n'):
+                    output.pop()
+                index, exit_code = line[len(RESULT_MARKER):].split()
+                results[int(index)] = {'exit_code': int(exit_code),
+                                       'stdout': output,
+                                       'stderr': []}
+                output = []
+            else:
+                output.append(line)
+        return results
+
+    def _execute_on_node(self, ip, commands):
+        remote = self.get_remote(ip)
+        result = remote.execute(self._build_batch(commands))
+        return self._parse_batch(result['stdout'])
+
+    def _run(self, commands):
+        """Run indexed commands, grouped by nodes
+
+        :returns: dict with command index as key and result as value
+        """
+        groups = OrderedDict()
+        for index, (ns, command) in commands:
+            groups.setdefault(ns.ip, []).append((index, (ns, command)))
+        results = {}
+
+        def run(ip):
+            try:
+                results.update(self._execute_on_node(ip, groups[ip]))
+            except Exception:
+                # connection may be broken, use new one on next call
+                self.pool.drop(ip)
+                raise
+
+        parallel_map(run, groups)
+        return results
+
+    @staticmethod
+    def _is_missing(result):
+        return (result is not None and
+                any(MISSING_NAMESPACE_MARKER in x for x in result['stdout']))
+
+    def execute_many(self, commands):
+        """Run commands in namespaces, one batch for each node
+
+        :param commands: list of (Namespace, command) tuples
+        :returns: list of dicts with `exit_code`, `stdout`, `stderr` in same
+            order as commands, stderr is merged to stdout
+        """
+        commands = list(enumerate(commands))
+        results = self._run(commands)
+        retry = []
+        for index, (ns, command) in commands:
+            if not self._is_missing(results.get(index)):
+                continue
+            logger.info('Namespace {0} is not found on {1}, resolve it '
+                        'again'.format(ns.name, ns.host))
+            self.invalidate(ns.kind, ns.resource_id)
+            candidates = [x for x in self._get(ns.kind, ns.resource_id)
+                          if x.host != ns.host]
+            if candidates:
+                retry.append((index, (candidates[0], command)))
+        if retry:
+            results.update(self._run(retry))
+        return [results.get(index) for index in range(len(commands))]
+
+    def execute(self, ns, command):
+        """Run command in namespace, see `execute_many`"""
+        return self.execute_many([(ns, command)])[0]
+
+    def close(self):
+        self.pool.close()
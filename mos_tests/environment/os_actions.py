@@ -15,6 +15,7 @@
 import logging
 import random
 from tempfile import NamedTemporaryFile
+import threading
 import time
 
 from cinderclient import client as cinderclient
@@ -29,6 +30,7 @@ import paramiko
 import six
 from waiting import wait
 
+from mos_tests.environment.namespaces import NamespaceRegistry
 from mos_tests.environment.ssh import SSHClient
 
 logger = logging.getLogger(__name__)
@@ -85,6 +87,9 @@ class OpenStackActions(object):
                                    token=token,
                                    cacert=path_to_cert)
         self.env = env
+        self._namespaces = None
+        self._admin_key_paths = None
+        self._key_paths_lock = threading.Lock()
 
     def _get_keystoneclient(self, username, password, tenant_name, auth_url,
                             retries=3, ca_cert=None):
@@ -237,7 +242,10 @@ class OpenStackActions(object):
         return agents
 
     def list_dhcp_agents_for_network(self, net_id):
-        return self.neutron.list_dhcp_agent_hosting_networks(net_id)
+        result = self.neutron.list_dhcp_agent_hosting_networks(net_id)
+        if self._namespaces is not None:
+            self._namespaces.update('network', net_id, result['agents'])
+        return result
 
     def get_networks_on_dhcp_agent(self, agent_id):
         return self.list_networks_on_dhcp_agent(agent_id)['networks']
@@ -265,7 +273,25 @@ class OpenStackActions(object):
         return hosts
 
     def get_l3_for_router(self, router_id):
-        return self.neutron.list_l3_agent_hosting_routers(router_id)
+        result = self.neutron.list_l3_agent_hosting_routers(router_id)
+        if self._namespaces is not None:
+            self._namespaces.update('router', router_id, result['agents'])
+        return result
+
+    def get_namespaces(self, env=None):
+        """Returns NamespaceRegistry for env (self.env by default)"""
+        env = env or self.env
+        if self._namespaces is None or self._namespaces.env is not env:
+            if self._namespaces is not None:
+                self._namespaces.close()
+            self._namespaces = NamespaceRegistry(self, env)
+        return self._namespaces
+
+    def close(self):
+        """Close pooled ssh sessions of namespaces registry"""
+        if self._namespaces is not None:
+            self._namespaces.close()
+            self._namespaces = None
 
     def create_network(self, name):
         network = {'name': name, 'admin_state_up': True}
@@ -565,6 +591,22 @@ class OpenStackActions(object):
 
         return result
 
+    def _get_admin_key_paths(self, env):
+        """Write Fuel admin private keys to files once and return paths
+
+        Keys are written only once, so several ssh connections can be
+        opened simultaneously.
+        """
+        with self._key_paths_lock:
+            if self._admin_key_paths is None:
+                key_paths = []
+                for i, key in enumerate(env.admin_ssh_keys):
+                    path = '/tmp/fuel_key{0}.rsa'.format(i)
+                    key.write_private_key_file(path)
+                    key_paths.append(path)
+                self._admin_key_paths = key_paths
+        return self._admin_key_paths
+
     def ssh_to_instance(self, env, vm, vm_keypair=None, username='cirros',
                         password=None):
         """Returns direct ssh client to instance via proxy"""
@@ -573,18 +615,16 @@ class OpenStackActions(object):
         vm_ip = vm.addresses[net_name][0]['addr']
         net_id = self.neutron.list_networks(
             name=net_name)['networks'][0]['id']
-        dhcp_namespace = "qdhcp-{0}".format(net_id)
-        devops_nodes = self.get_node_with_dhcp_for_network(net_id)
-        if not devops_nodes:
+        namespaces = self.get_namespaces(env)
+        dhcp_namespaces = namespaces.get_network(net_id)
+        if not dhcp_namespaces:
+            namespaces.invalidate('network', net_id)
             raise Exception("Nodes with dhcp for network with id:{}"
                             " not found.".format(net_id))
-        devops_node = random.choice(devops_nodes)
-        ip = env.find_node_by_fqdn(devops_node).data['ip']
-        key_paths = []
-        for i, key in enumerate(env.admin_ssh_keys):
-            path = '/tmp/fuel_key{0}.rsa'.format(i)
-            key.write_private_key_file(path)
-            key_paths.append(path)
+        namespace = random.choice(dhcp_namespaces)
+        dhcp_namespace = namespace.name
+        ip = namespace.ip
+        key_paths = self._get_admin_key_paths(env)
         proxy_command = ("ssh {keys} -o 'StrictHostKeyChecking no' "
                          "root@{node_ip} ip netns exec {ns} "
                          "nc {vm_ip} 22".format(
@@ -598,9 +638,14 @@ class OpenStackActions(object):
         if vm_keypair is not None:
             instance_keys.append(paramiko.RSAKey.from_private_key(
                 six.StringIO(vm_keypair.private_key)))
-        return SSHClient(vm_ip, port=22, username=username, password=password,
-                         private_keys=instance_keys,
-                         proxy_command=proxy_command)
+        try:
+            return SSHClient(vm_ip, port=22, username=username,
+                             password=password, private_keys=instance_keys,
+                             proxy_command=proxy_command)
+        except Exception:
+            # DHCP agent may be rescheduled, resolve it again on next call
+            namespaces.invalidate('network', net_id)
+            raise
 
     def wait_agents_alive(self, agt_ids_to_check):
         logger.info('waiting until the agents get alive')
@@ -667,6 +712,8 @@ class OpenStackActions(object):
             new_l3_agt_id = availabe_l3_agts[0]['id']
         self.neutron.remove_router_from_l3_agent(current_l3_agt_id,
                                                  router_id)
+        if self._namespaces is not None:
+            self._namespaces.invalidate('router', router_id)
         self.neutron.add_router_to_l3_agent(new_l3_agt_id,
                                             {"router_id": router_id})
         assert(wait(
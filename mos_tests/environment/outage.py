@@ -0,0 +1,291 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+from array import array
+from collections import OrderedDict
+import logging
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from mos_tests.environment.connectivity import parse_ping_output
+from mos_tests.functions import stats
+
+
+logger = logging.getLogger(__name__)
+
+
+class PingProbe(object):
+    """Background ping, which stores replies to compact arrays
+
+    `seqs` contains sequence numbers of received replies, `times` - local
+    receive timestamps and `rtts` - round trip times in ms.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    # sequence number of first request
+    first_seq = 0
+    interval = 1
+
+    reply_re = re.compile(r'seq=(\d+) .*time=([\d.]+)')
+
+    def __init__(self, name, ip):
+        self.name = name
+        self.ip = ip
+        self.seqs = array('l')
+        self.times = array('d')
+        self.rtts = array('d')
+        self.summary = []
+        self.error = None
+        self.started_at = None
+        self.stopped_at = None
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @abc.abstractmethod
+    def _run(self):
+        """Should read ping output lines and call `_feed` for each of them"""
+
+    @abc.abstractmethod
+    def _kill(self):
+        """Should send SIGINT to ping"""
+
+    def _feed(self, line):
+        match = self.reply_re.search(line)
+        if match is None:
+            self.summary.append(line)
+            return
+        seq = int(match.group(1))
+        with self._cond:
+            if self.seqs and seq <= self.seqs[-1]:
+                # duplicate or reordered reply
+                return
+            self.seqs.append(seq)
+            self.times.append(time.time())
+            self.rtts.append(float(match.group(2)))
+            self._cond.notify_all()
+
+    def _target(self):
+        try:
+            self._run()
+        except Exception as e:
+            logger.exception('Ping from {0} failed'.format(self.name))
+            self.error = e
+        finally:
+            with self._cond:
+                self.stopped_at = time.time()
+                self._cond.notify_all()
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._target)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        if self.stopped_at is None:
+            self._kill()
+        self._thread.join(timeout)
+
+    def continuous_count(self):
+        """Returns count of last continuous replies"""
+        count = 0
+        for i in range(len(self.seqs) - 1, -1, -1):
+            if count and self.seqs[i] != self.seqs[i + 1] - 1:
+                break
+            count += 1
+        return count
+
+    def wait_continuous(self, count, timeout):
+        """Wait for `count` continuous replies
+
+        :returns: True if replies are received before timeout
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while self.continuous_count() < count:
+                remaining = deadline - time.time()
+                if self.stopped_at is not None or remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def get_stats(self):
+        """Returns outage statistics
+
+        Downtime and longest gap are in seconds, loss in percents.
+        """
+        transmitted = parse_ping_output(self.summary)['transmitted']
+        if not transmitted and self.seqs:
+            transmitted = self.seqs[-1] - self.first_seq + 1
+        seqs = [self.first_seq - 1] + list(self.seqs) + [
+            self.first_seq + transmitted]
+        longest_gap = max(b - a - 1 for a, b in zip(seqs, seqs[1:]))
+        lost = max(transmitted - len(self.seqs), 0)
+        result = OrderedDict([
+            ('transmitted', transmitted),
+            ('received', len(self.seqs)),
+            ('lost', lost),
+            ('loss', 100. * lost / transmitted if transmitted else 100.),
+            ('downtime', lost * self.interval),
+            ('longest_gap', longest_gap * self.interval),
+            ('rtt', stats.summary(self.rtts)),
+        ])
+        if self.error is not None:
+            result['error'] = repr(self.error)
+        return result
+
+
+class VmPingProbe(PingProbe):
+    """Ping from instance (busybox ping, 1 second interval)"""
+
+    def __init__(self, name, ip, os_conn, env, server, keypair=None,
+                 username='cirros', password='cubswin:)'):
+        super(VmPingProbe, self).__init__(name, ip)
+        self.os_conn = os_conn
+        self.env = env
+        self.server = server
+        self.keypair = keypair
+        self.username = username
+        self.password = password
+        self._remote = None
+        self._pid = None
+
+    def _run(self):
+        with self.os_conn.ssh_to_instance(self.env, self.server, self.keypair,
+                                          username=self.username,
+                                          password=self.password) as remote:
+            self._remote = remote
+            chan, _, stdout, _ = remote.execute_async(
+                'echo $$; exec ping {0}'.format(self.ip))
+            self._pid = int(stdout.readline())
+            for line in stdout:
+                self._feed(line)
+            chan.close()
+
+    def _kill(self):
+        if self._pid is not None:
+            self._remote.execute('kill -INT {0}'.format(self._pid))
+
+
+class HostPingProbe(PingProbe):
+    """Ping from test host (iputils ping)"""
+
+    first_seq = 1
+
+    def __init__(self, name, ip, interval=1):
+        super(HostPingProbe, self).__init__(name, ip)
+        self.interval = interval
+        self._proc = None
+
+    def _run(self):
+        self._proc = subprocess.Popen(
+            ['ping', '-n', '-i', str(self.interval), self.ip],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        for line in iter(self._proc.stdout.readline, b''):
+            self._feed(line.decode('utf-8', 'replace'))
+        self._proc.wait()
+
+    def _kill(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.send_signal(signal.SIGINT)
+
+
+class OutageMeter(object):
+    """Measure data plane outage with many simultaneous ping probes
+
+        meter = OutageMeter()
+        meter.add_vm_probe(os_conn, env, server1, keypair, server2_ip)
+        meter.add_host_probe(floating_ip)
+        with meter:
+            # failover
+        assert meter.report()['server01->10.0.0.4']['lost'] < 10
+
+    On enter all probes are started and meter waits for `warmup` continuous
+    replies on each of them. On exit meter waits for `restore` continuous
+    replies (connectivity is restored) and stops probes.
+    """
+
+    def __init__(self, warmup=10, restore=50, timeout=5 * 60):
+        self.warmup = warmup
+        self.restore = restore
+        self.timeout = timeout
+        self.probes = OrderedDict()
+
+    def add_probe(self, probe):
+        self.probes[probe.name] = probe
+        return probe
+
+    def add_vm_probe(self, os_conn, env, server, keypair, ip, name=None,
+                     **kwargs):
+        """Add ping from nova `server` to `ip`"""
+        if name is None:
+            name = '{0}->{1}'.format(server.name, ip)
+        return self.add_probe(VmPingProbe(name, ip, os_conn, env, server,
+                                          keypair, **kwargs))
+
+    def add_host_probe(self, ip, name=None, interval=1):
+        """Add ping from test host to `ip` (floating ip, for example)"""
+        if name is None:
+            name = 'host->{0}'.format(ip)
+        return self.add_probe(HostPingProbe(name, ip, interval=interval))
+
+    def _wait(self, count):
+        deadline = time.time() + self.timeout
+        for probe in self.probes.values():
+            if not probe.wait_continuous(count, deadline - time.time()):
+                logger.warning('There are no {0} continuous replies for '
+                               '{1}'.format(count, probe.name))
+
+    def start(self):
+        logger.info('Start ping probes: {0}'.format(list(self.probes)))
+        for probe in self.probes.values():
+            probe.start()
+        self._wait(self.warmup)
+
+    def stop(self):
+        logger.info('Wait for connectivity is restored')
+        self._wait(self.restore)
+        for probe in self.probes.values():
+            probe.stop()
+        self.log_report()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # don't wait for restore on error
+            self.restore = 0
+        self.stop()
+
+    def report(self):
+        """Returns OrderedDict with outage statistics for each probe"""
+        return OrderedDict((name, probe.get_stats())
+                           for name, probe in self.probes.items())
+
+    def log_report(self):
+        for name, result in self.report().items():
+            rtt = result['rtt']
+            logger.info(
+                'Outage {name}: lost {lost} of {transmitted} ({loss:.1f}%), '
+                'downtime {downtime}s, longest gap {longest_gap}s, rtt '
+                'p50/p95/max {p50}/{p95}/{max} ms'.format(
+                    name=name, p50=rtt.get('p50'), p95=rtt.get('p95'),
+                    max=rtt.get('max'), **result))
@@ -0,0 +1,269 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import namedtuple
+from collections import OrderedDict
+import json
+import logging
+import re
+
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+Port = namedtuple('Port', ['name', 'tag', 'interfaces'])
+Interface = namedtuple('Interface', ['name', 'ofport', 'type', 'iface_id'])
+Flow = namedtuple('Flow', ['bridge', 'table', 'priority', 'match',
+                           'actions', 'cookie'])
+
+# flow fields, which are changed during flow life
+FLOW_STATS_FIELDS = ('duration', 'n_packets', 'n_bytes', 'idle_age',
+                     'hard_age')
+
+SECTION_PREFIX = '### '
+
+
+def decode_ovsdb_value(value):
+    """Decode OVSDB JSON value (atom, uuid, set or map) to python object"""
+    if isinstance(value, list):
+        kind, data = value
+        if kind == 'set':
+            return [decode_ovsdb_value(x) for x in data]
+        if kind == 'map':
+            return {decode_ovsdb_value(k): decode_ovsdb_value(v)
+                    for k, v in data}
+        # uuid or named-uuid
+        return data
+    return value
+
+
+def parse_ovsdb_table(output):
+    """Parse `ovs-vsctl --format=json list <table>` output
+
+    :returns: list of dicts with column names as keys
+    """
+    table = json.loads(output)
+    return [dict(zip(table['headings'],
+                     [decode_ovsdb_value(x) for x in row]))
+            for row in table['data']]
+
+
+def parse_flow(line, bridge=None):
+    """Parse line of `ovs-ofctl dump-flows` output
+
+    Statistics fields are dropped, so flow can be compared with same flow
+    from other dump.
+
+    :returns: Flow or None for not flow lines
+    """
+    line = line.strip()
+    if ' actions=' not in line:
+        return None
+    fields, actions = line.split(' actions=', 1)
+    values = {}
+    match = []
+    for field in re.split(r',\s*', fields):
+        key, _, value = field.partition('=')
+        if key in FLOW_STATS_FIELDS:
+            continue
+        elif key in ('cookie', 'table', 'priority'):
+            values[key] = value
+        else:
+            match.append(field)
+    return Flow(bridge=bridge,
+                table=int(values.get('table', 0)),
+                priority=int(values.get('priority', 32768)),
+                match=','.join(match),
+                actions=actions,
+                cookie=values.get('cookie', '0x0'))
+
+
+class NodeOvsState(object):
+    """OVS ports, interfaces, bridges and flows of one node"""
+
+    def __init__(self, ports, interfaces, bridges, flows):
+        self.ports = ports
+        self.interfaces = interfaces
+        self.bridges = bridges
+        self.flows = flows
+
+    @classmethod
+    def from_output(cls, lines):
+        """Build state from output of OvsCollector.command"""
+        sections = OrderedDict()
+        current = None
+        for line in lines:
+            if line.startswith(SECTION_PREFIX):
+                current = sections.setdefault(line[len(SECTION_PREFIX):]
+                                              .strip(), [])
+            elif current is not None:
+                current.append(line)
+        interfaces = {}
+        for row in parse_ovsdb_table(''.join(sections['Interface'])):
+            interfaces[row['_uuid']] = Interface(
+                name=row['name'],
+                ofport=row['ofport'] or None,
+                type=row['type'],
+                iface_id=row['external_ids'].get('iface-id'))
+        ports = {}
+        for row in parse_ovsdb_table(''.join(sections['Port'])):
+            if_uuids = row['interfaces']
+            if not isinstance(if_uuids, list):
+                if_uuids = [if_uuids]
+            ports[row['name']] = Port(
+                name=row['name'],
+                tag=row['tag'] if row['tag'] != [] else None,
+                interfaces=tuple(interfaces[x].name for x in if_uuids
+                                 if x in interfaces))
+        bridges = sorted(row['name'] for row in
+                         parse_ovsdb_table(''.join(sections['Bridge'])))
+        flows = []
+        for bridge in bridges:
+            for line in sections.get('flows {0}'.format(bridge), []):
+                flow = parse_flow(line, bridge=bridge)
+                if flow is not None:
+                    flows.append(flow)
+        interfaces = {x.name: x for x in interfaces.values()}
+        return cls(ports, interfaces, bridges, flows)
+
+    def get_tags(self):
+        """Returns dict with tagged ports names as keys and tags as values"""
+        return {x.name: x.tag for x in self.ports.values()
+                if x.tag is not None}
+
+    def get_cookies(self, bridges=None):
+        """Returns set of flows cookies of bridges (all bridges by default)
+        """
+        return {x.cookie for x in self.flows
+                if bridges is None or x.bridge in bridges}
+
+    def get_flows_index(self):
+        """Returns dict with (bridge, table, priority, match) as keys"""
+        return {x[:4]: x for x in self.flows}
+
+
+class OvsDiff(object):
+    """Difference between two OVS snapshots
+
+    Each attribute is list of tuples, first item of which is node fqdn:
+
+    * `tags_changed` - (node, port, old tag, new tag), tag is None for
+        untagged or removed port
+    * `cookies_changed` - (node, bridge, old cookies, new cookies)
+    * `flows_missing`, `flows_added` - (node, flow)
+    * `flows_changed` - (node, old flow, new flow), actions are changed
+    """
+
+    def __init__(self, before, after):
+        self.tags_changed = []
+        self.cookies_changed = []
+        self.flows_missing = []
+        self.flows_added = []
+        self.flows_changed = []
+        for node in sorted(set(before) | set(after)):
+            self._compare(node, before.get(node), after.get(node))
+
+    def _compare(self, node, old, new):
+        empty = NodeOvsState({}, {}, [], [])
+        old = old or empty
+        new = new or empty
+        old_tags = old.get_tags()
+        new_tags = new.get_tags()
+        for port in sorted(set(old_tags) | set(new_tags)):
+            if old_tags.get(port) != new_tags.get(port):
+                self.tags_changed.append((node, port, old_tags.get(port),
+                                          new_tags.get(port)))
+        for bridge in sorted(set(old.bridges) | set(new.bridges)):
+            old_cookies = old.get_cookies([bridge])
+            new_cookies = new.get_cookies([bridge])
+            if old_cookies != new_cookies:
+                self.cookies_changed.append((node, bridge, old_cookies,
+                                             new_cookies))
+        old_flows = old.get_flows_index()
+        new_flows = new.get_flows_index()
+        for key in sorted(set(old_flows) - set(new_flows)):
+            self.flows_missing.append((node, old_flows[key]))
+        for key in sorted(set(new_flows) - set(old_flows)):
+            self.flows_added.append((node, new_flows[key]))
+        for key in sorted(set(old_flows) & set(new_flows)):
+            if old_flows[key].actions != new_flows[key].actions:
+                self.flows_changed.append((node, old_flows[key],
+                                           new_flows[key]))
+
+    def __nonzero__(self):
+        return bool(self.tags_changed or self.cookies_changed or
+                    self.flows_missing or self.flows_added or
+                    self.flows_changed)
+
+    __bool__ = __nonzero__
+
+    def __str__(self):
+        lines = []
+        for node, port, old, new in self.tags_changed:
+            lines.append('{0}: port {1} tag {2} -> {3}'.format(
+                node, port, old, new))
+        for node, bridge, old, new in self.cookies_changed:
+            lines.append('{0}: {1} cookies {2} -> {3}'.format(
+                node, bridge, sorted(old), sorted(new)))
+        for node, flow in self.flows_missing:
+            lines.append('{0}: missing {1}'.format(node, flow))
+        for node, flow in self.flows_added:
+            lines.append('{0}: added {1}'.format(node, flow))
+        for node, old, new in self.flows_changed:
+            lines.append('{0}: changed {1} -> {2}'.format(
+                node, old, new.actions))
+        return '\n'.join(lines)
+
+
+class OvsCollector(object):
+    """Collect OVS state from nodes in parallel
+
+    Ports, interfaces and bridges are read with `ovs-vsctl --format=json`,
+    flows of all bridges - with `ovs-ofctl dump-flows`, all in one ssh
+    command per node. Snapshot is dict with node fqdn as key and
+    NodeOvsState as value, two snapshots can be compared with `diff`.
+    """
+
+    command = (
+        "echo '### Port'; "
+        "ovs-vsctl --format=json --columns=name,tag,interfaces list Port; "
+        "echo '### Interface'; "
+        "ovs-vsctl --format=json --columns=_uuid,name,ofport,type,"
+        "external_ids list Interface; "
+        "echo '### Bridge'; "
+        "ovs-vsctl --format=json --columns=name list Bridge; "
+        "for br in $(ovs-vsctl list-br); do "
+        "echo \"### flows $br\"; ovs-ofctl dump-flows $br || true; "
+        "done")
+
+    def __init__(self, env):
+        self.env = env
+
+    def collect(self, node):
+        with node.ssh() as remote:
+            result = remote.check_call(self.command)
+        return NodeOvsState.from_output(result['stdout'])
+
+    def snapshot(self, nodes=None):
+        """Returns OVS state of nodes (all env nodes by default)"""
+        if nodes is None:
+            nodes = self.env.get_all_nodes()
+        states = parallel_map(self.collect, nodes)
+        return {node.data['fqdn']: state
+                for node, state in zip(nodes, states)}
+
+    @staticmethod
+    def diff(before, after):
+        return OvsDiff(before, after)
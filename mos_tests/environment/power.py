@@ -0,0 +1,208 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+import logging
+import time
+
+from waiting import wait
+
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+
+class PowerOrchestrator(object):
+    """Simultaneous power management for group of devops nodes
+
+    All actions are applied to all nodes at once and share one deadline.
+    Progress of each node is tracked by devops (libvirt) state and by Fuel
+    online state. Timings of each step are collected to `timings` attribute:
+
+        {'node-1': OrderedDict([('destroy', 0.4),
+                                ('devops_inactive', 1.1),
+                                ('fuel_offline', 62.3)])}
+
+    Values are seconds since start of orchestrator action.
+    """
+
+    # time to wait for clean guest power off before destroy node
+    shutdown_grace = 60
+
+    def __init__(self, env, devops_nodes, timeout=10 * 60):
+        """
+        :param env: fuel_client.Environment instance
+        :param devops_nodes: list of devops nodes
+        :param timeout: deadline (in seconds) for all actions
+        """
+        self.env = env
+        self.nodes = list(devops_nodes)
+        self.deadline = time.time() + timeout
+        self.timings = OrderedDict((node.name, OrderedDict())
+                                   for node in self.nodes)
+        self.admin_ips = {node.name: node.get_ip_address_by_network_name(
+            'admin') for node in self.nodes}
+        self._started = None
+
+    @property
+    def remaining(self):
+        """Returns seconds left until deadline"""
+        return max(self.deadline - time.time(), 0)
+
+    def _mark(self, node, stage):
+        if self._started is None:
+            self._started = time.time()
+        self.timings[node.name][stage] = round(time.time() - self._started, 3)
+
+    def _run(self, stage, action):
+        """Run `action` for each node in parallel"""
+        if self._started is None:
+            self._started = time.time()
+
+        def run(node):
+            action(node)
+            self._mark(node, stage)
+
+        parallel_map(run, self.nodes)
+
+    def _wait(self, stage, predicate, timeout=None, raise_on_timeout=True):
+        """Wait until `predicate` is True for all nodes
+
+        :param predicate: callable, takes list of pending nodes and returns
+            list of nodes which reach expected state
+        :returns: list of nodes which don't reach state
+        """
+        pending = list(self.nodes)
+
+        def is_done():
+            for node in predicate(pending):
+                self._mark(node, stage)
+                pending.remove(node)
+            return not pending
+
+        if timeout is None:
+            timeout = self.remaining
+        try:
+            wait(is_done, timeout_seconds=max(timeout, 1), sleep_seconds=5,
+                 waiting_for='nodes {0} reach {1} state'.format(
+                     [x.name for x in pending], stage))
+        except Exception:
+            if raise_on_timeout:
+                raise
+        return pending
+
+    def _fuel_online_map(self):
+        return {x.data['ip']: x.data['online']
+                for x in self.env.get_all_nodes()}
+
+    def _devops_state(self, active):
+        def predicate(nodes):
+            return [x for x in nodes if x.is_active() is active]
+        return predicate
+
+    def _fuel_state(self, online):
+        def predicate(nodes):
+            states = self._fuel_online_map()
+            return [x for x in nodes
+                    if states.get(self.admin_ips[x.name]) is online]
+        return predicate
+
+    def _get_boot_id(self, node):
+        """Returns kernel boot id of node or None if node is unreachable"""
+        try:
+            with self.env.get_ssh_to_node(self.admin_ips[node.name]) as remote:
+                result = remote.execute('cat /proc/sys/kernel/random/boot_id')
+        except Exception:
+            return None
+        if result['exit_code'] != 0:
+            return None
+        return ''.join(result['stdout']).strip()
+
+    def _rebooted(self, boot_ids):
+        def predicate(nodes):
+            new_ids = parallel_map(self._get_boot_id, nodes)
+            return [node for node, boot_id in zip(nodes, new_ids)
+                    if boot_id is not None and
+                    boot_id != boot_ids[node.name]]
+        return predicate
+
+    def wait_offline(self):
+        """Wait until all nodes are powered off and offline in Fuel"""
+        self._wait('devops_inactive', self._devops_state(False))
+        self._wait('fuel_offline', self._fuel_state(False))
+
+    def wait_online(self):
+        """Wait until all nodes are powered on and online in Fuel"""
+        self._wait('devops_active', self._devops_state(True))
+        self._wait('fuel_online', self._fuel_state(True))
+
+    def destroy(self):
+        """Destroy (virsh destroy) nodes and wait they become offline"""
+        logger.info('Destroy nodes {0}'.format(list(self.timings)))
+        self._run('destroy', lambda node: node.destroy())
+        self.wait_offline()
+
+    def shutdown(self):
+        """Shutdown nodes from OS and wait they become offline
+
+        Nodes which are still running after `shutdown_grace` seconds will be
+        destroyed.
+        """
+        logger.info('Shutdown nodes {0}'.format(list(self.timings)))
+
+        def shutdown(node):
+            with self.env.get_ssh_to_node(self.admin_ips[node.name]) as remote:
+                remote.check_call('/sbin/shutdown -Ph now')
+
+        self._run('shutdown', shutdown)
+        still_active = self._wait(
+            'devops_inactive', self._devops_state(False),
+            timeout=min(self.shutdown_grace, self.remaining),
+            raise_on_timeout=False)
+        if still_active:
+            logger.info('Nodes {0} are still active, destroy them'.format(
+                [x.name for x in still_active]))
+            parallel_map(lambda node: node.destroy(), still_active)
+        self.wait_offline()
+
+    def start(self):
+        """Start nodes and wait they become online"""
+        logger.info('Start nodes {0}'.format(list(self.timings)))
+        self._run('start', lambda node: node.create())
+        self.wait_online()
+
+    def reset(self):
+        """Reset (virsh reset) nodes and wait they become online
+
+        Devops node stays active during reset and Fuel may not notice short
+        offline period, so reboot is detected by changed kernel boot id.
+        """
+        logger.info('Reset nodes {0}'.format(list(self.timings)))
+        boot_ids = dict(zip([x.name for x in self.nodes],
+                            parallel_map(self._get_boot_id, self.nodes)))
+        self._run('reset', lambda node: node.reset())
+        self._wait('rebooted', self._rebooted(boot_ids))
+        self.wait_online()
+
+    def restart(self):
+        """Warm restart (shutdown and start) of nodes"""
+        self.shutdown()
+        self.start()
+
+    def log_timings(self):
+        for name, stages in self.timings.items():
+            logger.info('Power timings of node {0}: {1}'.format(
+                name, ', '.join('{0}={1}s'.format(*x)
+                                for x in stages.items())))
@@ -0,0 +1,151 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+import logging
+import re
+import time
+
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+# `crm_mon -1 -r` output line with resource or node in bad state
+PACEMAKER_FAILURE_RE = re.compile(r'Stopped|FAILED|OFFLINE|UNCLEAN')
+
+
+class NotReady(Exception):
+    """Raised by readiness check if some component is not ready"""
+
+
+class ReadinessProbe(object):
+    """Lightweight cloud readiness checks
+
+    This is a fast alternative for OSTF tests run: all checks are executed
+    simultaneously and take a few seconds. Each check returns None or raises
+    an exception with description of problem.
+    """
+
+    checks = (
+        'api_endpoints',
+        'nova_services',
+        'hypervisors',
+        'nova_computes',
+        'neutron_agents',
+        'pacemaker',
+        'rabbitmq',
+    )
+
+    def __init__(self, env, os_conn):
+        """
+        :param env: fuel_client.Environment instance
+        :param os_conn: OpenStackActions instance
+        """
+        self.env = env
+        self.os_conn = os_conn
+
+    def _controller_ssh(self):
+        controller = self.env.get_nodes_by_role('controller')[0]
+        return self.env.get_ssh_to_node(controller.data['ip'])
+
+    def check_api_endpoints(self):
+        self.os_conn.keystone.tenants.list()
+        self.os_conn.nova.flavors.list()
+        self.os_conn.neutron.list_networks(fields='id')
+        self.os_conn.cinder.volumes.list()
+        list(self.os_conn.glance.images.list(page_size=1))
+
+    def check_nova_services(self):
+        down = ['{0.binary}@{0.host}'.format(x)
+                for x in self.os_conn.nova.services.list()
+                if x.status == 'enabled' and x.state != 'up']
+        if down:
+            raise NotReady('Nova services are down: {0}'.format(down))
+
+    def check_hypervisors(self):
+        hypervisors = self.os_conn.nova.hypervisors.list()
+        if not hypervisors:
+            raise NotReady('There is no nova hypervisors')
+        down = [x.hypervisor_hostname for x in hypervisors
+                if x.status == 'enabled' and x.state != 'up']
+        if down:
+            raise NotReady('Hypervisors are down: {0}'.format(down))
+
+    def check_nova_computes(self):
+        if not self.os_conn.is_nova_ready():
+            raise NotReady('Nova computes are not available')
+
+    def check_neutron_agents(self):
+        agents = self.os_conn.neutron.list_agents()['agents']
+        dead = ['{binary}@{host}'.format(**x) for x in agents
+                if x['admin_state_up'] and not x['alive']]
+        if dead:
+            raise NotReady('Neutron agents are dead: {0}'.format(dead))
+
+    def check_pacemaker(self):
+        with self._controller_ssh() as remote:
+            result = remote.execute('crm_mon -1 -r')
+        if result['exit_code'] != 0:
+            raise NotReady('crm_mon failed: {0}'.format(
+                ''.join(result['stderr'])))
+        bad_lines = [x.strip() for x in result['stdout']
+                     if PACEMAKER_FAILURE_RE.search(x)]
+        if bad_lines:
+            raise NotReady('Pacemaker resources are not started: {0}'.format(
+                bad_lines))
+
+    def check_rabbitmq(self):
+        controllers = [x.data['fqdn'].split('.')[0]
+                       for x in self.env.get_nodes_by_role('controller')]
+        with self._controller_ssh() as remote:
+            result = remote.execute('rabbitmqctl cluster_status')
+        if result['exit_code'] != 0:
+            raise NotReady('RabbitMQ is unreachable: {0}'.format(
+                ''.join(result['stderr'])))
+        match = re.search(r'{running_nodes,\[([^\]]*)\]}',
+                          ''.join(result['stdout']).replace('\n', ''))
+        running = set()
+        if match:
+            running = {x.strip().strip('\'"')
+                       for x in match.group(1).split(',')}
+        missing = [x for x in controllers
+                   if 'rabbit@{0}'.format(x) not in running]
+        if missing:
+            raise NotReady('RabbitMQ is not running on {0}'.format(missing))
+
+    def run(self):
+        """Run all checks simultaneously
+
+        :returns: OrderedDict with check name as key and None (for passed
+            checks) or exception as value
+        """
+        start = time.time()
+
+        def run_check(name):
+            getattr(self, 'check_{0}'.format(name))()
+
+        results = parallel_map(run_check, self.checks, raise_on_error=False)
+        logger.debug('Readiness checks took {0:.1f}s'.format(
+            time.time() - start))
+        return OrderedDict(zip(self.checks, results))
+
+    def is_ready(self):
+        """Returns True if all checks are passed"""
+        failed = [(name, err) for name, err in self.run().items()
+                  if err is not None]
+        for name, err in failed:
+            logger.warning('Readiness check "{0}" failed: {1}'.format(
+                name, err))
+        return not failed
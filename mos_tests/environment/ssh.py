@@ -12,11 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import defaultdict
 import logging
 import os
 import paramiko
 import posixpath
 import stat
+import threading
 
 
 logger = logging.getLogger(__name__)
@@ -120,6 +122,10 @@ class SSHClient(object):
 
         return self._ssh.connect(self.host, **base_kwargs)
 
+    def is_alive(self):
+        transport = self._ssh.get_transport()
+        return transport is not None and transport.is_active()
+
     def reconnect(self):
         self._ssh = paramiko.SSHClient()
         self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -276,5 +282,58 @@ class SSHClient(object):
             return False
 
 
+class SSHClientPool(object):
+    """Thread-safe cache of connected SSHClient instances
+
+    Each key (instance id, host, etc) has one session, which is created
+    with `factory` on first `get` and recreated if connection is lost.
+    Pooled clients should not be used as context managers, because
+    `__exit__` closes connection; all of them are closed with `close`.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Returns connected client for `key`
+
+        :param factory: callable without arguments, returns new SSHClient
+        """
+        with self._lock:
+            lock = self._locks[key]
+        with lock:
+            client = self._clients.get(key)
+            if client is not None and not client.is_alive():
+                logger.debug('Connection to {0} is lost'.format(client))
+                client.clear()
+                client = None
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+            return client
+
+    def drop(self, key):
+        """Close and forget session for `key`"""
+        with self._lock:
+            client = self._clients.pop(key, None)
+        if client is not None:
+            client.clear()
+
+    def close(self):
+        with self._lock:
+            clients = self._clients.values()
+            self._clients = {}
+        for client in clients:
+            client.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
+
+
 def ssh(*args, **kwargs):
     return SSHClient(*args, **kwargs)
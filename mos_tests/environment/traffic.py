@@ -0,0 +1,310 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import namedtuple
+from collections import OrderedDict
+import json
+import logging
+import threading
+import time
+
+from mos_tests.functions import stats
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+# iperf3 report interval, `start` and `end` are offsets from flow start
+Interval = namedtuple('Interval', ['start', 'end', 'bps', 'jitter', 'lost',
+                                   'packets', 'retransmits'])
+
+
+class TrafficError(Exception):
+    pass
+
+
+def parse_iperf3_intervals(data):
+    """Returns list of Interval from `iperf3 -J` result
+
+    For UDP flows receiver side intervals (from `--get-server-output`) are
+    used if present, because only receiver knows jitter and loss.
+    """
+    server_data = data.get('server_output_json') or {}
+    intervals = server_data.get('intervals') or data.get('intervals', [])
+    result = []
+    for interval in intervals:
+        item = interval['sum']
+        result.append(Interval(start=item['start'],
+                               end=item['end'],
+                               bps=item['bits_per_second'],
+                               jitter=item.get('jitter_ms'),
+                               lost=item.get('lost_packets'),
+                               packets=item.get('packets'),
+                               retransmits=item.get('retransmits')))
+    return result
+
+
+def parse_iperf3_summary(data):
+    """Returns dict with bps, lost_percent, jitter and retransmits totals
+    from `iperf3 -J` result
+    """
+    end = (data.get('server_output_json') or data).get('end', {})
+    if 'sum' in end:
+        # UDP
+        total = end['sum']
+        return {'bps': total['bits_per_second'],
+                'lost_percent': total.get('lost_percent'),
+                'jitter': total.get('jitter_ms'),
+                'retransmits': None}
+    sent = data.get('end', {}).get('sum_sent', {})
+    received = data.get('end', {}).get('sum_received', sent)
+    return {'bps': received.get('bits_per_second'),
+            'lost_percent': None,
+            'jitter': None,
+            'retransmits': sent.get('retransmits')}
+
+
+class IperfFlow(object):
+    """iperf3 flow from `client` instance to `server` instance"""
+
+    def __init__(self, name, client, server, server_ip, port,
+                 protocol='tcp', duration=60, interval=1, bandwidth=None,
+                 length=None):
+        self.name = name
+        self.client = client
+        self.server = server
+        self.server_ip = server_ip
+        self.port = port
+        self.protocol = protocol
+        self.duration = duration
+        self.interval = interval
+        self.bandwidth = bandwidth
+        self.length = length
+        self.started_at = None
+        self.data = None
+        self.error = None
+        self._thread = None
+
+    @property
+    def server_command(self):
+        # one-off server in daemon mode
+        return 'iperf3 -s -1 -D -p {0}'.format(self.port)
+
+    @property
+    def client_command(self):
+        cmd = 'iperf3 -J -c {0} -p {1} -t {2} -i {3}'.format(
+            self.server_ip, self.port, self.duration, self.interval)
+        if self.protocol == 'udp':
+            cmd += ' -u -b {0} --get-server-output'.format(
+                self.bandwidth or '1M')
+        elif self.bandwidth:
+            cmd += ' -b {0}'.format(self.bandwidth)
+        if self.length:
+            cmd += ' -l {0}'.format(self.length)
+        return cmd
+
+    def intervals(self):
+        if self.data is None:
+            return []
+        return parse_iperf3_intervals(self.data)
+
+    def series(self):
+        """Returns list of (timestamp, Interval) with local timestamps of
+        interval ends
+        """
+        return [(self.started_at + x.end, x) for x in self.intervals()]
+
+
+class TrafficHarness(object):
+    """Run many concurrent iperf3 flows between instances
+
+        traffic = TrafficHarness(os_conn, env, keypair)
+        traffic.add_flow(server1, server2, protocol='udp', bandwidth='10M')
+        traffic.add_flow(server2, server1, protocol='tcp')
+        with traffic:
+            traffic.mark('restart agents')
+            # restart agents
+        report = traffic.report()
+
+    Each flow reports throughput, jitter and loss each `interval` seconds
+    in iperf3 JSON output. Intervals of all flows are placed on the local
+    clock, so they can be compared with events, added with `mark`.
+    """
+
+    first_port = 5201
+
+    def __init__(self, os_conn, env, keypair, username='ubuntu',
+                 password='ubuntu', duration=60, interval=1):
+        self.os_conn = os_conn
+        self.env = env
+        self.keypair = keypair
+        self.username = username
+        self.password = password
+        self.duration = duration
+        self.interval = interval
+        self.flows = OrderedDict()
+        self.events = []
+        self.started_at = None
+
+    def ssh(self, instance):
+        return self.os_conn.ssh_to_instance(self.env, instance, self.keypair,
+                                            username=self.username,
+                                            password=self.password)
+
+    def add_flow(self, client, server, protocol='tcp', name=None,
+                 server_ip=None, **kwargs):
+        """Add iperf3 flow from `client` instance to `server` instance
+
+        :param server_ip: ip to connect, fixed ip of `server` by default
+        :param kwargs: bandwidth, length, duration and interval of flow
+        """
+        if server_ip is None:
+            server_ip = self.os_conn.get_nova_instance_ips(server)['fixed']
+        port = self.first_port + len(self.flows)
+        if name is None:
+            name = '{0}->{1}:{2}/{3}'.format(client.name, server.name, port,
+                                              protocol)
+        kwargs.setdefault('duration', self.duration)
+        kwargs.setdefault('interval', self.interval)
+        flow = IperfFlow(name, client, server, server_ip, port,
+                         protocol=protocol, **kwargs)
+        self.flows[name] = flow
+        return flow
+
+    def _instances(self):
+        instances = OrderedDict()
+        for flow in self.flows.values():
+            instances[flow.client.id] = flow.client
+            instances[flow.server.id] = flow.server
+        return instances.values()
+
+    def get_instances_without_iperf3(self):
+        """Returns list of flows instances, which have no iperf3"""
+        def has_iperf3(instance):
+            with self.ssh(instance) as remote:
+                return remote.execute('which iperf3')['exit_code'] == 0
+
+        instances = self._instances()
+        found = parallel_map(has_iperf3, instances)
+        return [x for x, ok in zip(instances, found) if not ok]
+
+    def _start_server(self, flow):
+        with self.ssh(flow.server) as remote:
+            remote.check_call(flow.server_command)
+
+    def _run_client(self, flow):
+        try:
+            with self.ssh(flow.client) as remote:
+                flow.started_at = time.time()
+                result = remote.execute(flow.client_command)
+            flow.data = json.loads(''.join(result['stdout']) or '{}')
+            if 'error' in flow.data:
+                raise TrafficError(flow.data['error'])
+            if result['exit_code'] != 0:
+                raise TrafficError('iperf3 exited with {0}: {1}'.format(
+                    result['exit_code'], ''.join(result['stderr'])))
+        except Exception as e:
+            logger.exception('Flow {0} failed'.format(flow.name))
+            flow.error = e
+
+    def start(self):
+        logger.info('Start iperf3 flows: {0}'.format(list(self.flows)))
+        parallel_map(self._start_server, self.flows.values())
+        self.started_at = time.time()
+        for flow in self.flows.values():
+            flow._thread = threading.Thread(target=self._run_client,
+                                            args=(flow,))
+            flow._thread.daemon = True
+            flow._thread.start()
+
+    def wait(self):
+        """Wait until all flows are finished"""
+        for flow in self.flows.values():
+            flow._thread.join(flow.duration + 60)
+            if flow._thread.is_alive():
+                flow.error = TrafficError('Flow is not finished in time')
+        self.log_report()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wait()
+
+    def mark(self, event):
+        """Remember disruption event to align it with traffic intervals"""
+        logger.info('Traffic event: {0}'.format(event))
+        self.events.append((time.time(), event))
+
+    def timeseries(self):
+        """Returns list of intervals of all flows and events, ordered by time
+
+        Each item is dict with `time` (seconds from harness start) and
+        `flow` and interval fields or `event` name.
+        """
+        rows = []
+        for name, flow in self.flows.items():
+            for timestamp, interval in flow.series():
+                row = OrderedDict([('time', timestamp - self.started_at),
+                                   ('flow', name)])
+                row.update(interval._asdict())
+                rows.append(row)
+        for timestamp, event in self.events:
+            rows.append(OrderedDict([('time', timestamp - self.started_at),
+                                     ('event', event)]))
+        return sorted(rows, key=lambda x: x['time'])
+
+    def get_flow_stats(self, flow):
+        """Returns throughput statistics of flow and its minimal throughput
+        after each event (`window` is event to next event or flow end)
+        """
+        series = flow.series()
+        result = OrderedDict()
+        if flow.data is not None:
+            result.update(parse_iperf3_summary(flow.data))
+        result['intervals'] = stats.summary([x.bps for _, x in series],
+                                            percents=(5, 50))
+        result['zero_intervals'] = len([x for _, x in series if not x.bps])
+        result['events'] = []
+        bounds = [x[0] for x in self.events[1:]] + [float('inf')]
+        for (timestamp, event), end in zip(self.events, bounds):
+            window = [x.bps for t, x in series if timestamp < t <= end]
+            result['events'].append(OrderedDict([
+                ('event', event),
+                ('time', timestamp - self.started_at),
+                ('min_bps', min(window) if window else None),
+            ]))
+        if flow.error is not None:
+            result['error'] = repr(flow.error)
+        return result
+
+    def report(self):
+        """Returns OrderedDict with statistics for each flow"""
+        return OrderedDict((name, self.get_flow_stats(flow))
+                           for name, flow in self.flows.items())
+
+    def log_report(self):
+        for name, result in self.report().items():
+            logger.info(
+                'Traffic {name}: avg {bps} bps, p5 {p5} bps, lost {lost}%, '
+                'jitter {jitter} ms, retransmits {retransmits}, '
+                '{zero} intervals without traffic, error {error}'.format(
+                    name=name, bps=result.get('bps'),
+                    p5=result['intervals'].get('p5'),
+                    lost=result.get('lost_percent'),
+                    jitter=result.get('jitter'),
+                    retransmits=result.get('retransmits'),
+                    zero=result['zero_intervals'],
+                    error=result.get('error')))
@@ -0,0 +1,407 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+import time
+import uuid
+
+from mos_tests.functions import icmp
+from mos_tests.functions import stats
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+# max count of simultaneous API calls
+WORKERS = 20
+
+# max count of instances in one `servers.create` call
+BOOT_BATCH = 50
+
+
+class BulkMetrics(object):
+    """Wall time and per-item latencies of bulk operation phases
+
+        metrics = BulkMetrics()
+        with metrics.phase('boot', count):
+            latencies = wait_for(...)
+            metrics.add('boot', latencies.values())
+        metrics.log_report()
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+
+    @contextmanager
+    def phase(self, name, count):
+        result = self.phases.setdefault(
+            name, {'count': count, 'elapsed': 0, 'latencies': []})
+        start = time.time()
+        try:
+            yield
+        finally:
+            result['elapsed'] += time.time() - start
+
+    def add(self, name, latencies):
+        self.phases[name]['latencies'].extend(latencies)
+
+    def report(self):
+        """Returns OrderedDict with items per minute and latency
+        percentiles for each phase
+        """
+        result = OrderedDict()
+        for name, phase in self.phases.items():
+            elapsed = phase['elapsed']
+            result[name] = OrderedDict([
+                ('count', phase['count']),
+                ('elapsed', elapsed),
+                ('per_minute',
+                 60. * phase['count'] / elapsed if elapsed else None),
+                ('latency', stats.summary(phase['latencies'],
+                                          percents=(50, 95))),
+            ])
+        return result
+
+    def log_report(self):
+        for name, result in self.report().items():
+            latency = result['latency']
+            logger.info(
+                'Phase {name}: {count} items in {elapsed:.1f}s '
+                '({per_minute:.1f} per minute), latency p50/p95/max '
+                '{p50}/{p95}/{max}s'.format(
+                    name=name, p50=latency.get('p50'),
+                    p95=latency.get('p95'), max=latency.get('max'),
+                    **result))
+
+
+def get_free_quota(nova_client, flavor, floating_ips=False,
+                   cinder_client=None, volume_size=1):
+    """Returns count of instances, which can be created within quota
+
+    :param flavor: flavor of instances
+    :param floating_ips: check floating ips quota too, if set
+    :param cinder_client: check volumes quota too, if set
+    :param volume_size: size of volume for each instance in GB
+    """
+    limits = nova_client.limits.get().absolute
+    limits = {x.name: x.value for x in limits}
+    free = [
+        limits['maxTotalInstances'] - limits['totalInstancesUsed'],
+        (limits['maxTotalCores'] - limits['totalCoresUsed']) // flavor.vcpus,
+        (limits['maxTotalRAMSize'] - limits['totalRAMUsed']) // flavor.ram,
+    ]
+    if floating_ips:
+        free.append(limits['maxTotalFloatingIps'] -
+                    limits['totalFloatingIpsUsed'])
+    if cinder_client is not None:
+        limits = {x.name: x.value
+                  for x in cinder_client.limits.get().absolute}
+        free.append(limits['maxTotalVolumes'] - limits['totalVolumesUsed'])
+        free.append((limits['maxTotalVolumeGigabytes'] -
+                     limits['totalGigabytesUsed']) // volume_size)
+    # negative limit is unlimited
+    free = [x for x in free if x >= 0]
+    return min(free) if free else float('inf')
+
+
+def wait_for(list_items, ids, predicate, failed=None, timeout=10 * 60,
+             interval=2, start=None, waiting_for='items'):
+    """Wait until `predicate` is True for all items with one list request
+    per poll
+
+    :param list_items: callable without arguments, returns list of items
+        with `id` attribute (for example `nova.servers.list`)
+    :param ids: ids of items to wait
+    :param predicate: callable, takes item and returns True when it is ready
+    :param failed: callable, takes item and returns True if it will never
+        become ready (for example in ERROR status)
+    :param start: start time of latencies, now by default
+    :returns: dict with item id as key and seconds until it ready
+    """
+    start = start or time.time()
+    deadline = time.time() + timeout
+    pending = set(ids)
+    latencies = {}
+    errors = []
+    while True:
+        items = {x.id: x for x in list_items() if x.id in pending}
+        now = time.time()
+        for item_id, item in items.items():
+            if predicate(item):
+                latencies[item_id] = now - start
+                pending.discard(item_id)
+            elif failed is not None and failed(item):
+                errors.append(item_id)
+                pending.discard(item_id)
+        if not pending or now > deadline:
+            break
+        time.sleep(interval)
+    if errors or pending:
+        raise AssertionError(
+            'Waiting for {0} is failed, failed: {1}, not ready in {2}s: '
+            '{3}'.format(waiting_for, sorted(errors), timeout,
+                         sorted(pending)))
+    return latencies
+
+
+def _has_status(status):
+    return lambda x: x.status.lower() == status.lower()
+
+
+def _is_error(item):
+    return 'error' in item.status.lower()
+
+
+def boot_servers(nova_client, name, count, image, flavor, nics,
+                 security_groups=None, batch=BOOT_BATCH, workers=WORKERS,
+                 timeout=10 * 60, inst_list=None):
+    """Boot `count` instances from image concurrently and wait until they
+    are ACTIVE
+
+    Instances are requested by batches with `max_count`. Names of
+    instances get unique prefix, so instances left by other runs are not
+    mixed with new ones.
+
+    :param inst_list: instances ids list for cleaning, instances are added
+        to it even if some batches are failed
+    :returns: tuple (list of servers, dict with server id and seconds
+        until it became ACTIVE)
+    """
+    batches = [min(batch, count - x) for x in range(0, count, batch)]
+    # novaclient<3 can't return reservation id of batch, so instances are
+    # found by unique name prefix
+    name = '{0}-{1}'.format(name, uuid.uuid4().hex[:8])
+    search_opts = {'name': '^{0}-'.format(name)}
+    start = time.time()
+
+    def create(index):
+        nova_client.servers.create(
+            '{0}-{1}'.format(name, index), image, flavor,
+            min_count=batches[index], max_count=batches[index],
+            security_groups=security_groups, nics=nics)
+
+    servers = []
+    deadline = time.time() + timeout
+    try:
+        parallel_map(create, range(len(batches)), workers=workers)
+        while len(servers) < count and time.time() < deadline:
+            servers = nova_client.servers.list(search_opts=search_opts)
+            time.sleep(2)
+    finally:
+        if inst_list is not None:
+            if len(servers) < count:
+                servers = nova_client.servers.list(search_opts=search_opts)
+            inst_list.extend(x.id for x in servers)
+    assert len(servers) == count, (
+        'Only {0} of {1} instances are created'.format(len(servers), count))
+    latencies = wait_for(
+        lambda: nova_client.servers.list(search_opts=search_opts),
+        [x.id for x in servers], _has_status('ACTIVE'), failed=_is_error,
+        timeout=max(deadline - time.time(), 1), start=start,
+        waiting_for='instances are ACTIVE')
+    return servers, latencies
+
+
+def boot_servers_from_volumes(nova_client, name, volumes, flavor, nics,
+                              security_groups=None, workers=WORKERS,
+                              timeout=10 * 60, inst_list=None):
+    """Boot instance from each of volumes concurrently and wait until
+    they are ACTIVE
+
+    :param inst_list: instances ids list for cleaning
+    :returns: tuple (list of servers, dict with server id and seconds
+        until it became ACTIVE)
+    """
+    start = time.time()
+
+    def create(volume):
+        server = nova_client.servers.create(
+            '{0}-{1}'.format(name, volume.id), '', flavor,
+            block_device_mapping={'vda': volume.id},
+            security_groups=security_groups, nics=nics)
+        if inst_list is not None:
+            inst_list.append(server.id)
+        return server
+
+    servers = parallel_map(create, volumes, workers=workers)
+    latencies = wait_for(
+        lambda: nova_client.servers.list(
+            search_opts={'name': '^{0}-'.format(name)}),
+        [x.id for x in servers], _has_status('ACTIVE'), failed=_is_error,
+        timeout=timeout, start=start, waiting_for='instances are ACTIVE')
+    return servers, latencies
+
+
+def create_volumes(cinder_client, count, size=1, image_id=None,
+                   name='Test_volume', workers=WORKERS, timeout=10 * 60,
+                   volume_list=None):
+    """Create volumes concurrently and wait until they are available
+
+    :param volume_list: volumes list for cleaning
+    :returns: tuple (list of volumes, dict with volume id and seconds
+        until it became available)
+    """
+    start = time.time()
+
+    def create(index):
+        volume = cinder_client.volumes.create(
+            size, name='{0}_{1}'.format(name, index), imageRef=image_id)
+        if volume_list is not None:
+            volume_list.append(volume)
+        return volume
+
+    volumes = parallel_map(create, range(count), workers=workers)
+    latencies = wait_for(
+        cinder_client.volumes.list, [x.id for x in volumes],
+        _has_status('available'), failed=_is_error, timeout=timeout,
+        start=start, waiting_for='volumes are available')
+    return volumes, latencies
+
+
+def create_snapshots(cinder_client, volume_id, count,
+                     name='Test_snapshot', workers=WORKERS, timeout=10 * 60,
+                     snapshot_list=None):
+    """Create snapshots of volume concurrently and wait until they are
+    available
+
+    :param snapshot_list: snapshots list for cleaning
+    :returns: tuple (list of snapshots, dict with snapshot id and seconds
+        until it became available)
+    """
+    start = time.time()
+
+    def create(index):
+        snapshot = cinder_client.volume_snapshots.create(
+            volume_id, name='{0}_{1}'.format(name, index))
+        if snapshot_list is not None:
+            snapshot_list.append(snapshot)
+        return snapshot
+
+    snapshots = parallel_map(create, range(count), workers=workers)
+    latencies = wait_for(
+        cinder_client.volume_snapshots.list, [x.id for x in snapshots],
+        _has_status('available'), failed=_is_error, timeout=timeout,
+        start=start, waiting_for='snapshots are available')
+    return snapshots, latencies
+
+
+def create_floating_ips(nova_client, count, fip_list=None,
+                        workers=WORKERS):
+    """Create floating ips concurrently
+
+    :param fip_list: floating ips list for cleaning
+    :returns: list of floating ips
+    """
+    def create(_):
+        fip = nova_client.floating_ips.create()
+        if fip_list is not None:
+            fip_list.append(fip)
+        return fip
+
+    return parallel_map(create, range(count), workers=workers)
+
+
+def associate_floating_ips(nova_client, servers, floating_ips,
+                           workers=WORKERS, timeout=5 * 60):
+    """Add floating ip to each server concurrently and wait until they are
+    shown in servers addresses
+
+    :returns: tuple (dict with server id as key and floating ip as value,
+        dict with server id and seconds until ip is shown)
+    """
+    start = time.time()
+    fip_dict = {server.id: fip for server, fip in zip(servers, floating_ips)}
+    parallel_map(lambda x: x.add_floating_ip(fip_dict[x.id]), servers,
+                 workers=workers)
+
+    def has_fip(server):
+        return fip_dict[server.id] in [ip['addr']
+                                       for ips in server.addresses.values()
+                                       for ip in ips]
+
+    latencies = wait_for(
+        nova_client.servers.list, fip_dict.keys(), has_fip, timeout=timeout,
+        start=start, waiting_for='floating ips are associated')
+    return fip_dict, latencies
+
+
+def delete_servers(nova_client, ids, workers=WORKERS, timeout=10 * 60):
+    """Delete instances concurrently and wait until they are absent"""
+    ids = set(ids)
+    if not ids:
+        return
+    parallel_map(nova_client.servers.delete, ids, workers=workers,
+                 raise_on_error=False)
+    _wait_absent(nova_client.servers.list, ids, timeout, 'instances')
+
+
+def delete_floating_ips(nova_client, floating_ips, workers=WORKERS,
+                        timeout=5 * 60):
+    """Delete floating ips concurrently and wait until they are absent
+
+    :param floating_ips: list of floating ips objects or addresses
+    """
+    ips = {getattr(x, 'ip', x) for x in floating_ips}
+    ids = {x.id for x in nova_client.floating_ips.list() if x.ip in ips}
+    if not ids:
+        return
+    parallel_map(nova_client.floating_ips.delete, ids, workers=workers,
+                 raise_on_error=False)
+    _wait_absent(nova_client.floating_ips.list, ids, timeout, 'floating ips')
+
+
+def delete_volumes(cinder_client, ids, workers=WORKERS, timeout=10 * 60):
+    """Delete volumes concurrently and wait until they are absent"""
+    ids = set(ids)
+    if not ids:
+        return
+    parallel_map(cinder_client.volumes.delete, ids, workers=workers,
+                 raise_on_error=False)
+    _wait_absent(cinder_client.volumes.list, ids, timeout, 'volumes')
+
+
+def delete_snapshots(cinder_client, ids, workers=WORKERS, timeout=10 * 60,
+                     wait=True):
+    """Delete snapshots concurrently and wait until they are absent
+
+    :param wait: don't wait for deletion, if False
+    """
+    ids = set(ids)
+    if not ids:
+        return
+    parallel_map(cinder_client.volume_snapshots.delete, ids, workers=workers,
+                 raise_on_error=False)
+    if wait:
+        _wait_absent(cinder_client.volume_snapshots.list, ids, timeout,
+                     'snapshots')
+
+
+def _wait_absent(list_items, ids, timeout, name):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if not ids & {x.id for x in list_items()}:
+            return
+        time.sleep(2)
+    raise AssertionError('{0} are not deleted in {1}s'.format(name, timeout))
+
+
+def ping_sweep(ips, timeout=3 * 60):
+    """Ping all ips until each of them replies
+
+    :returns: tuple (dict with ip as key and seconds until first reply,
+        list of unreachable ips)
+    """
+    return icmp.wait_reachable(ips, timeout=timeout)
@@ -3,6 +3,8 @@ from time import sleep, time
 import urllib2
 import yaml
 
+from mos_tests.functions import icmp
+
 
 def is_stack_exists(stack_name, heat):
     """ Check the presence of stack_name in stacks list
@@ -497,27 +499,28 @@ def delete_image(glance_client, image_id):
 
 # execution of system commands
 def ping_command(ip_address, c=4, i=4, timeout=3, should_be_available=True):
-    """ This function executes the ping program and check its results
+    """ This function pings ip address and check its results
         :param ip_address: The IP address to ping
-        :param c: value of the [-c count] parameter of the ping command
-        :param i: value of the [-i interval] parameter of the ping command
+        :param c: count of echo requests to be sure that ip address is
+        unavailable
+        :param i: interval between echo requests in seconds
         :param timeout: timeout in minutes that we are waiting for successful
         result of the ping operation
         :param should_be_available: this parameter described should we check
         successful result of the ping command or not.
         :return: True in case of success, False otherwise
     """
+    if should_be_available:
+        # returns right after first reply
+        _, unreachable = icmp.wait_reachable([ip_address],
+                                             timeout=60 * timeout)
+        return not unreachable
     end_time = time() + 60 * timeout
-    ping_result = False
     while time() < end_time:
-        the_result = os.system("ping -c {} -i {} {}".
-                               format(c, i, ip_address))
-        # TODO: Make sure that all packages has been received
-        ping_result = \
-            the_result == 0 if should_be_available else the_result != 0
-        if ping_result:
-            break
-    return ping_result
+        result = icmp.probe([ip_address], count=c, interval=i)[ip_address]
+        if result.received == 0:
+            return True
+    return False
 
 
 def check_volume_snapshot_status(cinder_client, uid, status, timeout=5):
@@ -0,0 +1,327 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import namedtuple
+from collections import OrderedDict
+from distutils.spawn import find_executable
+import errno
+import logging
+import os
+import random
+import re
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+from mos_tests.functions import stats
+from mos_tests.functions.parallel import parallel_map
+
+
+logger = logging.getLogger(__name__)
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+PAYLOAD = b'mos_tests'.ljust(56, b'\0')
+
+HostStats = namedtuple('HostStats', ['sent', 'received', 'loss', 'rtt'])
+
+
+class IcmpError(Exception):
+    pass
+
+
+def checksum(data):
+    """Internet checksum (RFC 1071)"""
+    data = bytearray(data)
+    if len(data) % 2:
+        data.append(0)
+    total = sum((data[i] << 8) + data[i + 1] for i in range(0, len(data), 2))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def build_echo_request(ident, seq, payload=PAYLOAD):
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0,
+                       checksum(header + payload), ident, seq) + payload
+
+
+def parse_echo_reply(data, with_ip_header=True):
+    """Returns (ident, seq) of echo reply or None for other ICMP packets"""
+    data = bytearray(data)
+    if with_ip_header:
+        data = data[(data[0] & 0x0f) * 4:]
+    if len(data) < 8:
+        return None
+    icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', bytes(data[:8]))
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    return ident, seq
+
+
+class SocketBackend(object):
+    """Echo requests over one raw (privileged) or ping datagram socket
+
+    Datagram ICMP socket is available for unprivileged users if group is
+    allowed by `net.ipv4.ping_group_range` sysctl, kernel replaces ident
+    with socket port and delivers only replies for this socket.
+    """
+
+    def __init__(self, sock_type=socket.SOCK_RAW):
+        self.sock_type = sock_type
+        self.ident = random.randint(0, 0xffff)
+        self._seq = random.randint(0, 0xffff)
+        self._lock = threading.Lock()
+        # check permissions
+        self._open().close()
+
+    @property
+    def name(self):
+        return 'raw' if self.sock_type == socket.SOCK_RAW else 'dgram'
+
+    def _open(self):
+        sock = socket.socket(socket.AF_INET, self.sock_type,
+                             socket.IPPROTO_ICMP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        sock.setblocking(False)
+        return sock
+
+    def _next_seq(self):
+        with self._lock:
+            self._seq = (self._seq + 1) & 0xffff
+            return self._seq
+
+    def _receive(self, sock, sent_at, rtts, replied):
+        while True:
+            try:
+                data, (ip, _) = sock.recvfrom(4096)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            reply = parse_echo_reply(
+                data, with_ip_header=self.sock_type == socket.SOCK_RAW)
+            if reply is None:
+                continue
+            ident, seq = reply
+            if self.sock_type == socket.SOCK_RAW and ident != self.ident:
+                continue
+            send_time = sent_at.pop((ip, seq), None)
+            if send_time is not None:
+                now = time.time()
+                rtts[ip].append((now - send_time) * 1000)
+                replied.setdefault(ip, now)
+
+    def exchange(self, ips, count, interval, timeout):
+        """Send `count` echo requests to each of ips
+
+        :returns: tuple (dict with sent count, dict with list of rtts in ms,
+            dict with timestamp of first reply for replied ips)
+        """
+        sent = dict.fromkeys(ips, 0)
+        rtts = {ip: [] for ip in ips}
+        replied = {}
+        sent_at = {}
+        sock = self._open()
+        try:
+            rounds = 0
+            next_send = time.time()
+            deadline = None
+            while True:
+                now = time.time()
+                if rounds < count and now >= next_send:
+                    for ip in ips:
+                        seq = self._next_seq()
+                        try:
+                            sock.sendto(build_echo_request(self.ident, seq),
+                                        (ip, 0))
+                        except socket.error as e:
+                            logger.debug('Echo to {0} failed: {1}'.format(
+                                ip, e))
+                        sent_at[(ip, seq)] = time.time()
+                        sent[ip] += 1
+                    rounds += 1
+                    next_send = now + interval
+                    if rounds == count:
+                        deadline = time.time() + timeout
+                if deadline is not None and (now >= deadline or
+                                             not sent_at):
+                    break
+                wait_until = deadline if rounds == count else next_send
+                ready, _, _ = select.select([sock], [], [],
+                                            max(wait_until - time.time(), 0))
+                if ready:
+                    self._receive(sock, sent_at, rtts, replied)
+        finally:
+            sock.close()
+        return sent, rtts, replied
+
+
+class FpingBackend(object):
+    """Echo requests with fping, process is killed if it hangs
+
+    fping prints results only on exit, so time of first reply is estimated
+    by send time of request and its rtt.
+    """
+
+    name = 'fping'
+
+    line_re = re.compile(r'^(\S+)\s+:\s+(.*)$')
+
+    def __init__(self):
+        self.path = find_executable('fping')
+        if self.path is None:
+            raise IcmpError('fping is not found')
+
+    def exchange(self, ips, count, interval, timeout):
+        cmd = [self.path, '-q', '-C', str(count),
+               '-p', str(max(int(interval * 1000), 10)),
+               '-t', str(max(int(timeout * 1000), 1))] + list(ips)
+        start = time.time()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        killer = threading.Timer(count * interval + timeout + 10, proc.kill)
+        killer.start()
+        try:
+            _, output = proc.communicate()
+        finally:
+            killer.cancel()
+        sent = dict.fromkeys(ips, count)
+        rtts = {ip: [] for ip in ips}
+        replied = {}
+        for line in output.decode('utf-8', 'replace').splitlines():
+            match = self.line_re.match(line.strip())
+            if match is None or match.group(1) not in rtts:
+                continue
+            ip = match.group(1)
+            for i, value in enumerate(match.group(2).split()):
+                if value == '-':
+                    continue
+                rtts[ip].append(float(value))
+                replied.setdefault(
+                    ip, start + i * interval + float(value) / 1000)
+        return sent, rtts, replied
+
+
+class PingBackend(object):
+    """Echo requests with iputils ping process for each ip"""
+
+    name = 'ping'
+
+    rtt_re = re.compile(r'time=([\d.]+)')
+
+    def exchange(self, ips, count, interval, timeout):
+        def ping(ip):
+            """Returns (list of rtts, time of first reply line or None)"""
+            cmd = ['ping', '-n', '-c', str(count),
+                   '-i', str(max(interval, 0.2)),
+                   '-W', str(max(int(timeout), 1)), ip]
+            rtts = []
+            first_reply = None
+            with open(os.devnull, 'w') as devnull:
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                        stderr=devnull)
+                for line in iter(proc.stdout.readline, b''):
+                    match = self.rtt_re.search(line.decode('utf-8',
+                                                           'replace'))
+                    if match is None:
+                        continue
+                    if first_reply is None:
+                        first_reply = time.time()
+                    rtts.append(float(match.group(1)))
+                proc.wait()
+            return rtts, first_reply
+
+        results = dict(zip(ips, parallel_map(ping, ips, workers=50)))
+        replied = {ip: first_reply
+                   for ip, (_, first_reply) in results.items()
+                   if first_reply is not None}
+        return (dict.fromkeys(ips, count),
+                {ip: rtts for ip, (rtts, _) in results.items()}, replied)
+
+
+_backend = None
+
+
+def get_backend():
+    """Returns first available of raw socket, ping socket, fping and ping
+    backends
+    """
+    global _backend
+    if _backend is None:
+        for factory in (lambda: SocketBackend(socket.SOCK_RAW),
+                        lambda: SocketBackend(socket.SOCK_DGRAM),
+                        FpingBackend,
+                        PingBackend):
+            try:
+                _backend = factory()
+                break
+            except (socket.error, IcmpError) as e:
+                logger.debug('ICMP backend is not available: {0}'.format(e))
+        logger.debug('ICMP backend: {0}'.format(_backend.name))
+    return _backend
+
+
+def probe(ips, count=3, interval=1, timeout=1):
+    """Send `count` echo requests to all ips at once
+
+    :param interval: seconds between requests to same ip
+    :param timeout: seconds to wait replies after last request
+    :returns: OrderedDict with ip as key and HostStats as value, loss is in
+        percents and rtt is summary of round trip times in ms
+    """
+    ips = list(OrderedDict.fromkeys(ips))
+    if not ips:
+        return OrderedDict()
+    sent, rtts, _ = get_backend().exchange(ips, count, interval, timeout)
+    result = OrderedDict()
+    for ip in ips:
+        received = min(len(rtts[ip]), sent[ip])
+        result[ip] = HostStats(
+            sent=sent[ip],
+            received=received,
+            loss=100. * (sent[ip] - received) / sent[ip] if sent[ip] else 100.,
+            rtt=stats.summary(rtts[ip]))
+    return result
+
+
+def wait_reachable(ips, timeout=3 * 60, interval=1):
+    """Ping ips until each of them replies or timeout expires
+
+    Each round sends one request to each not replied ip and lasts until
+    all of them reply or `interval` seconds, so it finishes right after
+    last host answers. Latency of each ip is counted to its first reply,
+    not to end of round.
+
+    :returns: tuple (dict with ip as key and seconds until first reply,
+        list of unreachable ips)
+    """
+    start = time.time()
+    deadline = start + timeout
+    pending = list(OrderedDict.fromkeys(ips))
+    latencies = {}
+    backend = get_backend()
+    while pending:
+        _, _, replied = backend.exchange(pending, 1, interval, interval)
+        for ip, timestamp in replied.items():
+            latencies[ip] = timestamp - start
+            pending.remove(ip)
+        if time.time() >= deadline:
+            break
+    return latencies, pending
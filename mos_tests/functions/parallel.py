@@ -0,0 +1,75 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+from multiprocessing.pool import ThreadPool
+import sys
+
+import six
+
+
+logger = logging.getLogger(__name__)
+
+
+class ParallelError(Exception):
+    """Raised when some of parallel calls are failed"""
+
+    def __init__(self, errors):
+        self.errors = errors
+
+    def __str__(self):
+        return 'Parallel execution failed for {0} item(s):\n{1}'.format(
+            len(self.errors),
+            '\n'.join('{0!r}: {1!r}'.format(item, err)
+                      for item, err in self.errors))
+
+
+def parallel_map(func, items, workers=None, raise_on_error=True):
+    """Call `func` for each of `items` in threads
+
+    :param func: callable with one argument
+    :param items: iterable with arguments for `func`
+    :param workers: max count of simultaneous calls, all items at once
+        if None
+    :param raise_on_error: raise ParallelError if some of calls failed,
+        otherwise failed call result will be an exception instance
+    :returns: list with results in same order as `items`
+    """
+    items = list(items)
+    if not items:
+        return []
+    results = [None] * len(items)
+    errors = []
+
+    def call(index):
+        try:
+            results[index] = func(items[index])
+        except Exception as e:
+            logger.debug('Parallel call for {0!r} failed'.format(
+                items[index]), exc_info=True)
+            results[index] = e
+            errors.append((items[index], e, sys.exc_info()))
+
+    pool = ThreadPool(min(workers or len(items), len(items)))
+    try:
+        pool.map(call, range(len(items)))
+    finally:
+        pool.close()
+        pool.join()
+
+    if errors and raise_on_error:
+        if len(items) == 1:
+            six.reraise(*errors[0][2])
+        raise ParallelError([(item, err) for item, err, _ in errors])
+    return results
@@ -0,0 +1,297 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pure python pcap stream parser with VXLAN, ARP, ICMP and IP decoding"""
+
+import logging
+import socket
+import struct
+
+
+logger = logging.getLogger(__name__)
+
+VXLAN_PORT = 4789
+
+# link layer types
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_IPV6 = 0x86dd
+ETH_P_VLANS = (0x8100, 0x88a8, 0x9100)
+
+IPPROTO_ICMP = 1
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+
+# max count of nested encapsulations
+MAX_DEPTH = 4
+
+
+class PcapError(Exception):
+    """Raised for unsupported or broken capture files"""
+
+
+class Packet(object):
+    """Decoded packet
+
+    All layers (outer and decapsulated from VXLAN) are stored flat:
+    `ips` - list of (src, dst, proto), `arps` - list of (opcode, sender ip,
+    target ip), `icmps` - list of (src, dst, type), `vnis` - list of VXLAN
+    network identifiers.
+    """
+
+    __slots__ = ('number', 'timestamp', 'length', 'ips', 'arps', 'icmps',
+                 'vnis')
+
+    def __init__(self, number, timestamp, length):
+        self.number = number
+        self.timestamp = timestamp
+        self.length = length
+        self.ips = []
+        self.arps = []
+        self.icmps = []
+        self.vnis = []
+
+    def __repr__(self):
+        parts = ['#{0} {1:.6f}'.format(self.number, self.timestamp)]
+        if self.vnis:
+            parts.append('VXLAN vni={0}'.format(
+                ','.join(str(x) for x in self.vnis)))
+        for op, src, dst in self.arps:
+            parts.append('ARP {0} {1} -> {2}'.format(
+                {1: 'request', 2: 'reply'}.get(op, op), src, dst))
+        for src, dst, icmp_type in self.icmps:
+            parts.append('ICMP type={0} {1} -> {2}'.format(
+                icmp_type, src, dst))
+        if not self.arps and not self.icmps and self.ips:
+            parts.append('IP {0} -> {1} proto={2}'.format(*self.ips[-1]))
+        return '<Packet {0}>'.format(' '.join(parts))
+
+
+def _decode_arp(data, offset, end, packet):
+    if end - offset < 8:
+        return
+    _, proto, hlen, plen, op = struct.unpack_from('!HHBBH', data, offset)
+    if proto != ETH_P_IP or plen != 4 or offset + 8 + 2 * hlen + 8 > end:
+        return
+    offset += 8
+    sender = socket.inet_ntoa(data[offset + hlen:offset + hlen + 4])
+    offset += hlen + 4
+    target = socket.inet_ntoa(data[offset + hlen:offset + hlen + 4])
+    packet.arps.append((op, sender, target))
+
+
+def _decode_udp(data, offset, end, packet, depth):
+    if end - offset < 8:
+        return
+    sport, dport = struct.unpack_from('!HH', data, offset)
+    offset += 8
+    if VXLAN_PORT in (sport, dport) and end - offset >= 8:
+        flags, vni = struct.unpack_from('!B3xI', data, offset)
+        if flags & 0x08:
+            packet.vnis.append(vni >> 8)
+            _decode_ethernet(data, offset + 8, end, packet, depth + 1)
+
+
+def _decode_ipv4(data, offset, end, packet, depth):
+    if end - offset < 20:
+        return
+    ver_ihl, total_len, frag, proto = struct.unpack_from(
+        '!BxHxxHxB', data, offset)
+    ihl = (ver_ihl & 0x0F) * 4
+    src = socket.inet_ntoa(data[offset + 12:offset + 16])
+    dst = socket.inet_ntoa(data[offset + 16:offset + 20])
+    packet.ips.append((src, dst, proto))
+    if frag & 0x1FFF:
+        # not first fragment, there is no L4 header
+        return
+    end = min(end, offset + total_len) if total_len else end
+    offset += ihl
+    if proto == IPPROTO_ICMP and end - offset >= 1:
+        packet.icmps.append((src, dst, struct.unpack_from(
+            '!B', data, offset)[0]))
+    elif proto == IPPROTO_UDP:
+        _decode_udp(data, offset, end, packet, depth)
+
+
+def _decode_ipv6(data, offset, end, packet, depth):
+    if end - offset < 40:
+        return
+    proto = struct.unpack_from('!B', data, offset + 6)[0]
+    src = socket.inet_ntop(socket.AF_INET6, data[offset + 8:offset + 24])
+    dst = socket.inet_ntop(socket.AF_INET6, data[offset + 24:offset + 40])
+    packet.ips.append((src, dst, proto))
+    offset += 40
+    if proto == IPPROTO_ICMPV6 and end - offset >= 1:
+        packet.icmps.append((src, dst, struct.unpack_from(
+            '!B', data, offset)[0]))
+    elif proto == IPPROTO_UDP:
+        _decode_udp(data, offset, end, packet, depth)
+
+
+def _decode_l3(ethertype, data, offset, end, packet, depth):
+    if depth > MAX_DEPTH:
+        return
+    if ethertype == ETH_P_IP:
+        _decode_ipv4(data, offset, end, packet, depth)
+    elif ethertype == ETH_P_ARP:
+        _decode_arp(data, offset, end, packet)
+    elif ethertype == ETH_P_IPV6:
+        _decode_ipv6(data, offset, end, packet, depth)
+
+
+def _decode_ethernet(data, offset, end, packet, depth=0):
+    if end - offset < 14:
+        return
+    ethertype = struct.unpack_from('!H', data, offset + 12)[0]
+    offset += 14
+    while ethertype in ETH_P_VLANS and end - offset >= 4:
+        ethertype = struct.unpack_from('!H', data, offset + 2)[0]
+        offset += 4
+    _decode_l3(ethertype, data, offset, end, packet, depth)
+
+
+def _decode_sll(data, offset, end, packet):
+    if end - offset < 16:
+        return
+    ethertype = struct.unpack_from('!H', data, offset + 14)[0]
+    _decode_l3(ethertype, data, offset + 16, end, packet, 0)
+
+
+def _decode_sll2(data, offset, end, packet):
+    if end - offset < 20:
+        return
+    ethertype = struct.unpack_from('!H', data, offset)[0]
+    _decode_l3(ethertype, data, offset + 20, end, packet, 0)
+
+
+def _decode_raw(data, offset, end, packet):
+    if end - offset < 1:
+        return
+    version = struct.unpack_from('!B', data, offset)[0] >> 4
+    ethertype = {4: ETH_P_IP, 6: ETH_P_IPV6}.get(version)
+    _decode_l3(ethertype, data, offset, end, packet, 0)
+
+
+LINK_DECODERS = {
+    LINKTYPE_ETHERNET: _decode_ethernet,
+    LINKTYPE_RAW: _decode_raw,
+    12: _decode_raw,
+    LINKTYPE_LINUX_SLL: _decode_sll,
+    LINKTYPE_LINUX_SLL2: _decode_sll2,
+}
+
+
+def decode_packet(linktype, data, offset, end, number=0, timestamp=0.0):
+    """Decode packet data from `offset` to `end` of buffer"""
+    packet = Packet(number, timestamp, end - offset)
+    decoder = LINK_DECODERS.get(linktype)
+    if decoder is not None:
+        try:
+            decoder(data, offset, end, packet)
+        except (struct.error, ValueError, socket.error) as e:
+            logger.debug('Packet #{0} is malformed: {1}'.format(number, e))
+    return packet
+
+
+PCAP_MAGICS = {
+    # magic: (endian, timestamp fraction divisor)
+    b'\xd4\xc3\xb2\xa1': ('<', 1e6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e9),
+}
+
+
+def _parse_pcap_header(data):
+    """Returns (record header struct, divisor, linktype) of pcap file"""
+    try:
+        endian, divisor = PCAP_MAGICS[data[:4]]
+    except KeyError:
+        raise PcapError('Unknown capture file format')
+    linktype = struct.unpack_from(endian + 'I', data, 20)[0] & 0x0FFFFFFF
+    return struct.Struct(endian + 'IIII'), divisor, linktype
+
+
+class PcapStream(object):
+    """Incremental parser of pcap stream (`tcpdump -w -` output)
+
+    Data chunks of any size are passed to `feed`, which returns packets
+    completed by chunk.
+    """
+
+    def __init__(self):
+        self.buffer = b''
+        self.header = None
+        self.count = 0
+
+    def feed(self, data):
+        self.buffer += data
+        if self.header is None:
+            if len(self.buffer) < 24:
+                return []
+            self.header = _parse_pcap_header(self.buffer)
+            self.buffer = self.buffer[24:]
+        header, divisor, linktype = self.header
+        packets = []
+        offset = 0
+        size = len(self.buffer)
+        while offset + 16 <= size:
+            sec, frac, caplen, _ = header.unpack_from(self.buffer, offset)
+            if offset + 16 + caplen > size:
+                break
+            self.count += 1
+            packets.append(decode_packet(
+                linktype, self.buffer, offset + 16, offset + 16 + caplen,
+                self.count, sec + frac / divisor))
+            offset += 16 + caplen
+        self.buffer = self.buffer[offset:]
+        return packets
+
+
+def other_vni(vni):
+    """Returns predicate for VXLAN packets with VNI not equal to `vni`"""
+    vni = int(vni)
+    return lambda x: any(v != vni for v in x.vnis)
+
+
+def arp(src_ip=None, dst_ip=None):
+    """Returns predicate for packets with ARP from `src_ip` for `dst_ip`"""
+    return lambda x: any(src_ip in (None, src) and dst_ip in (None, dst)
+                         for _, src, dst in x.arps)
+
+
+def icmp(src_ip=None, dst_ip=None, vni=None):
+    """Returns predicate for packets with ICMP from `src_ip` to `dst_ip`
+
+    If `vni` is set, packet should be encapsulated to VXLAN with this VNI.
+    """
+    def predicate(packet):
+        if vni is not None and int(vni) not in packet.vnis:
+            return False
+        return any(src_ip in (None, src) and dst_ip in (None, dst)
+                   for src, dst, _ in packet.icmps)
+    return predicate
+
+
+def format_packets(packets, limit=20):
+    """Returns text representation of packets list"""
+    lines = [repr(x) for x in packets[:limit]]
+    if len(packets) > limit:
+        lines.append('... and {0} more'.format(len(packets) - limit))
+    return '\n'.join(lines)
@@ -0,0 +1,49 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+
+
+def percentile(values, percent):
+    """Returns percentile of values with linear interpolation
+
+    :param values: iterable of numbers
+    :param percent: percentile in range 0..100
+    :returns: float or None for empty values
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * percent / 100.
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    fraction = position - lower
+    return values[lower] + (values[upper] - values[lower]) * fraction
+
+
+def summary(values, percents=(50, 95, 99)):
+    """Returns OrderedDict with count, min, percentiles, max and avg
+
+    Percentiles are named as `p50`, `p95`, etc.
+    """
+    values = sorted(values)
+    result = OrderedDict([('count', len(values))])
+    if not values:
+        return result
+    result['min'] = values[0]
+    for percent in percents:
+        result['p{0}'.format(percent)] = percentile(values, percent)
+    result['max'] = values[-1]
+    result['avg'] = sum(values) / float(len(values))
+    return result
@@ -0,0 +1,115 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import defaultdict
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import logging
+import time
+
+import pytest
+
+from mos_tests.functions import stats
+from mos_tests.neutron import xdist_scheduling
+
+
+logger = logging.getLogger(__name__)
+
+
+class Benchmark(object):
+    """Pytest plugin, which collects convergence times of benchmark tests
+
+    Tests marked with `benchmark` are deselected unless `--benchmark-repeat`
+    option is set. Each test repeats its scenario `repeat` times and times
+    convergence with `measure` context manager. Samples are aggregated by
+    scenario name and reported with percentiles to terminal and JSON file.
+    """
+
+    name = 'benchmark'
+
+    def __init__(self, config, repeat=None, report_path=None):
+        self.config = config
+        self.repeat = repeat
+        self.report_path = report_path
+        self.is_worker = xdist_scheduling.get_worker_id(config) is not None
+        self.current = None
+        self.results = defaultdict(list)
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        if self.repeat:
+            return
+        deselected = [x for x in items if x.get_marker('benchmark')]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = [x for x in items if not x.get_marker('benchmark')]
+
+    def record(self, name, value):
+        """Add sample (in seconds) to scenario `name`"""
+        logger.info('Benchmark {0}: {1:.2f}s'.format(name, value))
+        if self.current is not None:
+            self.current[name].append(round(value, 3))
+
+    @contextmanager
+    def measure(self, name):
+        """Add time of code block to samples of scenario `name`"""
+        start = time.time()
+        yield
+        self.record(name, time.time() - start)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.current = defaultdict(list)
+        yield
+        self.current = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        if call.when == 'teardown' and self.current:
+            # samples are sent to xdist master with report
+            outcome.get_result().benchmark = dict(self.current)
+
+    def pytest_runtest_logreport(self, report):
+        if self.is_worker or report.when != 'teardown':
+            return
+        for name, samples in getattr(report, 'benchmark', {}).items():
+            self.results[name].extend(samples)
+
+    def get_report(self):
+        scenarios = OrderedDict()
+        for name in sorted(self.results):
+            samples = self.results[name]
+            scenarios[name] = stats.summary(samples, percents=(50, 95))
+            scenarios[name]['samples'] = samples
+        return OrderedDict([
+            ('created', time.time()),
+            ('env', self.config.getoption('--env')),
+            ('fuel_ip', self.config.getoption('--fuel-ip')),
+            ('repeat', self.repeat),
+            ('scenarios', scenarios),
+        ])
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.is_worker or not self.results:
+            return
+        report = self.get_report()
+        if self.report_path:
+            with open(self.report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+        terminalreporter.write_sep('-', 'failover benchmark')
+        for name, result in report['scenarios'].items():
+            terminalreporter.write_line(
+                '{0:>30}: n={count} p50={p50:.1f}s p95={p95:.1f}s '
+                'max={max:.1f}s'.format(name, **result))
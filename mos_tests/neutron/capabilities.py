@@ -0,0 +1,196 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import fcntl
+import json
+import logging
+
+from six.moves import configparser
+
+from mos_tests.environment.devops_client import DevopsClient
+from mos_tests.environment.fuel_client import FuelClient
+from mos_tests.functions.parallel import parallel_map
+from mos_tests.settings import KEYSTONE_PASS
+from mos_tests.settings import KEYSTONE_USER
+from mos_tests.settings import SERVER_ADDRESS
+from mos_tests.settings import SSH_CREDENTIALS
+
+
+logger = logging.getLogger(__name__)
+
+# Names of env checks, which can be used with `check_env_` marker
+CHECKS = (
+    'is_ha',
+    'has_1_or_more_computes',
+    'has_2_or_more_computes',
+    'has_3_or_more_computes',
+    'is_vlan',
+    'is_vxlan',
+    'is_l2pop',
+    'is_dvr',
+    'is_l3_ha',
+)
+
+
+def is_ha(env):
+    """Env deployed with HA (3 controllers)"""
+    return env.is_ha and len(env.get_nodes_by_role('controller')) >= 3
+
+
+def has_1_or_more_computes(env):
+    """Env deployed with 1 or more computes"""
+    return len(env.get_nodes_by_role('compute')) >= 1
+
+
+def has_2_or_more_computes(env):
+    """Env deployed with 2 or more computes"""
+    return len(env.get_nodes_by_role('compute')) >= 2
+
+
+def has_3_or_more_computes(env):
+    """Env deployed with 3 or more computes"""
+    return len(env.get_nodes_by_role('compute')) >= 3
+
+
+def is_vlan(env):
+    """Env deployed with vlan segmentation"""
+    return env.network_segmentation_type == 'vlan'
+
+
+def is_vxlan(env):
+    """Env deployed with vxlan segmentation"""
+    return env.network_segmentation_type == 'tun'
+
+
+def get_config_option(fp, key, res_type):
+    """Find and return value for key in INI-like file"""
+    parser = configparser.RawConfigParser()
+    parser.readfp(fp)
+    if res_type is bool:
+        getter = parser.getboolean
+    else:
+        getter = parser.get
+    for section in parser.sections():
+        if parser.has_option(section, key):
+            return getter(section, key)
+
+
+def is_l2pop(env):
+    """Env deployed with vxlan segmentation and l2 population"""
+    controller = env.get_nodes_by_role('controller')[0]
+    with env.get_ssh_to_node(controller.data['ip']) as remote:
+        with remote.open('/etc/neutron/plugin.ini') as f:
+            return get_config_option(f, 'l2_population', bool) is True
+
+
+def is_dvr(env):
+    """Env deployed with enabled distributed routers support"""
+    controller = env.get_nodes_by_role('controller')[0]
+    with env.get_ssh_to_node(controller.data['ip']) as remote:
+        with remote.open('/etc/neutron/plugin.ini') as f:
+            return get_config_option(
+                f, 'enable_distributed_routing', bool) is True
+
+
+def is_l3_ha(env):
+    """Env deployed with enabled distributed routers support"""
+    controller = env.get_nodes_by_role('controller')[0]
+    with env.get_ssh_to_node(controller.data['ip']) as remote:
+        with remote.open('/etc/neutron/neutron.conf') as f:
+            return get_config_option(f, 'l3_ha', bool) is True
+
+
+def get_check(name):
+    """Returns env check function by name or None"""
+    if name in CHECKS:
+        return globals()[name]
+
+
+def compute_profile(env, checks=CHECKS):
+    """Evaluate env checks simultaneously
+
+    :returns: dict with check name as key and check result as value,
+        failed checks are not included
+    """
+    results = parallel_map(lambda name: get_check(name)(env), checks,
+                           raise_on_error=False)
+    profile = {}
+    for name, result in zip(checks, results):
+        if isinstance(result, Exception):
+            logger.warning('Env check {0} failed: {1!r}'.format(name, result))
+        else:
+            profile[name] = bool(result)
+    return profile
+
+
+def get_fuel_master_ip(config):
+    """Returns fuel master ip from options, devops env or settings"""
+    fuel_ip = config.getoption("--fuel-ip")
+    if not fuel_ip:
+        fuel_ip = DevopsClient.get_admin_node_ip(
+            env_name=config.getoption("--env"))
+    return fuel_ip or SERVER_ADDRESS
+
+
+def get_env(config):
+    """Returns Environment of latest cluster on Fuel master from options"""
+    fuel = FuelClient(ip=get_fuel_master_ip(config),
+                      login=KEYSTONE_USER,
+                      password=KEYSTONE_PASS,
+                      ssh_login=SSH_CREDENTIALS['login'],
+                      ssh_password=SSH_CREDENTIALS['password'])
+    return fuel.get_last_created_cluster()
+
+
+def _get_cache_key(config, snapshot_name=None):
+    return 'mos_tests/capabilities/{0}/{1}/{2}'.format(
+        config.getoption('--env') or '-',
+        snapshot_name or config.getoption('--snapshot') or '-',
+        config.getoption('--fuel-ip') or '-')
+
+
+def get_cached_profile(config, snapshot_name=None):
+    """Returns profile saved to pytest cache by previous runs or None
+
+    Revision isn't checked, so Fuel is not requested.
+    """
+    cached = config.cache.get(_get_cache_key(config, snapshot_name), None)
+    if cached is not None:
+        return cached['profile']
+
+
+def load_profile(config, env, snapshot_name=None):
+    """Returns capabilities profile of env under test
+
+    Profile is computed once per env revision and saved to pytest cache
+    with env, snapshot and fuel ip as key, so it is shared between runs
+    and xdist workers. It should be called when env is ready.
+
+    :param env: fuel_client.Environment instance
+    :param snapshot_name: name of reverted snapshot, `--snapshot` option by
+        default
+    """
+    key = _get_cache_key(config, snapshot_name)
+    # revision is stored to json, so it should be compared as json too
+    revision = json.loads(json.dumps(env.get_revision()))
+    lock_path = config.cache.makedir('mos_tests').join('capabilities.lock')
+    with open(str(lock_path), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cached = config.cache.get(key, None)
+        if cached is not None and cached['revision'] == revision:
+            return cached['profile']
+        logger.info('Compute env capabilities profile')
+        profile = compute_profile(env)
+        config.cache.set(key, {'revision': revision, 'profile': profile})
+    return profile
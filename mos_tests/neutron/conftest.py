@@ -12,12 +12,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from distutils.spawn import find_executable
+import logging
+
 import pytest
-from six.moves import configparser
 
 from mos_tests.environment.devops_client import DevopsClient
-from mos_tests.settings import SERVER_ADDRESS
+from mos_tests.neutron.benchmark import Benchmark
+from mos_tests.neutron import capabilities
+from mos_tests.neutron.durations import DurationsDB
+from mos_tests.neutron.phases import phase
+from mos_tests.neutron.phases import PhaseTimer
+from mos_tests.neutron.snapshot_scheduler import SnapshotScheduler
+from mos_tests.neutron import xdist_scheduling
+from mos_tests.settings import DURATIONS_DB
+
+
+logger = logging.getLogger(__name__)
 
 
 def pytest_addoption(parser):
@@ -27,6 +37,22 @@ def pytest_addoption(parser):
                      help="Fuel devops env name")
     parser.addoption("--snapshot", '-S', action="store",
                      help="Fuel devops snapshot name")
+    parser.addoption("--ostf", action="store_true", default=False,
+                     help="Wait for OSTF tests pass before each test instead "
+                          "of fast readiness checks")
+    parser.addoption("--worker-envs", action="store",
+                     help="Bind xdist workers to envs, format is "
+                          "gw0=env[:snapshot[:fuel_ip]],gw1=...")
+    parser.addoption("--durations-db", action="store", default=DURATIONS_DB,
+                     help="Path to SQLite database with tests durations, "
+                          "durations are not stored if it's not set")
+    parser.addoption("--phases-report", action="store",
+                     help="Path to JSON report with tests phases durations")
+    parser.addoption("--benchmark-repeat", action="store", type=int,
+                     help="Run benchmark tests, each scenario is repeated "
+                          "given times")
+    parser.addoption("--benchmark-report", action="store",
+                     help="Path to JSON report with benchmark results")
 
 
 def pytest_configure(config):
@@ -37,17 +63,33 @@ def pytest_configure(config):
     config.addinivalue_line("markers",
         "need_devops: mark test wich need devops to run")
     config.addinivalue_line("markers",
-        "neeed_tshark: mark test wich need tshark to be installed to run")
-
-
-def pytest_runtest_makereport(item, call):
-    if call.excinfo is not None and call.excinfo.typename == 'Skipped':
-        setattr(item, 'env_destroyed', False)
-
-
-def pytest_runtest_teardown(item, nextitem):
-    if not getattr(item, 'env_destroyed', True) and nextitem is not None:
-        setattr(nextitem, 'do_revert', False)
+        "non_destructive: mark test which doesn't break env, so it can be "
+        "run without snapshot revert after previous non destructive test")
+    config.addinivalue_line("markers",
+        "snapshot(name): mark test to run on specific devops snapshot")
+    config.addinivalue_line("markers",
+        "benchmark: mark test which measures convergence time, it's run "
+        "only with --benchmark-repeat option")
+    config.pluginmanager.register(SnapshotScheduler(config),
+                                  SnapshotScheduler.name)
+    xdist_scheduling.configure_worker(config)
+    if config.getoption('--durations-db'):
+        config.pluginmanager.register(
+            DurationsDB(config, config.getoption('--durations-db')),
+            DurationsDB.name)
+    config.pluginmanager.register(
+        PhaseTimer(config, config.getoption('--phases-report')),
+        PhaseTimer.name)
+    config.pluginmanager.register(
+        Benchmark(config, config.getoption('--benchmark-repeat'),
+                  config.getoption('--benchmark-report')),
+        Benchmark.name)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    if config.getoption('--worker-envs'):
+        return xdist_scheduling.EnvAwareScheduling(config, log)
 
 
 @pytest.fixture
@@ -63,102 +105,111 @@ def snapshot_name(request):
 @pytest.fixture
 def revert_snapshot(request, env_name, snapshot_name):
     """Revert Fuel devops snapshot before test"""
-    if getattr(request.node, 'do_revert', True):
-        DevopsClient.revert_snapshot(env_name=env_name,
-                                     snapshot_name=snapshot_name)
-        setattr(request.node, 'do_revert', False)
+    scheduler = request.config.pluginmanager.getplugin(
+        SnapshotScheduler.name)
+    snapshot_name = scheduler.get_snapshot(request.node, snapshot_name)
+    if (getattr(request.node, 'do_revert', True) and
+            scheduler.need_revert(request.node, snapshot_name)):
+        with phase('revert'):
+            DevopsClient.revert_snapshot(env_name=env_name,
+                                         snapshot_name=snapshot_name)
+        scheduler.reverted(snapshot_name)
+        setattr(request.config, 'ostf_required', True)
+    setattr(request.node, 'do_revert', False)
 
 
 @pytest.fixture
 def fuel_master_ip(request, env_name, snapshot_name):
     """Get fuel master ip"""
-    fuel_ip = request.config.getoption("--fuel-ip")
-    if not fuel_ip:
-        fuel_ip = DevopsClient.get_admin_node_ip(env_name=env_name)
+    if not request.config.getoption("--fuel-ip"):
         revert_snapshot(request, env_name, snapshot_name)
         setattr(request.node, 'do_revert', False)
-    if not fuel_ip:
-        fuel_ip = SERVER_ADDRESS
-    return fuel_ip
-
-
-def is_ha(env):
-    """Env deployed with HA (3 controllers)"""
-    return env.is_ha and len(env.get_nodes_by_role('controller')) >= 3
-
-
-def has_1_or_more_computes(env):
-    """Env deployed with 1 or more computes"""
-    return len(env.get_nodes_by_role('compute')) >= 1
-
-
-def has_2_or_more_computes(env):
-    """Env deployed with 2 or more computes"""
-    return len(env.get_nodes_by_role('compute')) >= 2
-
-
-def has_3_or_more_computes(env):
-    """Env deployed with 3 or more computes"""
-    return len(env.get_nodes_by_role('compute')) >= 3
-
-
-def is_vlan(env):
-    """Env deployed with vlan segmentation"""
-    return env.network_segmentation_type == 'vlan'
-
-
-def is_vxlan(env):
-    """Env deployed with vxlan segmentation"""
-    return env.network_segmentation_type == 'tun'
-
-
-def get_config_option(fp, key, res_type):
-    """Find and return value for key in INI-like file"""
-    parser = configparser.RawConfigParser()
-    parser.readfp(fp)
-    if res_type is bool:
-        getter = parser.getboolean
-    else:
-        getter = parser.get
-    for section in parser.sections():
-        if parser.has_option(section, key):
-            return getter(section, key)
-
-
-def is_l2pop(env):
-    """Env deployed with vxlan segmentation and l2 population"""
-    controller = env.get_nodes_by_role('controller')[0]
-    with env.get_ssh_to_node(controller.data['ip']) as remote:
-        with remote.open('/etc/neutron/plugin.ini') as f:
-            return get_config_option(f, 'l2_population', bool) is True
-
-
-def is_dvr(env):
-    """Env deployed with enabled distributed routers support"""
-    controller = env.get_nodes_by_role('controller')[0]
-    with env.get_ssh_to_node(controller.data['ip']) as remote:
-        with remote.open('/etc/neutron/plugin.ini') as f:
-            return get_config_option(
-                f, 'enable_distributed_routing', bool) is True
-
-
-def is_l3_ha(env):
-    """Env deployed with enabled distributed routers support"""
-    controller = env.get_nodes_by_role('controller')[0]
-    with env.get_ssh_to_node(controller.data['ip']) as remote:
-        with remote.open('/etc/neutron/neutron.conf') as f:
-            return get_config_option(f, 'l3_ha', bool) is True
+    return capabilities.get_fuel_master_ip(request.config)
+
+
+def get_collection_profile(config):
+    """Returns capabilities profile for tests deselection or None
+
+    Profile saved by previous runs is used, so collection doesn't depend on
+    env state. Otherwise it's loaded from env, if env is available.
+    """
+    profile = capabilities.get_cached_profile(config)
+    if profile is not None:
+        return profile
+    try:
+        return capabilities.load_profile(config, capabilities.get_env(config))
+    except Exception:
+        logger.warning("Can't get env capabilities, checks will be done "
+                       "before each test", exc_info=True)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(session, config, items):
+    """Deselect tests, which are incompatible with env under test
+
+    With `--worker-envs` each xdist worker deselects tests by capabilities
+    of its own env.
+    """
+    if not any(x.get_marker('check_env_') for x in items):
+        return
+    profile = get_collection_profile(config)
+    if profile is None:
+        return
+    config.collection_capabilities = profile
+    selected = []
+    deselected = []
+    for item in items:
+        marker = item.get_marker('check_env_')
+        if marker and any(profile.get(x) is False for x in marker.args):
+            deselected.append(item)
+        else:
+            selected.append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
 
 
 @pytest.fixture(autouse=True)
-def env_requirements(request, env):
-    if request.node.get_marker('check_env_'):
-        for func_name in request.node.get_marker('check_env_').args:
-            func = globals().get(func_name)
-            if func is not None and not func(env):
-                doc = func.__doc__ or 'Env {}'.format(
-                    func_name.replace('_', ' '))
-                pytest.skip('Requires: {}'.format(doc))
+def env_requirements(request):
+    """Skip test if env doesn't pass its `check_env_` checks
+
+    Incompatible tests are usually deselected on collection. If there was
+    no profile on collection, it's loaded at first test setup after each
+    snapshot revert, so checks are done on ready env.
+    """
+    marker = request.node.get_marker('check_env_')
+    if marker is None:
+        return
+    profile = getattr(request.config, 'collection_capabilities', None)
+    if profile is None:
+        env = request.getfuncargvalue('env')
+        scheduler = request.config.pluginmanager.getplugin(
+            SnapshotScheduler.name)
+        profiles = getattr(request.config, 'env_capabilities', None)
+        if profiles is None:
+            profiles = request.config.env_capabilities = {}
+        profile = profiles.get(scheduler.current_snapshot)
+        if profile is None:
+            try:
+                profile = capabilities.load_profile(
+                    request.config, env, scheduler.current_snapshot)
+            except Exception:
+                logger.warning("Can't get env capabilities profile, checks "
+                               "will be done one by one", exc_info=True)
+                profile = {}
+            profiles[scheduler.current_snapshot] = profile
+    for func_name in marker.args:
+        func = capabilities.get_check(func_name)
+        if func is None:
+            continue
+        if func_name not in profile:
+            # check was failed on profile computing
+            env = request.getfuncargvalue('env')
+            profile[func_name] = bool(func(env))
+        if not profile[func_name]:
+            doc = func.__doc__ or 'Env {}'.format(
+                func_name.replace('_', ' '))
+            pytest.skip('Requires: {}'.format(doc))
 
 
 @pytest.fixture(autouse=True)
@@ -168,11 +219,3 @@ def devops_requirements(request, env_name):
             DevopsClient.get_env(env_name=env_name)
         except Exception:
             pytest.skip('requires devops env to be defined')
-
-
-@pytest.fixture(autouse=True)
-def tshark_requirements(request, env_name):
-    if request.node.get_marker('need_tshark'):
-        path = find_executable('tshark')
-        if path is None:
-            pytest.skip('requires tshark executable')
@@ -0,0 +1,159 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import defaultdict
+from contextlib import contextmanager
+import logging
+import sqlite3
+import time
+
+from mos_tests.neutron import xdist_scheduling
+
+
+logger = logging.getLogger(__name__)
+
+
+class DurationsDB(object):
+    """Pytest plugin, which stores tests durations to SQLite database
+
+    Durations of setup, call and teardown are stored per env type (devops
+    env name or Fuel master ip). History is used to run longest tests first,
+    to estimate run time and to find tests with regressed duration.
+    """
+
+    name = 'durations_db'
+
+    # count of latest runs used for duration estimation
+    history_size = 5
+    # duration is regressed if it is `regression_ratio` times longer than
+    # estimation and at least `regression_min` seconds longer
+    regression_ratio = 1.5
+    regression_min = 30
+
+    def __init__(self, config, path):
+        self.config = config
+        self.path = path
+        self.reports = defaultdict(dict)
+        self.regressions = []
+        # estimations by env type, loaded once per session
+        self._estimations = {}
+        self.is_worker = xdist_scheduling.get_worker_id(config) is not None
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS durations ('
+                         'nodeid TEXT, env_type TEXT, setup REAL, '
+                         'call REAL, teardown REAL, outcome TEXT, '
+                         'created REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS durations_idx '
+                         'ON durations (env_type, nodeid)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_env_type(self, worker_id=None):
+        """Returns env type of current process or of xdist worker"""
+        options = {
+            'env': self.config.getoption('--env'),
+            'fuel_ip': self.config.getoption('--fuel-ip'),
+        }
+        spec = xdist_scheduling.parse_worker_envs(
+            self.config.getoption('--worker-envs')).get(worker_id, {})
+        options.update((k, v) for k, v in spec.items() if v is not None)
+        return options['env'] or options['fuel_ip'] or 'default'
+
+    def get_estimations(self, env_type):
+        """Returns dict with average total duration of latest runs by nodeid
+        """
+        history = defaultdict(list)
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT nodeid, setup + call + teardown FROM durations '
+                'WHERE env_type = ? AND outcome = ? ORDER BY created DESC',
+                (env_type, 'passed'))
+            for nodeid, duration in rows:
+                if len(history[nodeid]) < self.history_size:
+                    history[nodeid].append(duration)
+        return {k: sum(v) / len(v) for k, v in history.items()}
+
+    def get_cached_estimations(self, env_type):
+        """Returns estimations loaded at first call for env type, so
+        durations of current session don't affect them
+        """
+        if env_type not in self._estimations:
+            self._estimations[env_type] = self.get_estimations(env_type)
+        return self._estimations[env_type]
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        # xdist requires same collection order on all workers, but DB may be
+        # changed between workers collections, so tests are not reordered
+        if self.is_worker:
+            return
+        estimations = self.get_cached_estimations(self.get_env_type())
+        if not estimations:
+            return
+        # tests without history are considered as longest
+        longest = max(estimations.values())
+        items.sort(key=lambda x: -estimations.get(x.nodeid, longest))
+        unknown = [x for x in items if x.nodeid not in estimations]
+        total = sum(estimations.get(x.nodeid, 0) for x in items)
+        reporter = config.pluginmanager.getplugin('terminalreporter')
+        if reporter is not None:
+            reporter.write_line(
+                'Estimated run time: {0:.0f} min ({1} tests without '
+                'history)'.format(total / 60., len(unknown)))
+
+    def pytest_runtest_logreport(self, report):
+        # with xdist all reports are received by master, so workers don't
+        # write to database
+        if self.is_worker:
+            return
+        worker_id = getattr(getattr(report, 'node', None), 'gateway', None)
+        key = (report.nodeid, getattr(worker_id, 'id', None))
+        data = self.reports[key]
+        data[report.when] = report.duration
+        if report.when == 'call' or report.failed:
+            data['outcome'] = report.outcome
+        if report.when == 'teardown':
+            self.save(report.nodeid, self.get_env_type(key[1]),
+                      self.reports.pop(key))
+
+    def save(self, nodeid, env_type, data):
+        outcome = data.get('outcome', 'skipped')
+        duration = sum(data.get(x, 0) for x in ('setup', 'call', 'teardown'))
+        if outcome == 'passed':
+            estimation = self.get_cached_estimations(env_type).get(nodeid)
+            if (estimation is not None and
+                    duration > estimation * self.regression_ratio and
+                    duration - estimation > self.regression_min):
+                self.regressions.append((nodeid, env_type, estimation,
+                                         duration))
+        with self._connect() as conn:
+            conn.execute('INSERT INTO durations VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (nodeid, env_type, data.get('setup', 0),
+                          data.get('call', 0), data.get('teardown', 0),
+                          outcome, time.time()))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.regressions:
+            return
+        terminalreporter.write_sep('-', 'tests with regressed duration')
+        for nodeid, env_type, estimation, duration in self.regressions:
+            terminalreporter.write_line(
+                '{0} ({1}): {2:.0f}s, usually {3:.0f}s'.format(
+                    nodeid, env_type, duration, estimation))
@@ -0,0 +1,166 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import defaultdict
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+from mos_tests.neutron import xdist_scheduling
+
+
+logger = logging.getLogger(__name__)
+
+_timer = None
+
+
+@contextmanager
+def phase(name):
+    """Account time of code block to test phase `name`
+
+    Does nothing if PhaseTimer plugin is not active.
+    """
+    if _timer is None:
+        yield
+    else:
+        with _timer.phase(name):
+            yield
+
+
+def sleep(seconds):
+    """`time.sleep`, which is accounted to `sleep` phase"""
+    with phase('sleep'):
+        time.sleep(seconds)
+
+
+class PhaseTimer(object):
+    """Pytest plugin, which measures time of test phases
+
+    Phases are nested, time of each phase doesn't include time of nested
+    ones. Standard phases are `setup`, `body` and `teardown`, other ones
+    are tagged with `phase` context manager (`revert`, `ostf`, `readiness`,
+    `cleanup`), `prepare_openstack*` fixtures and `sleep` helper calls
+    (`sleep`).
+    """
+
+    name = 'phase_timer'
+
+    # count of top time sinks in terminal summary
+    top_count = 10
+
+    def __init__(self, config, report_path=None):
+        global _timer
+        self.config = config
+        self.report_path = report_path
+        self.is_worker = xdist_scheduling.get_worker_id(config) is not None
+        self.current = None
+        self.stack = []
+        self.results = OrderedDict()
+        _timer = self
+
+    def pytest_unconfigure(self, config):
+        global _timer
+        _timer = None
+
+    @contextmanager
+    def phase(self, name):
+        if (self.current is None or
+                threading.current_thread().name != 'MainThread'):
+            yield
+            return
+        self.stack.append([name, time.time(), 0])
+        try:
+            yield
+        finally:
+            name, start, nested = self.stack.pop()
+            elapsed = time.time() - start
+            self.current[name] = self.current.get(name, 0) + elapsed - nested
+            if self.stack:
+                self.stack[-1][2] += elapsed
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.current = OrderedDict()
+        yield
+        self.current = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        with self.phase('setup'):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        with self.phase('body'):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self, item, nextitem):
+        with self.phase('teardown'):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        if 'prepare_openstack' in fixturedef.argname:
+            with self.phase('prepare_openstack'):
+                yield
+        else:
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        if call.when == 'teardown' and self.current is not None:
+            # phases are sent to xdist master with report
+            outcome.get_result().phases = OrderedDict(
+                (k, round(v, 3)) for k, v in self.current.items())
+
+    def pytest_runtest_logreport(self, report):
+        if self.is_worker or report.when != 'teardown':
+            return
+        phases = getattr(report, 'phases', None)
+        if phases:
+            self.results[report.nodeid] = phases
+
+    def get_totals(self):
+        totals = defaultdict(float)
+        for phases in self.results.values():
+            for name, value in phases.items():
+                totals[name] += value
+        return OrderedDict(sorted(totals.items(), key=lambda x: -x[1]))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.is_worker or not self.results:
+            return
+        totals = self.get_totals()
+        if self.report_path:
+            with open(self.report_path, 'w') as f:
+                json.dump({'tests': self.results, 'total': totals}, f,
+                          indent=2)
+        terminalreporter.write_sep('-', 'time by phases')
+        for name, value in totals.items():
+            terminalreporter.write_line('{0:>20}: {1:.1f}s'.format(
+                name, value))
+        sinks = sorted(((value, nodeid, name)
+                        for nodeid, phases in self.results.items()
+                        for name, value in phases.items()), reverse=True)
+        terminalreporter.write_sep('-', 'top time sinks')
+        for value, nodeid, name in sinks[:self.top_count]:
+            terminalreporter.write_line('{0:.1f}s {1} {2}'.format(
+                value, name, nodeid))
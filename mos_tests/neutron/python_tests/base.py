@@ -20,6 +20,7 @@ import pytest
 import six
 from waiting import wait
 
+from mos_tests.environment.connectivity import ConnectivityMesh
 from mos_tests import settings
 
 
@@ -144,15 +145,15 @@ class TestBase(object):
     def check_vm_connectivity(self, timeout=3 * 60):
         """Check that all vms can ping each other and public ip"""
         servers = self.os_conn.get_servers()
-        for server1 in servers:
-            ips_to_ping = [settings.PUBLIC_TEST_IP]
-            for server2 in servers:
-                if server1 == server2:
-                    continue
-                ips_to_ping += self.os_conn.get_nova_instance_ips(
-                    server2).values()
-            self.check_ping_from_vm(server1, self.instance_keypair,
-                                    ips_to_ping, timeout=timeout)
+        mesh = ConnectivityMesh(self.os_conn, self.env,
+                                vm_keypair=self.instance_keypair)
+        matrix = mesh.check(servers, extra_ips=[settings.PUBLIC_TEST_IP],
+                            timeout=timeout)
+        logger.info('Connectivity matrix:\n{0}'.format(
+            mesh.format_matrix(matrix)))
+        failed = mesh.get_failed(matrix)
+        assert not failed, 'Instances have no connectivity: {0}'.format(
+            [(src, dst) for src, dst, _ in failed])
 
     def check_vm_is_available(self, vm,
                               username=None, password=None, pkeys=None):
@@ -17,47 +17,58 @@ import logging
 import pytest
 from waiting import wait
 
-from mos_tests.environment.fuel_client import FuelClient
-from mos_tests.environment.os_actions import OpenStackActions
+from mos_tests.environment.clients import ClientsCache
+from mos_tests.environment.readiness import ReadinessProbe
 from mos_tests.neutron.conftest import revert_snapshot
-from mos_tests.settings import KEYSTONE_PASS
-from mos_tests.settings import KEYSTONE_USER
-from mos_tests.settings import SSH_CREDENTIALS
+from mos_tests.neutron.phases import phase
 
 
 logger = logging.getLogger(__name__)
 
 
+@pytest.yield_fixture(scope='session')
+def clients_cache():
+    """Fuel and OpenStack clients shared between tests"""
+    cache = ClientsCache()
+    yield cache
+    cache.close()
+
+
 @pytest.fixture
-def fuel(fuel_master_ip):
+def fuel(fuel_master_ip, clients_cache):
     """Initialized fuel client"""
-    return FuelClient(ip=fuel_master_ip,
-                      login=KEYSTONE_USER,
-                      password=KEYSTONE_PASS,
-                      ssh_login=SSH_CREDENTIALS['login'],
-                      ssh_password=SSH_CREDENTIALS['password'])
+    return clients_cache.get_fuel(fuel_master_ip)
 
 
 @pytest.fixture
-def env(fuel):
+def env(fuel, clients_cache):
     """Environment instance"""
-    return fuel.get_last_created_cluster()
+    return clients_cache.get_env(fuel)
 
 
 @pytest.fixture
-def os_conn(env):
-    """Openstack common actions"""
-    logger.info("Wait for OpenStack is waking up")
-    wait(env.is_ostf_tests_pass, timeout_seconds=20 * 60, sleep_seconds=20,
-         waiting_for='OpenStack pass OSTF tests')
-    os_conn = OpenStackActions(
-        controller_ip=env.get_primary_controller_ip(),
-        cert=env.certificate, env=env)
-
-    wait(os_conn.is_nova_ready,
-         timeout_seconds=60 * 5,
-         expected_exceptions=Exception,
-         waiting_for="OpenStack nova computes is ready")
+def os_conn(request, env, clients_cache):
+    """Openstack common actions
+
+    Full OSTF tests set is executed only after snapshot revert or with
+    `--ostf` option, otherwise fast readiness checks are used.
+    """
+    if (request.config.getoption('--ostf') or
+            getattr(request.config, 'ostf_required', False)):
+        logger.info("Wait for OpenStack is waking up")
+        with phase('ostf'):
+            wait(env.is_ostf_tests_pass, timeout_seconds=20 * 60,
+                 sleep_seconds=20, waiting_for='OpenStack pass OSTF tests')
+        setattr(request.config, 'ostf_required', False)
+    os_conn = clients_cache.get_os_conn(env)
+
+    probe = ReadinessProbe(env, os_conn)
+    with phase('readiness'):
+        wait(probe.is_ready,
+             timeout_seconds=60 * 5,
+             sleep_seconds=10,
+             expected_exceptions=Exception,
+             waiting_for="OpenStack services are ready")
     logger.info("OpenStack is ready")
     return os_conn
 
@@ -85,6 +96,14 @@ def setup(request, env_name, snapshot_name, env, os_conn):
     if env_name:
         revert_snapshot(request, env_name, snapshot_name)
     yield
-    if not env_name:
-        clear_l3_ban(env, os_conn)
-        clean_os(os_conn)
+    # non destructive test can be followed by other one without revert
+    if not env_name or request.node.get_marker('non_destructive'):
+        with phase('cleanup'):
+            clear_l3_ban(env, os_conn)
+            clean_os(os_conn)
+
+
+@pytest.fixture
+def benchmark(request):
+    """Benchmark plugin to time convergence of repeated scenarios"""
+    return request.config.pluginmanager.getplugin('benchmark')
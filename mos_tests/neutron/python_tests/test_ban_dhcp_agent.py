@@ -17,6 +17,8 @@ import logging
 import pytest
 from waiting import wait
 
+from mos_tests.environment.chaos import ChaosScheduler
+from mos_tests.environment.dhcp import DhcpProber
 from mos_tests.neutron.python_tests import base
 from mos_tests import settings
 
@@ -51,7 +53,8 @@ class TestBaseDHCPAgent(base.TestBase):
         return instance
 
     def ban_dhcp_agent(self, node_to_ban, host, network_name=None,
-                       wait_for_die=True, wait_for_rescheduling=True):
+                       wait_for_die=True, wait_for_rescheduling=True,
+                       sleep_seconds=(1, 60, 5)):
         """Ban DHCP agent and wait until agents rescheduling.
 
         Ban dhcp agent on same node as network placed and wait until agents
@@ -62,6 +65,7 @@ class TestBaseDHCPAgent(base.TestBase):
         :param network_name: name of network to determine node with dhcp agents
         :param wait_for_die: wait until dhcp-agent die
         :param wait_for_rescheduling: wait new dhcp-agent starts
+        :param sleep_seconds: polling interval of agents list
         :returns: str, name of banned node
         """
         list_dhcp_agents = lambda: self.os_conn.list_all_neutron_agents(
@@ -88,7 +92,7 @@ class TestBaseDHCPAgent(base.TestBase):
             wait(
                 lambda: (node_to_ban not in list_dhcp_agents()),
                 timeout_seconds=60 * 3,
-                sleep_seconds=(1, 60, 5),
+                sleep_seconds=sleep_seconds,
                 waiting_for=err_msg.format(node_to_ban))
         # Wait to reschedule dhcp agent
         if wait_for_rescheduling:
@@ -96,7 +100,7 @@ class TestBaseDHCPAgent(base.TestBase):
             wait(
                 lambda: (set(list_dhcp_agents()) - set(current_agents)),
                 timeout_seconds=60 * 3,
-                sleep_seconds=(1, 60, 5),
+                sleep_seconds=sleep_seconds,
                 waiting_for=err_msg)
         return node_to_ban
 
@@ -196,18 +200,36 @@ class TestBaseDHCPAgent(base.TestBase):
             'stdout {stdout}, stderr {stderr}').format(**res)
         assert 0 == res['exit_code'], error_msg
 
-    def check_dhcp_on_cirros_instance(self, vm):
-        """Check dhcp client on Cirros instance.
-
-        :param vm: instance with cirros
+    @pytest.yield_fixture(autouse=True)
+    def close_dhcp_prober(self):
+        yield
+        if getattr(self, '_dhcp_prober', None) is not None:
+            self._dhcp_prober.close()
+
+    @property
+    def dhcp_prober(self):
+        """DhcpProber with sessions to instances by floating ip"""
+        if getattr(self, '_dhcp_prober', None) is None:
+            def ssh_factory(vm):
+                vm = self.os_conn.get_instance_detail(vm)
+                _floating_ip = self.os_conn.get_nova_instance_ips(
+                    vm)['floating']
+                return self.env.get_ssh_to_vm(_floating_ip,
+                                              **self.cirros_creds)
+
+            self._dhcp_prober = DhcpProber(self.os_conn, self.env,
+                                           ssh_factory=ssh_factory)
+        return self._dhcp_prober
+
+    def check_dhcp_on_cirros_instances(self, vms=None):
+        """Check dhcp client on many Cirros instances at once.
+
+        :param vms: instances with cirros, all prepared instances by default
+        :returns: list of received leases
         """
-        cmd = 'sudo -i cirros-dhcpc up eth0'
-        res = self.run_on_cirros(vm, cmd)
-        err_msg = (
-            'DHCP client can\'t get ip, '
-            'exit code {exit_code}, '
-            'stdout {stdout}, stderr {stderr}'.format(**res))
-        assert 0 == res['exit_code'], err_msg
+        leases = self.dhcp_prober.probe(vms or self.instances)
+        self.dhcp_prober.check(leases)
+        return leases
 
     def _prepare_openstack_state(self):
         """Prepare OpenStack for scenarios run
@@ -218,9 +240,10 @@ class TestBaseDHCPAgent(base.TestBase):
             3. Create router with gateway to external net and
                interface with net01
             4. Launch instance and associate floating IP
-            4. Check ping from instance google DNS
-            6. Check run dhcp-client in instance's console:
-               sudo cirros-dhcpc up eth0
+            5. Launch instance with floating IP in each other network
+               connected to router
+            6. Check ping from instance google DNS
+            7. Run dhcp client (udhcpc) on all instances at once
         """
         # init variables
         exist_networks = self.os_conn.list_networks()['networks']
@@ -239,13 +262,29 @@ class TestBaseDHCPAgent(base.TestBase):
             net_name=int_net['network']['name'],
             key_name=self.instance_keypair.name,
             router=router)
-
         self.os_conn.assign_floating_ip(self.instance)
-
-        # check ping from instance and dhcp client on instance
-        self.check_vm_is_available(self.instance, **self.cirros_creds)
+        self.instances = [self.instance]
+
+        # create instance in each other network with router, so all
+        # networks are checked by one DHCP probe
+        routed_nets = {port['network_id'] for port in
+                       self.os_conn.neutron.list_ports(
+                           device_owner='network:router_interface')['ports']}
+        for net in exist_networks:
+            if net.get('router:external') or net['id'] not in routed_nets:
+                continue
+            instance = self.create_cirros_instance_with_ssh(
+                name='server_{0}'.format(net['name']),
+                net_name=net['name'],
+                key_name=self.instance_keypair.name)
+            self.os_conn.assign_floating_ip(instance)
+            self.instances.append(instance)
+
+        # check ping from instance and dhcp client on all instances
+        for instance in self.instances:
+            self.check_vm_is_available(instance, **self.cirros_creds)
         self.check_ping_from_cirros(vm=self.instance)
-        self.check_dhcp_on_cirros_instance(vm=self.instance)
+        self.check_dhcp_on_cirros_instances()
 
 
 class TestBanDHCPAgent(TestBaseDHCPAgent):
@@ -267,12 +306,12 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             3. Create router with gateway to external net and
                interface with net01
             4. Launch instance and associate floating IP
-            5. Run dhcp-client in instance's console: sudo cirros-dhcpc up eth0
+            5. Run dhcp client (udhcpc) on all instances at once
             6. Look on what DHCP-agents chosen network is:
                neutron dhcp-agent-list-hosting-net <network_name>
             7. Ban one DHCP-agent on what chosen network is:
                pcs resource ban p_neutron-dhcp-agent <node>
-            8. Run dhcp-client in instance's console: sudo cirros-dhcpc up eth0
+            8. Run dhcp client (udhcpc) on all instances at once
             9. Check that this network is on other dhcp-agent and
                other health dhcp-agent:
                neutron dhcp-agent-list-hosting-net <network_name>
@@ -293,8 +332,8 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
                                 network_name=self.net_name,
                                 wait_for_rescheduling=(not identifier))
 
-        # check dhcp client on instance
-        self.check_dhcp_on_cirros_instance(vm=self.instance)
+        # check dhcp client on all instances
+        self.check_dhcp_on_cirros_instances()
 
         # check dhcp agent nodes after rescheduling
         new_agents_hosts = self.os_conn.get_node_with_dhcp_for_network(
@@ -315,7 +354,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             3. Create router with gateway to external net and
                interface with net01
             4. Launch instance and associate floating IP
-            5. Run dhcp-client in instance's console: sudo cirros-dhcpc up eth0
+            5. Run dhcp client (udhcpc) on all instances at once
             6. Look on what DHCP-agents chosen network is:
                neutron dhcp-agent-list-hosting-net <network_name>
             7. Ban both DHCP-agent on what chosen network is:
@@ -324,8 +363,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             8. Check that network is on other DHCP-agent(s)
             9. Ban other DHCP-agent(s)
             10. Clear last banned DHCP-agent
-            11. Run dhcp-client in instance's console:
-                sudo cirros-dhcpc up eth0
+            11. Run dhcp client (udhcpc) on all instances at once
             12. Check that this network is on cleared dhcp-agent:
                 neutron dhcp-agent-list-hosting-net <network_name>
             13. Check that all networks is on cleared dhcp-agent:
@@ -371,8 +409,8 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
         cleared_agent = self.clear_dhcp_agent(node_to_clear=last_banned,
                                               host=controller_host,
                                               network_name=self.net_name)
-        # check dhcp client on instance after agent clearing and rescheduling
-        self.check_dhcp_on_cirros_instance(vm=self.instance)
+        # check dhcp client on instances after agent clearing and rescheduling
+        self.check_dhcp_on_cirros_instances()
 
         # check dhcp agent behaviour after clearing
         actual_agents = self.os_conn.get_node_with_dhcp_for_network(
@@ -409,8 +447,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             3. Create router with gateway to external net and
                interface with net01
             4. Launch instance and associate floating IP
-            5. Run dhcp-client in instance's console:
-               ``sudo cirros-dhcpc up eth0``
+            5. Run dhcp client (udhcpc) on all instances at once
             6. Look on what DHCP-agents chosen network is:
                ``neutron dhcp-agent-list-hosting-net <network_name>``
             7. Clear all DHCP-agents on all controllers:
@@ -431,8 +468,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             10. Unban(clear) first banned DHCP-agent and wait it get up:
                 ``pcs resource clear p_neutron-dhcp-agent node-3``
             11. Repeat 7-11 steps for 18 times
-            12. Run dhcp-client in instance's console:
-                ``sudo cirros-dhcpc up eth0``
+            12. Run dhcp client (udhcpc) on all instances at once
             13. Check that this network is on cleared dhcp-agent:
                 ``neutron dhcp-agent-list-hosting-net <network_name>``
             14. Check that all networks is on cleared dhcp-agent:
@@ -494,8 +530,8 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
                            agents_mapping[curr_agents[1]],
                            agents_mapping[free_agent])
 
-        # check dhcp client on instance after dhcp agents killing cycle
-        self.check_dhcp_on_cirros_instance(vm=self.instance)
+        # check dhcp client on instances after dhcp agents killing cycle
+        self.check_dhcp_on_cirros_instances()
 
         # check dhcp agent behaviour after clearing
         actual_agents = self.os_conn.get_node_with_dhcp_for_network(
@@ -527,8 +563,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             3. Create router with gateway to external net and
                interface with net01
             4. Launch instance and associate floating IP
-            5. Run dhcp-client in instance's console:
-               ``sudo cirros-dhcpc up eth0``
+            5. Run dhcp client (udhcpc) on all instances at once
             6. Look on what DHCP-agents chosen network is:
                ``neutron dhcp-agent-list-hosting-net <network_name>``
             7. Ban DHCP-agent on what chosen network is NOT and wait it dies:
@@ -538,8 +573,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             9. Unban (clear) last banned DHCP-agent and wait it get up:
                 ``pcs resource clear p_neutron-dhcp-agent node-1``
             10. Repeat 8-10 steps for 40 times
-            11. Run dhcp-client in instance's console:
-                ``sudo cirros-dhcpc up eth0``
+            11. Run dhcp client (udhcpc) on all instances at once
             12. Check that instance networks is on two dhcp-agents:
                 ``neutron dhcp-agent-list-hosting-net <network_name>``
 
@@ -575,8 +609,8 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             self.clear_dhcp_agent(node_to_clear=curr_agents[0],
                                   host=leader_node_ip)
 
-        # check dhcp client on instance after dhcp agents killing cycle
-        self.check_dhcp_on_cirros_instance(vm=self.instance)
+        # check dhcp client on instances after dhcp agents killing cycle
+        self.check_dhcp_on_cirros_instances()
 
         # check dhcp agent behaviour after clearing
         actual_agents = self.os_conn.get_node_with_dhcp_for_network(
@@ -586,6 +620,56 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
         # check instance network is on same count of dhcp-agents as on start
         assert len(actual_agents) == len(curr_agents), err_msg
 
+    def test_dhcp_agents_chaos_storm(self, cycles_count=20):
+        """Check dhcp-agents convergence under concurrent ban/kill storm.
+
+        Scenario:
+            1. Revert snapshot with neutron cluster
+            2. Create network net01, subnet net01_subnet
+            3. Create router with gateway to external net and
+               interface with net01
+            4. Launch instance and associate floating IP
+            5. Look on what DHCP-agents chosen network is:
+               ``neutron dhcp-agent-list-hosting-net <network_name>``
+            6. Run 20 fault cycles, 2 simultaneously on different
+               controllers, each is one of:
+                ``pcs resource ban p_neutron-dhcp-agent node-1`` and
+                ``pcs resource clear p_neutron-dhcp-agent node-1``
+                or ``killall dnsmasq``
+               After each cycle wait until network is on same count of
+               dhcp-agents as on start
+            7. Check that all cycles are converged
+            8. Run dhcp client (udhcpc) on all instances at once
+
+        Duration 15m
+
+        """
+        all_agents = self.os_conn.list_all_neutron_agents(agent_type='dhcp',
+                                                          filter_attr='host')
+        curr_agents = self.os_conn.get_node_with_dhcp_for_network(
+            net_id=self.net_id)
+
+        faults = []
+        for host in all_agents:
+            faults.append({'action': 'pcs_ban', 'node': host,
+                           'resource': 'p_neutron-dhcp-agent', 'hold': 10})
+            faults.append({'action': 'killall', 'node': host,
+                           'process': 'dnsmasq'})
+
+        def is_converged(fault):
+            agents = self.os_conn.get_node_with_dhcp_for_network(self.net_id)
+            return len(agents) >= len(curr_agents)
+
+        with ChaosScheduler(self.env, faults, rate=0.2, concurrency=2,
+                            converge=is_converged) as chaos:
+            chaos.run(count=cycles_count)
+
+        err_msg = 'Cycles are not converged: {0}'.format(chaos.failed)
+        assert not chaos.failed, err_msg
+
+        # check dhcp client on instances after storm
+        self.check_dhcp_on_cirros_instances()
+
     def test_reschedule_dhcp_agents(self):
         """Check dhcp-agent manual rescheduling.
 
@@ -596,7 +680,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
                interface with net01
             4. Launch instance and associate floating IP
             5. Check ports on net
-            6. Run dhcp-client in instance's console: sudo cirros-dhcpc up eth0
+            6. Run dhcp client (udhcpc) on all instances at once
             7. Look on what DHCP-agents chosen network is:
                neutron dhcp-agent-list-hosting-net <network_name>
             8. Remove network from one of dhcp-agents:
@@ -605,8 +689,7 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
                neutron dhcp-agent-list-hosting-net <network_name>
             10. Set network to other dhcp-agent:
                 neutron dhcp-agent-network-add <agent_id> <network>
-            11. Run dhcp-client in instance's console:
-                sudo cirros-dhcpc up eth0
+            11. Run dhcp client (udhcpc) on all instances at once
             12. Check that ports on net wasn't affected
 
 
@@ -651,8 +734,8 @@ class TestBanDHCPAgent(TestBaseDHCPAgent):
             net_id=self.net_id)
         assert free_agent in new_agents, err_msg
 
-        # check dhcp client on instance
-        self.check_dhcp_on_cirros_instance(vm=self.instance)
+        # check dhcp client on all instances
+        self.check_dhcp_on_cirros_instances()
 
         # check, that ports was not affected
         new_ports_ids = [
@@ -740,13 +823,12 @@ class TestBanDHCPAgentWithSettings(TestBaseDHCPAgent):
             4. Create router with gateway to external net and
                interface with net01
             5. Launch instance and associate floating IP
-            6. Run dhcp-client in instance's console: sudo cirros-dhcpc up eth0
+            6. Run dhcp client (udhcpc) on all instances at once
             7. Look on what DHCP-agents chosen network is:
                ``neutron dhcp-agent-list-hosting-net <network_name>``
             8. Ban DHCP-agent on which instance's net is:
                ``pcs resource ban p_neutron-dhcp-agent node-x``
-            9. Run dhcp-client in instance's console:
-               ``sudo cirros-dhcpc up eth0``
+            9. Run dhcp client (udhcpc) on all instances at once
             10. Repeat previous 3 steps two times.
             11. Check that all networks is on last dhcp-agent:
                 ``neutron net-list-on-dhcp-agent <id_clr_agnt>``
@@ -756,8 +838,7 @@ class TestBanDHCPAgentWithSettings(TestBaseDHCPAgent):
                 ``pcs resource clear p_neutron-dhcp-agent node-1``
             14. Check that all networks is on cleared dhcp-agent:
                 ``neutron net-list-on-dhcp-agent <id_clr_agnt>|grep net|wc -l``
-            15. Run dhcp-client in instance's console:
-                ``sudo cirros-dhcpc up eth0``
+            15. Run dhcp client (udhcpc) on all instances at once
 
         Duration 15m
 
@@ -779,7 +860,7 @@ class TestBanDHCPAgentWithSettings(TestBaseDHCPAgent):
             self.ban_dhcp_agent(curr_agents[0], leader_node_ip, self.net_name,
                                 wait_for_rescheduling=(net_on_dhcp_count == 1))
             banned_agents.append(curr_agents[0])
-            self.check_dhcp_on_cirros_instance(vm=self.instance)
+            self.check_dhcp_on_cirros_instances()
 
         # check that all networks are on free agent
         last_agent = (set(agents_mapping.keys()) - set(banned_agents)).pop()
@@ -810,4 +891,4 @@ class TestBanDHCPAgentWithSettings(TestBaseDHCPAgent):
                                                   nets_on_cleared_dhcp_agent))
         assert set(agents_networks) == set(nets_on_cleared_dhcp_agent), err_msg
 
-        self.check_dhcp_on_cirros_instance(vm=self.instance)
+        self.check_dhcp_on_cirros_instances()
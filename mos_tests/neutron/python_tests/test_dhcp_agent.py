@@ -13,10 +13,11 @@
 #    under the License.
 
 import logging
-import time
 
 import pytest
 
+from mos_tests.environment.dhcp import DhcpProber
+from mos_tests.neutron.phases import sleep
 from mos_tests.neutron.python_tests.base import TestBase
 
 logger = logging.getLogger(__name__)
@@ -53,14 +54,19 @@ class TestDHCPAgent(TestBase):
                                self.os_conn.neutron.list_agents(
                                    binary='neutron-dhcp-agent')['agents']]
 
+    @pytest.yield_fixture(autouse=True)
+    def dhcp_prober(self):
+        self._dhcp_prober = None
+        yield
+        if self._dhcp_prober is not None:
+            self._dhcp_prober.close()
+
     def run_udhcpc_on_vm(self, vm):
-        command = 'sudo -i cirros-dhcpc up eth0'
-        result = self.run_on_vm(vm,
-                                self.instance_keypair,
-                                command)
-        err_msg = 'Failed to start the udhcpc on vm std_err: {}'.format(
-                    result['stderr'])
-        assert not result['exit_code'], err_msg
+        if self._dhcp_prober is None:
+            self._dhcp_prober = DhcpProber(self.os_conn, self.env,
+                                           self.instance_keypair)
+        leases = self._dhcp_prober.probe([vm])
+        self._dhcp_prober.check(leases)
 
     def isclose(self, a, b, rel_tol=1e-9, abs_tol=0.0):
         return abs(a - b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
@@ -280,7 +286,7 @@ class TestDHCPAgent(TestBase):
                 err_msg = 'No networks on the dhcp agent {}'.format(
                         agt['id'])
                 assert len(nets)
-            time.sleep(6)
+            sleep(6)
 
         # Run udhcp again
         self.run_udhcpc_on_vm(srv)
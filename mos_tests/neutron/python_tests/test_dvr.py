@@ -14,12 +14,12 @@
 
 from collections import defaultdict
 import logging
-import time
 
 import pytest
 from waiting import wait
 
 from mos_tests.environment.devops_client import DevopsClient
+from mos_tests.neutron.phases import sleep
 from mos_tests.neutron.python_tests import base
 
 
@@ -56,11 +56,12 @@ class TestDVRBase(base.TestBase):
             return all(x[-2:] == ['down', 'up'] for x in node_states.values())
 
         logger.info('Resetting computes {}'.format(hostnames))
+        devops_nodes = []
         for hostname in hostnames:
             node = self.env.find_node_by_fqdn(hostname)
-            devops_node = DevopsClient.get_node_by_mac(env_name=env_name,
-                                                       mac=node.data['mac'])
-            devops_node.reset()
+            devops_nodes.append(DevopsClient.get_node_by_mac(
+                env_name=env_name, mac=node.data['mac']))
+        self.env.reset_nodes(devops_nodes)
 
         wait(is_nodes_started, timeout_seconds=10 * 60)
 
@@ -69,6 +70,7 @@ class TestDVRBase(base.TestBase):
 class TestDVR(TestDVRBase):
     """DVR specific test cases"""
 
+    @pytest.mark.non_destructive
     @pytest.mark.parametrize('floating_ip', (True, False),
                              ids=('with floating', 'without floating'))
     @pytest.mark.parametrize('dvr_router', (True, False),
@@ -153,7 +155,7 @@ class TestDVR(TestDVRBase):
         compute_hostname = getattr(server, 'OS-EXT-SRV-ATTR:host')
         self.reset_computes([compute_hostname], env_name)
 
-        time.sleep(60)
+        sleep(60)
 
         self.check_ping_from_vm(server, vm_keypair=self.instance_keypair)
 
@@ -191,6 +193,7 @@ class TestDVRWestEastConnectivity(TestDVRBase):
         self.server2_ip = self.os_conn.get_nova_instance_ips(
             self.server2).values()[0]
 
+    @pytest.mark.non_destructive
     def test_routing(self, prepare_openstack):
         """Check connectivity to East-West-Routing
 
@@ -235,7 +238,7 @@ class TestDVRWestEastConnectivity(TestDVRBase):
         with compute1.ssh() as remote:
             remote.check_call('service neutron-l3-agent stop')
 
-        time.sleep(15)
+        sleep(15)
 
         # Clear l3 agent
         with compute1.ssh() as remote:
@@ -268,7 +271,7 @@ class TestDVRWestEastConnectivity(TestDVRBase):
 
         self.reset_computes(self.compute_nodes, env_name)
 
-        time.sleep(60)
+        sleep(60)
         # Check ping after reset
         self.check_ping_from_vm(vm=self.server2,
                                 vm_keypair=self.instance_keypair,
@@ -0,0 +1,236 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+import pytest
+from waiting import wait
+
+from mos_tests.environment.outage import OutageMeter
+from mos_tests.neutron.python_tests.test_ban_dhcp_agent import \
+    TestBaseDHCPAgent
+from mos_tests.neutron.python_tests.test_l3_agent import L3AgentBase
+from mos_tests.neutron.python_tests.test_l3_ha import L3HABase
+from mos_tests.neutron.python_tests.test_ovs_restart import OvsBase
+
+
+logger = logging.getLogger(__name__)
+
+# polling interval of convergence checks
+POLL_INTERVAL = 0.5
+
+
+@pytest.mark.benchmark
+@pytest.mark.check_env_('is_l3_ha', 'has_2_or_more_computes')
+@pytest.mark.usefixtures("setup")
+class TestL3HAFailoverBenchmark(L3HABase):
+    """L3 HA router failover time"""
+
+    def get_active_host(self, router_id):
+        agents = self.os_conn.get_l3_for_router(router_id)['agents']
+        hosts = [x['host'] for x in agents
+                 if x['ha_state'] == 'active' and x['alive'] is True]
+        if len(hosts) == 1:
+            return hosts[0]
+
+    def test_l3_ha_failover(self, router, prepare_openstack, benchmark):
+        """Measure L3 HA failover after ban of ACTIVE l3 agent
+
+        Scenario:
+            1. Create network1, network2
+            2. Create router1 and connect it with network1, network2 and
+                external net
+            3. Boot vm1 in network1
+            4. Boot vm2 in network2 and associate floating ip
+            5. Start ping vm2 from vm1 by floating ip
+            6. Ban agent on what router scheduled with ACTIVE state
+            7. Measure time until other agent becomes ACTIVE
+            8. Stop ping and measure longest ping gap
+            9. Clear ban and wait until agent is alive
+            10. Repeat steps 5-9 `--benchmark-repeat` times
+        """
+        router_id = router['router']['id']
+        server1 = self.os_conn.nova.servers.find(name="server01")
+        server2 = self.os_conn.nova.servers.find(name="server02")
+        server2_ip = self.os_conn.get_nova_instance_ips(server2)['floating']
+        controller_ip = self.env.get_nodes_by_role('controller')[0].data['ip']
+
+        for _ in range(benchmark.repeat):
+            active_host = self.get_active_host(router_id)
+            meter = OutageMeter(restore=10)
+            meter.add_vm_probe(self.os_conn, self.env, server1,
+                               self.instance_keypair, server2_ip)
+            with meter, self.env.get_ssh_to_node(controller_ip) as remote:
+                with benchmark.measure('l3_ha_failover'):
+                    remote.execute(
+                        "pcs resource ban p_neutron-l3-agent {0}".format(
+                            active_host))
+                    wait(lambda: self.get_active_host(router_id) not in (
+                         None, active_host),
+                         timeout_seconds=60 * 3,
+                         sleep_seconds=POLL_INTERVAL,
+                         waiting_for="router rescheduled from {0}".format(
+                             active_host))
+                remote.execute(
+                    "pcs resource clear p_neutron-l3-agent {0}".format(
+                        active_host))
+            benchmark.record('l3_ha_ping_gap',
+                             meter.report().values()[0]['longest_gap'])
+            wait(lambda: all(x['alive'] for x in
+                             self.os_conn.get_l3_for_router(
+                                 router_id)['agents']),
+                 timeout_seconds=60 * 3,
+                 waiting_for="all l3 agents are alive")
+
+
+@pytest.mark.benchmark
+class TestDHCPRescheduleBenchmark(TestBaseDHCPAgent):
+    """DHCP network rescheduling time"""
+
+    @pytest.fixture(autouse=True)
+    def prepare_openstack_state(self, init):
+        self._prepare_openstack_state()
+
+    def test_dhcp_reschedule(self, benchmark):
+        """Measure network rescheduling after ban of DHCP agent
+
+        Scenario:
+            1. Create network net01, subnet net01_subnet
+            2. Create router with gateway to external net and
+               interface with net01
+            3. Launch instance and associate floating IP
+            4. Ban one DHCP-agent on what network is
+            5. Measure time until network is rescheduled to other agent
+            6. Clear ban
+            7. Repeat steps 4-6 `--benchmark-repeat` times
+            8. Check DHCP client on instance
+        """
+        for _ in range(benchmark.repeat):
+            host_to_ban = self.os_conn.get_node_with_dhcp_for_network(
+                self.net_id)[0]
+            controller_ip = self.env.find_node_by_fqdn(
+                host_to_ban).data['ip']
+            with benchmark.measure('dhcp_reschedule'):
+                self.ban_dhcp_agent(node_to_ban=host_to_ban,
+                                    host=controller_ip,
+                                    network_name=self.net_name,
+                                    sleep_seconds=POLL_INTERVAL)
+            self.clear_dhcp_agent(node_to_clear=host_to_ban,
+                                  host=controller_ip,
+                                  network_name=self.net_name,
+                                  wait_for_rescheduling=False)
+
+        self.check_dhcp_on_cirros_instance(vm=self.instance)
+
+
+@pytest.mark.benchmark
+@pytest.mark.usefixtures("setup")
+class TestOVSResyncBenchmark(OvsBase):
+    """OVS flows resync time after openvswitch-agent restart"""
+
+    @pytest.fixture(autouse=True)
+    def _prepare_openstack(self, init):
+        """Prepare OpenStack for scenarios run
+
+        Steps:
+            1. Update default security group
+            2. Create network net01: net01__subnet, 192.168.1.0/24
+            3. Launch vm1 in net01 network
+        """
+        self.instance_keypair = self.os_conn.create_key(key_name='instancekey')
+        zone = self.os_conn.nova.availability_zones.find(zoneName="nova")
+        host = zone.hosts.keys()[0]
+
+        self.setup_rules_for_default_sec_group()
+
+        net, subnet = self.create_internal_network_with_subnet(suffix=1)
+        server = self.os_conn.create_server(
+            name='server_for_flow_check',
+            availability_zone='{}:{}'.format(zone.zoneName, host),
+            key_name=self.instance_keypair.name,
+            nics=[{'net-id': net['network']['id']}])
+        self.compute = self.env.find_node_by_fqdn(
+            getattr(server, "OS-EXT-SRV-ATTR:hypervisor_hostname"))
+
+    def get_new_cookie(self, old_cookie):
+        try:
+            cookie = self.get_current_cookie(self.compute)
+        except (AssertionError, IndexError):
+            # flows are being resynced
+            return None
+        if cookie != old_cookie:
+            return cookie
+
+    def test_ovs_flows_resync(self, benchmark):
+        """Measure flows resync after openvswitch-agent restart
+
+        Scenario:
+            1. Create network net01: net01__subnet, 192.168.1.0/24
+            2. Launch vm1 in net01 network
+            3. Save cookie parameter of flows on vm1 compute
+            4. Restart neutron-plugin-openvswitch-agent on vm1 compute
+            5. Measure time until all flows get new cookie
+            6. Repeat steps 3-5 `--benchmark-repeat` times
+        """
+        for _ in range(benchmark.repeat):
+            cookie = self.get_current_cookie(self.compute)
+            with self.compute.ssh() as remote:
+                with benchmark.measure('ovs_flows_resync'):
+                    remote.check_call(
+                        'service neutron-plugin-openvswitch-agent restart')
+                    wait(lambda: self.get_new_cookie(cookie),
+                         timeout_seconds=60 * 3,
+                         sleep_seconds=POLL_INTERVAL,
+                         waiting_for="flows are resynced")
+
+
+@pytest.mark.benchmark
+class TestL3RescheduleBenchmark(L3AgentBase):
+    """Router manual rescheduling time"""
+
+    def get_new_host(self, router_id, old_host):
+        hosts = self.os_conn.get_l3_agent_hosts(router_id)
+        if hosts and old_host not in hosts:
+            return hosts[0]
+
+    def test_l3_router_reschedule(self, benchmark):
+        """Measure router rescheduling to other l3 agent
+
+        Scenario:
+            1. Create network1, network2
+            2. Create router1 and connect it with network1, network2 and
+                external net
+            3. Boot vm1 in network1 and associate floating ip
+            4. Boot vm2 in network2
+            5. Remove router1 from its l3 agent and add it to other one
+            6. Measure time until router is hosted by new agent
+            7. Repeat steps 5-6 `--benchmark-repeat` times
+            8. Check vms connectivity
+        """
+        router = self.os_conn.neutron.list_routers(
+            name='router01')['routers'][0]
+        if router.get('ha'):
+            pytest.skip("HA router can't be rescheduled manually")
+
+        for _ in range(benchmark.repeat):
+            old_host = self.os_conn.get_l3_agent_hosts(router['id'])[0]
+            with benchmark.measure('l3_router_reschedule'):
+                self.os_conn.force_l3_reshedule(router['id'])
+                wait(lambda: self.get_new_host(router['id'], old_host),
+                     timeout_seconds=60 * 3,
+                     sleep_seconds=POLL_INTERVAL,
+                     waiting_for="router rescheduled from {0}".format(
+                         old_host))
+
+        self.check_vm_connectivity()
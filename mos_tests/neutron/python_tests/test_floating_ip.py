@@ -19,6 +19,7 @@ import pytest
 from mos_tests.neutron.python_tests.base import TestBase
 
 
+@pytest.mark.non_destructive
 @pytest.mark.usefixtures("setup")
 class TestFloatingIP(TestBase):
     """Check association and disassociation floating ip"""
@@ -27,7 +27,8 @@ logger = logging.getLogger(__name__)
 
 @pytest.mark.check_env_('is_ha', 'has_2_or_more_computes')
 @pytest.mark.usefixtures("setup")
-class TestL3Agent(TestBase):
+class L3AgentBase(TestBase):
+    """Base class for L3 agent tests"""
 
     @pytest.fixture(autouse=True)
     def prepare_openstack(self, init):
@@ -185,6 +186,9 @@ class TestL3Agent(TestBase):
              waiting_for=waiting_for.format(node_with_l3),
              sleep_seconds=(1, 60))
 
+
+class TestL3Agent(L3AgentBase):
+
     @pytest.mark.parametrize('ban_count', [1, 2], ids=['once', 'twice'])
     def test_ban_one_l3_agent(self, ban_count):
         """Check l3-agent rescheduling after l3-agent dies on vlan
@@ -13,92 +13,20 @@
 #    under the License.
 
 from collections import defaultdict
-from collections import namedtuple
-from contextlib import contextmanager
 import logging
-import re
-import signal
 
 import pytest
 from waiting import wait
 
+from mos_tests.environment.outage import OutageMeter
 from mos_tests.neutron.python_tests.base import TestBase
 
 
 logger = logging.getLogger(__name__)
 
 
-def get_ping_seq(line):
-    """Return ping seq"""
-    seq = re.search(r'seq=(\d+) ', line)
-    if seq is None:
-        return None
-    return int(seq.group(1))
-
-
-def ping_groups(stdout):
-    """Generate ping info for each line of stdout
-
-    Format:
-        * `sended` - count of sended packets
-        * `received` - count of received packets
-        * `group_len` - len of last continuous group of success pings
-    """
-    PingInfo = namedtuple('PingInfo', ['sended', 'received', 'group_len'])
-    prev_seq = -1
-    group_start = 0
-    received = 0
-    for line in stdout:
-        logger.debug('Ping result: {}'.format(line.strip()))
-        seq = get_ping_seq(line)
-        if seq is None:
-            continue
-        received += 1
-        if seq != prev_seq + 1:
-            logger.debug('ping interrupted')
-            group_start = seq
-        pi = PingInfo(sended=seq, received=received,
-                      group_len=seq - group_start)
-        yield pi
-        prev_seq = seq
-
-
-@pytest.mark.check_env_('is_l3_ha', 'has_2_or_more_computes')
-class TestL3HA(TestBase):
-    """Tests for L3 HA"""
-
-    @contextmanager
-    def background_ping(self, vm, vm_keypair, ip_to_ping):
-        """Start ping from `vm` to `ip_to_ping` before enter and stop it after
-
-        Return dict with ping stat
-        """
-
-        result = {}
-
-        logger.info('Start ping on {0}'.format(ip_to_ping))
-        with self.os_conn.ssh_to_instance(self.env, vm,
-                                          vm_keypair) as remote:
-            command = 'ping {0}'.format(ip_to_ping)
-            chan, stdin, stdout, stderr = remote.execute_async(command)
-
-            # Wait for 10 not interrupted packets
-            groups = ping_groups(stdout)
-            for ping_info in groups:
-                if ping_info.group_len >= 10:
-                    break
-
-            yield result
-
-            logger.info('Wait for ping restored')
-            for ping_info in groups:
-                result['received'] = ping_info.received
-                result['sended'] = ping_info.sended
-                if ping_info.group_len >= 50:
-                    break
-            stdin.write(chr(signal.SIGINT))
-            stdin.flush()
-            chan.close()
+class L3HABase(TestBase):
+    """Base class for L3 HA tests"""
 
     @pytest.fixture
     def variables(self, init):
@@ -136,6 +64,11 @@ class TestL3HA(TestBase):
         server2 = self.os_conn.nova.servers.find(name="server02")
         self.os_conn.assign_floating_ip(server2)
 
+
+@pytest.mark.check_env_('is_l3_ha', 'has_2_or_more_computes')
+class TestL3HA(L3HABase):
+    """Tests for L3 HA"""
+
     @pytest.mark.parametrize('ban_count', [1, 2], ids=['once', 'twice'])
     def test_ban_l3_agent_with_active_ha_state(self, router, prepare_openstack,
                                                ban_count):
@@ -185,10 +118,10 @@ class TestL3HA(TestBase):
         for _ in range(ban_count):
 
             # Ban l3 agent
-            with self.background_ping(vm=server1,
-                                      vm_keypair=self.instance_keypair,
-                                      ip_to_ping=server2_ip
-            ) as ping_result:
+            meter = OutageMeter()
+            meter.add_vm_probe(self.os_conn, self.env, server1,
+                               self.instance_keypair, server2_ip)
+            with meter:
                 with self.env.get_ssh_to_node(controller_ip) as remote:
                     logger.info("Ban L3 agent on node {0}".format(node_to_ban))
                     remote.execute(
@@ -200,7 +133,8 @@ class TestL3HA(TestBase):
                                        timeout_seconds=60,
                                        waiting_for=waiting_for)
 
-            assert ping_result['sended'] - ping_result['received'] < 10
+            ping_result = meter.report().values()[0]
+            assert ping_result['lost'] < 10
 
     def test_ban_all_l3_agents_and_clear_them(self, router, prepare_openstack):
         """Disable all l3 agents and enable them
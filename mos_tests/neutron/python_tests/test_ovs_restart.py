@@ -15,10 +15,13 @@
 import logging
 import os
 import re
-import time
 
 import pytest
 
+from mos_tests.environment.outage import OutageMeter
+from mos_tests.environment.ovs import OvsCollector
+from mos_tests.environment.traffic import TrafficHarness
+from mos_tests.neutron.phases import sleep
 from mos_tests.neutron.python_tests.base import TestBase
 from mos_tests import settings
 
@@ -115,21 +118,11 @@ class OvsBase(TestBase):
             :param compute: Compute node where the server is scheduled
             :return: cookie value
         """
-        with compute.ssh() as remote:
-            result = remote.execute('ovs-ofctl dump-flows br-int')
-            result_tun = remote.execute('ovs-ofctl dump-flows br-tun')
-        assert result['exit_code'] == 0
-        result_out = result['stdout']
-        if result_tun['stderr'] != ['ovs-ofctl: br-tun is not a bridge or a '
-                                    'socket\n']:
-            assert result_tun['exit_code'] == 0
-            result_out.extend(result_tun['stdout'])
-        cookie_lines = filter(lambda x: x.find(' cookie=') != -1, result_out)
-        cookie_values = map(lambda x: x.split(',')[0].partition(' cookie=')[2],
-                            cookie_lines)
-        assert cookie_values[0] != 0
-        assert cookie_values.count(cookie_values[0]) == len(cookie_values)
-        return cookie_values[0]
+        state = OvsCollector(self.env).collect(compute)
+        cookies = state.get_cookies(bridges=('br-int', 'br-tun'))
+        assert len(cookies) == 1, 'Flows have different cookies: {0}'.format(
+            sorted(cookies))
+        return cookies.pop()
 
 
 @pytest.mark.check_env_("has_2_or_more_computes")
@@ -215,35 +208,40 @@ class TestOVSRestartTwoVms(OvsBase):
         Duration 10m
 
         """
-        for _ in range(count):
-            # Check that all ovs agents are alive
-            self.os_conn.wait_agents_alive(self.ovs_agent_ids)
+        # measure data plane outage during restarts
+        meter = OutageMeter(restore=0)
+        meter.add_vm_probe(self.os_conn, self.env, self.server1,
+                           self.instance_keypair, self.server2_ip)
+        with meter:
+            for _ in range(count):
+                # Check that all ovs agents are alive
+                self.os_conn.wait_agents_alive(self.ovs_agent_ids)
 
-            # Disable ovs agent on a controller
-            self.disable_ovs_agents_on_controller()
+                # Disable ovs agent on a controller
+                self.disable_ovs_agents_on_controller()
 
-            # Then check that all ovs went down
-            self.os_conn.wait_agents_down(self.ovs_conroller_agents)
+                # Then check that all ovs went down
+                self.os_conn.wait_agents_down(self.ovs_conroller_agents)
 
-            # Restart ovs agent service on all computes
-            self.restart_ovs_agents_on_computes()
+                # Restart ovs agent service on all computes
+                self.restart_ovs_agents_on_computes()
 
-            # Enable ovs agent on a controller
-            self.enable_ovs_agents_on_controllers()
+                # Enable ovs agent on a controller
+                self.enable_ovs_agents_on_controllers()
 
-            # Then check that all ovs agents are alive
-            self.os_conn.wait_agents_alive(self.ovs_agent_ids)
+                # Then check that all ovs agents are alive
+                self.os_conn.wait_agents_alive(self.ovs_agent_ids)
 
-            # sleep is used to check that system will be stable for some time
-            # after restarting service
-            time.sleep(30)
+                # sleep is used to check that system will be stable for some
+                # time after restarting service
+                sleep(30)
 
-            self.check_ping_from_vm(self.server1, self.instance_keypair,
-                                    self.server2_ip, timeout=2 * 60)
+                self.check_ping_from_vm(self.server1, self.instance_keypair,
+                                        self.server2_ip, timeout=2 * 60)
 
-            # check all agents are alive
-            assert all([agt['alive'] for agt in
-                        self.os_conn.neutron.list_agents()['agents']])
+                # check all agents are alive
+                assert all([agt['alive'] for agt in
+                            self.os_conn.neutron.list_agents()['agents']])
 
     def test_ovs_restart_pcs_ban_clear(self):
         """Restart openvswitch-agents with pcs ban/clear on controllers
@@ -266,24 +264,29 @@ class TestOVSRestartTwoVms(OvsBase):
         # Check that all ovs agents are alive
         self.os_conn.wait_agents_alive(self.ovs_agent_ids)
 
-        # Ban ovs agents on all controllers
-        self.ban_ovs_agents_controllers()
+        # measure data plane outage during restarts
+        meter = OutageMeter(restore=0)
+        meter.add_vm_probe(self.os_conn, self.env, self.server1,
+                           self.instance_keypair, self.server2_ip)
+        with meter:
+            # Ban ovs agents on all controllers
+            self.ban_ovs_agents_controllers()
 
-        # Then check that all ovs went down
-        self.os_conn.wait_agents_down(self.ovs_agent_ids)
+            # Then check that all ovs went down
+            self.os_conn.wait_agents_down(self.ovs_agent_ids)
 
-        # Cleat ovs agent on all controllers
-        self.clear_ovs_agents_controllers()
+            # Cleat ovs agent on all controllers
+            self.clear_ovs_agents_controllers()
 
-        # Restart ovs agent service on all computes
-        self.restart_ovs_agents_on_computes()
+            # Restart ovs agent service on all computes
+            self.restart_ovs_agents_on_computes()
 
-        # Then check that all ovs agents are alive
-        self.os_conn.wait_agents_alive(self.ovs_agent_ids)
+            # Then check that all ovs agents are alive
+            self.os_conn.wait_agents_alive(self.ovs_agent_ids)
 
         # sleep is used to check that system will be stable for some time
         # after restarting service
-        time.sleep(30)
+        sleep(30)
 
         self.check_ping_from_vm(self.server1, self.instance_keypair,
                                 self.server2_ip, timeout=2 * 60)
@@ -297,27 +300,6 @@ class TestOVSRestartTwoVms(OvsBase):
 class TestPortTags(TestBase):
     """Chect that port tags arent't change after ovs-agent restart"""
 
-    def get_ports_tags_data(self, lines):
-        """Returns dict with ports as keys and tags as values"""
-        port_tags = {}
-        last_offset = 0
-        port = None
-        for line in lines[1:]:
-            line = line.rstrip()
-            key, val = line.split(None, 1)
-            offset = len(line) - len(line.lstrip())
-            if port is None:
-                if key.lower() == 'port':
-                    port = val.strip('"')
-                    last_offset = offset
-                    continue
-            elif offset <= last_offset:
-                port = None
-            elif key.lower() == 'tag:':
-                port_tags[port] = val
-                port = None
-        return port_tags
-
     def test_port_tags_immutable(self):
         """Check that ports tags don't change their values after
             ovs-agents restart
@@ -333,20 +315,10 @@ class TestPortTags(TestBase):
                 remain the same
         """
 
-        def get_ovs_port_tags(nodes):
-            ovs_cfg = {}
-            for node in nodes:
-                with node.ssh() as remote:
-                    result = remote.execute('ovs-vsctl show')
-                    assert result['exit_code'] == 0
-                    ports_tags = self.get_ports_tags_data(result['stdout'])
-                    ovs_cfg[node.data['fqdn']] = ports_tags
-            return ovs_cfg
-
-        nodes = self.env.get_all_nodes()
+        collector = OvsCollector(self.env)
 
         # Collect ovs-vsctl data before test
-        ovs_before_port_tags = get_ovs_port_tags(nodes)
+        ovs_before = collector.snapshot()
 
         # ban and clear ovs-agents on controllers
         controller = self.env.get_nodes_by_role('controller')[0]
@@ -363,13 +335,15 @@ class TestPortTags(TestBase):
                 assert remote.execute(cmd)['exit_code'] == 0
 
         # wait for 30 seconds
-        time.sleep(30)
+        sleep(30)
 
         # Collect ovs-vsctl data after test
-        ovs_after_port_tags = get_ovs_port_tags(nodes)
+        ovs_after = collector.snapshot()
 
         # Compare
-        assert ovs_after_port_tags == ovs_before_port_tags
+        diff = collector.diff(ovs_before, ovs_after)
+        assert not diff.tags_changed, 'Ports tags are changed:\n{0}'.format(
+            diff)
 
 
 @pytest.mark.check_env_('is_ha', 'has_2_or_more_computes')
@@ -597,7 +571,7 @@ class TestOVSRestartTwoVmsOnSingleCompute(OvsBase):
 
         # sleep is used to check that system will be stable for some time
         # after restarting service
-        time.sleep(30)
+        sleep(30)
 
         self.check_ping_from_vm(self.server1, self.instance_keypair,
                                 self.server2_ip, timeout=2 * 60)
@@ -799,7 +773,7 @@ class TestOVSRestartWithIperfTraffic(OvsBase):
             lost = self.get_lost_percentage(result['stdout'])
             if lost is not None:
                 break
-            time.sleep(5)
+            sleep(5)
 
         err_msg = "{0}% datagrams lost. Should be < 10%".format(lost)
         assert lost < 10, err_msg
@@ -808,6 +782,64 @@ class TestOVSRestartWithIperfTraffic(OvsBase):
         assert all([agt['alive'] for agt in
                     self.os_conn.neutron.list_agents()['agents']])
 
+    @pytest.mark.require_QCOW2_ubuntu_image_with_iperf
+    def test_ovs_restart_with_iperf3_traffic(self, _prepare_openstack):
+        """Checks throughput of concurrent iperf3 flows during ovs restart
+
+        Steps:
+            1. Start TCP and UDP iperf3 flows in both directions between
+                server1 and server2
+            2. Disable ovs-agents on all controllers,
+                restart service neutron-plugin-openvswitch-agent
+                on all computes, and enable them back.
+            3. Check that all ovs-agents are in alive state
+            4. Wait for flows end
+            5. Check that all flows are finished without errors, UDP flows
+                lost less than 10% datagrams and TCP traffic was not
+                interrupted
+        """
+        traffic = TrafficHarness(self.os_conn, self.env,
+                                 self.instance_keypair, duration=180)
+        for client, server in ((self.server1, self.server2),
+                               (self.server2, self.server1)):
+            traffic.add_flow(client, server, protocol='tcp')
+            traffic.add_flow(client, server, protocol='udp', bandwidth='1M',
+                             length=64)
+
+        missing = traffic.get_instances_without_iperf3()
+        if missing:
+            pytest.skip("iperf3 is not installed on {0}".format(
+                [x.name for x in missing]))
+
+        self.os_conn.wait_agents_alive(self.ovs_agent_ids)
+
+        with traffic:
+            traffic.mark('disable ovs agents on controllers')
+            self.disable_ovs_agents_on_controller()
+            self.os_conn.wait_agents_down(self.ovs_conroller_agents)
+            traffic.mark('restart ovs agents on computes')
+            self.restart_ovs_agents_on_computes()
+            traffic.mark('enable ovs agents on controllers')
+            self.enable_ovs_agents_on_controllers()
+            self.os_conn.wait_agents_alive(self.ovs_agent_ids)
+            traffic.mark('ovs agents are alive')
+
+        for name, result in traffic.report().items():
+            assert 'error' not in result, "Flow {0} failed: {1}".format(
+                name, result['error'])
+            if result['lost_percent'] is not None:
+                err_msg = "{0}: {1}% datagrams lost. Should be < 10%".format(
+                    name, result['lost_percent'])
+                assert result['lost_percent'] < 10, err_msg
+            else:
+                err_msg = "{0}: TCP traffic was interrupted for {1}s".format(
+                    name, result['zero_intervals'])
+                assert result['zero_intervals'] == 0, err_msg
+
+        # check all agents are alive
+        assert all([agt['alive'] for agt in
+                    self.os_conn.neutron.list_agents()['agents']])
+
 
 @pytest.mark.usefixtures("setup")
 class TestOVSRestartAddFlows(OvsBase):
@@ -891,7 +923,7 @@ class TestOVSRestartAddFlows(OvsBase):
 
         # sleep is used to check that system will be stable for some time
         # after restarting service
-        time.sleep(30)
+        sleep(30)
 
         after_value = self.get_current_cookie(compute)
         assert before_value != after_value
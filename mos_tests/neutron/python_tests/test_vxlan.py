@@ -13,13 +13,12 @@
 #    under the License.
 
 from contextlib import contextmanager
-from distutils.spawn import find_executable
 import logging
-import subprocess
-import threading
 
 import pytest
 
+from mos_tests.environment.capture import LiveCapture
+from mos_tests.functions import pcap
 from mos_tests.neutron.python_tests.base import TestBase
 
 
@@ -27,92 +26,49 @@ logger = logging.getLogger(__name__)
 
 
 @contextmanager
-def tcpdump(ip, env, log_path, tcpdump_args):
-    """Start tcpdump on vxlan port before enter and stop it after
+def tcpdump(ip, env, tcpdump_args):
+    """Capture traffic on node while in context
 
-    Log will download to log_path argument
+    Yields LiveCapture instance with captured packets
     """
-    def tcpdump(ip):
-        logger.info('Start tcpdump on {0}'.format(ip))
-        with env.get_ssh_to_node(ip) as remote:
-            result = remote.execute(
-                'tcpdump -U {0} -w /tmp/vxlan.log'.format(tcpdump_args))
-            assert result['exit_code'] == 0
-
-    thread = threading.Thread(target=tcpdump, args=(ip,))
-    try:
-        # Start tcpdump
-        thread.start()
-        yield
-    except Exception:
-        raise
-    else:
-        # Download log
-        with env.get_ssh_to_node(ip) as remote:
-            remote.download('/tmp/vxlan.log', log_path)
-    finally:
-        # Kill tcpdump
-        with env.get_ssh_to_node(ip) as remote:
-            remote.execute('killall tcpdump')
-        thread.join(0)
-
-
-def tcpdump_vxlan(ip, env, log_path):
-    """Start tcpdump on vxlan port before enter and stop it after
-
-    Log will download to log_path argument
-    """
-    return tcpdump(ip, env, log_path, '-U -vvni any port 4789')
+    with env.get_ssh_to_node(ip) as remote:
+        with LiveCapture(remote, tcpdump_args) as capture:
+            yield capture
 
 
-def _run_tshark_on_vxlan(log_file, cond):
-    tshark = find_executable('tshark')
-    return subprocess.check_output([
-        tshark, '-d', 'udp.port==4789,vxlan', '-r', log_file,
-        '-Y', '{0}'.format(cond)])
+def tcpdump_vxlan(ip, env):
+    """Capture traffic on vxlan port of node while in context"""
+    return tcpdump(ip, env, '-ni any port 4789')
 
 
-def check_all_traffic_has_vni(vni, log_file):
+def check_all_traffic_has_vni(vni, capture):
     __tracebackhide__ = True
-    output = _run_tshark_on_vxlan(log_file, 'vxlan.vni!={0}'.format(vni))
-    if output.strip():
-        pytest.fail(
-            "Log contains records with another VNI\n{0}".format(output))
-
-
-def get_arp_traffic(src_ip, dst_ip, log_file):
-    cond = ("arp.dst.proto_ipv4=={dst_ip} and "
-            "arp.src.proto_ipv4=={src_ip}".format(dst_ip=dst_ip, src_ip=src_ip)
-    )
-    return _run_tshark_on_vxlan(log_file, cond)
+    packets = capture.filter(pcap.other_vni(vni))
+    if packets:
+        pytest.fail("Capture contains records with another VNI\n{0}".format(
+            pcap.format_packets(packets)))
 
 
-def check_no_arp_traffic(src_ip, dst_ip, log_file):
+def check_no_arp_traffic(src_ip, dst_ip, capture):
     __tracebackhide__ = True
-    output = get_arp_traffic(src_ip, dst_ip, log_file)
-    if output.strip():
-        pytest.fail("Log contains ARP traffic\n{0}".format(output))
+    packets = capture.filter(pcap.arp(src_ip, dst_ip))
+    if packets:
+        pytest.fail("Capture contains ARP traffic\n{0}".format(
+            pcap.format_packets(packets)))
 
 
-def check_arp_traffic(src_ip, dst_ip, log_file):
+def check_arp_traffic(src_ip, dst_ip, capture, timeout=30):
     __tracebackhide__ = True
-    output = get_arp_traffic(src_ip, dst_ip, log_file)
-    if not output.strip():
-        pytest.fail("Log not contains ARP traffic")
+    if capture.wait_for(pcap.arp(src_ip, dst_ip), timeout) is None:
+        pytest.fail("Capture not contains ARP traffic")
 
 
-def check_icmp_traffic(src_ip, dst_ip, log_file):
+def check_icmp_traffic(src_ip, dst_ip, capture, timeout=30):
     __tracebackhide__ = True
-    cond = "icmp and ip.src=={src_ip} and ip.dst=={dst_ip}".format(
-        src_ip=src_ip,
-        dst_ip=dst_ip
-    )
-    output = _run_tshark_on_vxlan(log_file, cond)
-    if not output.strip():
+    if capture.wait_for(pcap.icmp(src_ip, dst_ip), timeout) is None:
         pytest.fail(
-            "Log not contains ICMP traffic from {src_ip} to {dst_ip}".format(
-                src_ip=src_ip,
-                dst_ip=dst_ip))
+            "Capture not contains ICMP traffic from {src_ip} to "
+            "{dst_ip}".format(src_ip=src_ip, dst_ip=dst_ip))
 
 
 @pytest.mark.check_env_('is_vxlan')
@@ -137,7 +93,7 @@ class TestVxlanBase(TestBase):
         return router
 
 
-@pytest.mark.need_tshark
+@pytest.mark.non_destructive
 class TestVxlan(TestVxlanBase):
     """Simple Vxlan tests"""
 
@@ -190,18 +146,15 @@ class TestVxlan(TestVxlanBase):
                 result = remote.execute('ovs-vsctl show | grep -q br-tun')
                 assert result['exit_code'] == 0
 
-        with tcpdump_vxlan(ip=compute.data['ip'], env=self.env,
-                           log_path='/tmp/vxlan.log'):
-            with self.env.get_ssh_to_node(controller.data['ip']) as remote:
-                vm_ip = self.os_conn.get_nova_instance_ips(server)['fixed']
-                result = remote.execute(
-                    'ip netns exec qrouter-{router_id} ping -c1 {ip}'.format(
-                        router_id=router['router']['id'],
-                        ip=vm_ip))
+        namespaces = self.os_conn.get_namespaces(self.env)
+        router_ns = namespaces.get_router(router['router']['id'])[0]
+        with tcpdump_vxlan(ip=compute.data['ip'], env=self.env) as capture:
+            vm_ip = self.os_conn.get_nova_instance_ips(server)['fixed']
+            namespaces.execute(router_ns, 'ping -c1 {ip}'.format(ip=vm_ip))
 
         # Check log
         vni = network['network']['provider:segmentation_id']
-        check_all_traffic_has_vni(vni, '/tmp/vxlan1.log')
+        check_all_traffic_has_vni(vni, capture)
 
     @pytest.mark.check_env_('has_2_or_more_computes')
     def test_vni_for_icmp_between_instances(self, router):
@@ -259,12 +212,10 @@ class TestVxlan(TestVxlanBase):
         compute1 = self.env.find_node_by_fqdn(compute_nodes[0])
         compute2 = self.env.find_node_by_fqdn(compute_nodes[1])
         with tcpdump_vxlan(
-                ip=compute1.data['ip'], env=self.env,
-                log_path='/tmp/vxlan1.log'
-            ), tcpdump_vxlan(
-                ip=compute2.data['ip'], env=self.env,
-                log_path='/tmp/vxlan2.log'
-            ):
+                ip=compute1.data['ip'], env=self.env
+            ) as capture1, tcpdump_vxlan(
+                ip=compute2.data['ip'], env=self.env
+            ) as capture2:
             # Ping server1 from server2
             server1_ip = self.os_conn.get_nova_instance_ips(
                 server1).values()[0]
@@ -272,11 +223,12 @@ class TestVxlan(TestVxlanBase):
 
         # Check traffic
         check_all_traffic_has_vni(net1['provider:segmentation_id'],
-                                  '/tmp/vxlan1.log')
+                                  capture1)
         check_all_traffic_has_vni(net2['provider:segmentation_id'],
-                                  '/tmp/vxlan2.log')
+                                  capture2)
 
 
+@pytest.mark.non_destructive
 @pytest.mark.check_env_('is_l2pop')
 class TestVxlanL2pop(TestVxlanBase):
     """Vxlan (tun) with enabled L2 population specific tests"""
@@ -288,7 +240,6 @@ class TestVxlanL2pop(TestVxlanBase):
         :returns str: name of tap device
         """
 
-    @pytest.mark.need_tshark
     @pytest.mark.check_env_('has_2_or_more_computes')
     @pytest.mark.parametrize('tcpdump_args', [
         '-vvni any port 4789',
@@ -346,30 +297,26 @@ class TestVxlanL2pop(TestVxlanBase):
         compute2 = self.env.find_node_by_fqdn(compute_nodes[1])
 
         # Initiate broadcast traffic from server1 to server2
-        broadcast_log = '/tmp/vxlan_broadcast.log'
         with tcpdump(
                 ip=compute2.data['ip'], env=self.env,
-                log_path=broadcast_log,
                 tcpdump_args=tcpdump_args.format(source_ip=server1_ip)
-            ):
+            ) as capture:
             cmd = 'sudo arping -I eth0 -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
         check_no_arp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                             log_file=broadcast_log)
+                             capture=capture)
 
         # Initiate unicast traffic from server1 to server2
-        unicast_log = '/tmp/vxlan_unicast.log'
         with tcpdump(
                 ip=compute2.data['ip'], env=self.env,
-                log_path=unicast_log,
                 tcpdump_args=tcpdump_args.format(source_ip=server1_ip)
-            ):
+            ) as capture:
             cmd = 'ping -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
-        check_icmp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                           log_file=unicast_log)
+            check_icmp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
+                               capture=capture)
 
     @pytest.mark.check_env_('has_3_or_more_computes')
     def test_establishing_tunnels_between_computes(self, variables):
@@ -497,7 +444,6 @@ class TestVxlanL2pop(TestVxlanBase):
                 stdout = ''.join(result['stdout'])
                 assert any([x in stdout for x in compute3.ip_list])
 
-    @pytest.mark.need_tshark
     @pytest.mark.check_env_('has_2_or_more_computes')
     def test_broadcast_traffic_propagation_single_net(self, router):
         """Check broadcast traffic between instances placed in a single
@@ -549,35 +495,31 @@ class TestVxlanL2pop(TestVxlanBase):
         server2_port = self.os_conn.get_port_by_fixed_ip(server2_ip)
         server2_tap = 'tap{}'.format(server2_port['id'][:11])
         # Initiate broadcast traffic from server1 to server2
-        broadcast_log = '/tmp/vxlan_broadcast1.log'
         with tcpdump(
                 ip=compute2.data['ip'], env=self.env,
-                log_path=broadcast_log,
                 tcpdump_args=' -n src host {ip} -i {interface}'.format(
                     ip=server1_ip,
                     interface=server2_tap,
                 )
-            ):
+            ) as capture:
             cmd = 'sudo arping -I eth0 -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
-        check_arp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                          log_file=broadcast_log)
+            check_arp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
+                              capture=capture)
 
         server3_port = self.os_conn.get_port_by_fixed_ip(server3_ip)
         server3_tap = 'tap{}'.format(server3_port['id'][:11])
         # Initiate broadcast traffic from server1 to server3
-        broadcast_log = '/tmp/vxlan_broadcast1.log'
         with tcpdump(
                 ip=compute2.data['ip'], env=self.env,
-                log_path=broadcast_log,
                 tcpdump_args=' -n src host {ip} -i {interface}'.format(
                     ip=server1_ip,
                     interface=server3_tap,
                 )
-            ):
+            ) as capture:
             cmd = 'sudo arping -I eth0 -c 4 {0}; true'.format(server2_ip)
             self.run_on_vm(server1, self.instance_keypair, cmd)
 
         check_no_arp_traffic(src_ip=server1_ip, dst_ip=server2_ip,
-                             log_file=broadcast_log)
+                             capture=capture)
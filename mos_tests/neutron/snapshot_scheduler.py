@@ -0,0 +1,101 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+import pytest
+
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotScheduler(object):
+    """Pytest plugin, which minimizes count of snapshot reverts
+
+    Tests are grouped by snapshot (`snapshot` marker or `--snapshot` option)
+    and non-destructive tests (marked with `non_destructive`) are placed
+    before destructive ones in each group. Environment is reverted only
+    when snapshot is changed or previous test could break it, so all
+    non-destructive tests of group share one revert.
+    """
+
+    name = 'snapshot_scheduler'
+
+    def __init__(self, config):
+        self.config = config
+        self.current_snapshot = None
+        self.env_dirty = True
+        self.reverts = 0
+        self.reverts_saved = 0
+
+    def get_snapshot(self, item, default=None):
+        """Returns snapshot name for test item"""
+        marker = item.get_marker('snapshot')
+        if marker is not None and marker.args:
+            return marker.args[0]
+        if default is None:
+            default = self.config.getoption('--snapshot')
+        return default
+
+    @staticmethod
+    def is_destructive(item):
+        return item.get_marker('non_destructive') is None
+
+    # should be last to keep tests order inside groups
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        groups = []
+        for item in items:
+            snapshot = self.get_snapshot(item)
+            if snapshot not in groups:
+                groups.append(snapshot)
+
+        def key(item):
+            return (groups.index(self.get_snapshot(item)),
+                    self.is_destructive(item))
+
+        items.sort(key=key)
+
+    def need_revert(self, item, snapshot_name):
+        """Returns True if env should be reverted before test item"""
+        if self.env_dirty or snapshot_name != self.current_snapshot:
+            return True
+        logger.info('Skip revert of snapshot {0} for {1}'.format(
+            snapshot_name, item.nodeid))
+        self.reverts_saved += 1
+        return False
+
+    def reverted(self, snapshot_name):
+        """Should be called after each snapshot revert"""
+        self.current_snapshot = snapshot_name
+        self.env_dirty = False
+        self.reverts += 1
+
+    def pytest_runtest_logreport(self, report):
+        # Test skipped on setup (by env checks, for example) doesn't change
+        # env, but failed setup or teardown (cleanup is not finished),
+        # executed destructive test or failed non destructive test (it may
+        # be interrupted in the middle of changes) can do it
+        if report.when in ('setup', 'teardown') and report.failed:
+            self.env_dirty = True
+        elif report.when == 'call' and not report.skipped:
+            if ('non_destructive' not in report.keywords or
+                    report.failed):
+                self.env_dirty = True
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.reverts or self.reverts_saved:
+            terminalreporter.write_sep(
+                '-', 'snapshot reverts: {0}, saved: {1}'.format(
+                    self.reverts, self.reverts_saved))
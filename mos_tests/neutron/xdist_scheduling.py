@@ -0,0 +1,218 @@
+#    Copyright 2015 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from collections import OrderedDict
+import logging
+
+try:
+    from xdist.workermanage import parse_spec_config
+except ImportError:
+    from xdist.slavemanage import parse_spec_config
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_worker_envs(value):
+    """Parse `--worker-envs` option value
+
+    Format is `gw0=env[:snapshot[:fuel_ip]],gw1=...`, empty parts are
+    allowed (`gw1=:snapshot2`).
+
+    :returns: dict with worker id as key and dict with `env`, `snapshot` and
+        `fuel_ip` keys as value
+    """
+    result = {}
+    for spec in (value or '').split(','):
+        if not spec.strip():
+            continue
+        worker_id, _, env_spec = spec.strip().partition('=')
+        parts = env_spec.split(':', 2)
+        parts += [''] * (3 - len(parts))
+        result[worker_id] = dict(zip(('env', 'snapshot', 'fuel_ip'),
+                                     [x or None for x in parts]))
+    return result
+
+
+def get_worker_id(config):
+    """Returns xdist worker id (gw0, gw1, ...) or None for master"""
+    for attr, key in (('workerinput', 'workerid'),
+                      ('slaveinput', 'slaveid')):
+        if hasattr(config, attr):
+            return getattr(config, attr)[key]
+
+
+def configure_worker(config):
+    """Set env options of xdist worker according to `--worker-envs`"""
+    worker_id = get_worker_id(config)
+    if worker_id is None:
+        return
+    spec = parse_worker_envs(config.getoption('--worker-envs')).get(
+        worker_id)
+    if spec is None:
+        return
+    for name, value in spec.items():
+        if value is not None:
+            setattr(config.option, name, value)
+    logger.info('Worker {0} uses env {1}'.format(worker_id, spec))
+
+
+def get_scope(nodeid):
+    """Returns test class (or module) part of test nodeid"""
+    return nodeid.split('[')[0].rsplit('::', 1)[0]
+
+
+class EnvAwareScheduling(object):
+    """xdist scheduler for workers bound to different envs
+
+    Each worker collects only tests compatible with its env (incompatible
+    are deselected on collection by env capabilities profile of worker), so
+    workers collections differ. Tests are grouped to chunks by test class
+    and set of workers, which collected them, and whole chunk is sent to
+    one worker. This keeps snapshot ordering of tests inside class on one
+    env. If worker can't get profile on collection, it collects all tests
+    and incompatible ones are skipped on it.
+    """
+
+    def __init__(self, config, log=None):
+        self.numnodes = len(parse_spec_config(config))
+        self.node2collection = OrderedDict()
+        self.node2index = {}
+        self.node2pending = OrderedDict()
+        self.chunks = None
+        if log is None:
+            self.log = self._debug_log
+        else:
+            self.log = log.envsched
+        self.config = config
+
+    @staticmethod
+    def _debug_log(*args):
+        logger.debug(' '.join(str(x) for x in args))
+
+    @property
+    def nodes(self):
+        return list(self.node2pending.keys())
+
+    @property
+    def collection_is_completed(self):
+        return len(self.node2collection) >= self.numnodes
+
+    @property
+    def tests_finished(self):
+        if not self.collection_is_completed:
+            return False
+        if self.chunks:
+            return False
+        for pending in self.node2pending.values():
+            if len(pending) >= 2:
+                return False
+        return True
+
+    @property
+    def has_pending(self):
+        if self.chunks:
+            return True
+        return any(self.node2pending.values())
+
+    def add_node(self, node):
+        assert node not in self.node2pending
+        self.node2pending[node] = []
+
+    def add_node_collection(self, node, collection):
+        assert node in self.node2pending
+        self.node2collection[node] = list(collection)
+        self.node2index[node] = {nodeid: i
+                                 for i, nodeid in enumerate(collection)}
+
+    def mark_test_complete(self, node, item_index, duration=0):
+        self.node2pending[node].remove(item_index)
+        self.check_schedule(node)
+
+    def _build_chunks(self):
+        """Group tests by class and by capable nodes"""
+        chunks = OrderedDict()
+        seen = set()
+        for collection in self.node2collection.values():
+            for nodeid in collection:
+                if nodeid in seen:
+                    continue
+                seen.add(nodeid)
+                capable = frozenset(
+                    node for node, index in self.node2index.items()
+                    if nodeid in index)
+                key = (get_scope(nodeid), capable)
+                chunks.setdefault(key, []).append(nodeid)
+        return [(capable, nodeids)
+                for (_, capable), nodeids in chunks.items()]
+
+    def _send_chunk(self, node):
+        """Send first chunk, which node can run
+
+        :returns: False if there is no such chunk
+        """
+        for i, (capable, nodeids) in enumerate(self.chunks):
+            if node in capable:
+                del self.chunks[i]
+                index = self.node2index[node]
+                indices = [index[x] for x in nodeids]
+                self.node2pending[node].extend(indices)
+                node.send_runtest_some(indices)
+                return True
+        return False
+
+    def check_schedule(self, node):
+        if node.shutting_down:
+            return
+        while len(self.node2pending[node]) < 2:
+            if not self._send_chunk(node):
+                break
+        if not self.node2pending[node] or not any(
+                node in capable for capable, _ in self.chunks):
+            node.shutdown()
+        self.log('chunks waiting for nodes:', len(self.chunks))
+
+    def remove_node(self, node):
+        pending = self.node2pending.pop(node)
+        if self.chunks:
+            chunks = [(capable - {node}, nodeids)
+                      for capable, nodeids in self.chunks]
+            for capable, nodeids in chunks:
+                if not capable:
+                    self.log('no nodes left for tests:', nodeids)
+            self.chunks = [x for x in chunks if x[0]]
+        if not pending:
+            return
+        collection = self.node2collection[node]
+        crashitem = collection[pending.pop(0)]
+        # reschedule pending tests to other nodes, which collected them
+        for item_index in pending:
+            nodeid = collection[item_index]
+            capable = frozenset(x for x in self.node2pending
+                                if nodeid in self.node2index[x])
+            if capable:
+                self.chunks.append((capable, [nodeid]))
+        for other in self.nodes:
+            self.check_schedule(other)
+        return crashitem
+
+    def schedule(self):
+        assert self.collection_is_completed
+        if self.chunks is None:
+            self.chunks = self._build_chunks()
+            for node, collection in self.node2collection.items():
+                self.log('node {0} collected {1} tests'.format(
+                    node.gateway.id, len(collection)))
+        for node in self.nodes:
+            self.check_schedule(node)
@@ -14,7 +14,6 @@
 
 import os
 import unittest
-import subprocess
 from time import time, sleep
 import six
 import paramiko
@@ -24,8 +23,11 @@ from neutronclient.v2_0 import client as neutron_client
 from keystoneclient.v2_0 import client as keystone_client
 from cinderclient import client as cinder_client
 
+from mos_tests.functions import bulk
 from mos_tests.functions import common as common_functions
+from mos_tests.environment.outage import OutageMeter
 from mos_tests.environment.ssh import SSHClient
+from mos_tests import settings
 
 
 class NovaIntegrationTests(unittest.TestCase):
@@ -113,14 +115,12 @@ class NovaIntegrationTests(unittest.TestCase):
         cls.nova.security_groups.delete(cls.sec_group)
 
     def tearDown(self):
-        for inst in self.instances:
-            common_functions.delete_instance(self.nova, inst)
+        bulk.delete_servers(self.nova, self.instances)
         self.instances = []
-        for fip in self.floating_ips:
-            common_functions.delete_floating_ip(self.nova, fip)
+        if self.floating_ips:
+            bulk.delete_floating_ips(self.nova, self.floating_ips)
         self.floating_ips = []
-        for volume in self.volumes:
-            common_functions.delete_volume(self.cinder, volume)
+        bulk.delete_volumes(self.cinder, [x.id for x in self.volumes])
         self.volumes = []
         for flavor in self.flavors:
             common_functions.delete_flavor(self.nova, flavor.id)
@@ -293,136 +293,109 @@ class NovaIntegrationTests(unittest.TestCase):
                                                      'available', 60),
                 "Volume '{0}' is not available".format(volume.id))
 
+    def get_scale_count(self, flavor, **kwargs):
+        """Returns count of instances for massive spawn tests
+
+        Count is set with NOVA_SCALE_COUNT environment variable (10..1000),
+        test is skipped if it doesn't fit in quota.
+        """
+        count = settings.NOVA_SCALE_COUNT
+        free = bulk.get_free_quota(self.nova, flavor, **kwargs)
+        if free < count:
+            self.skipTest("Quota allows only {0} of {1} instances".format(
+                free, count))
+        return count
+
+    def check_massive_spawn(self, servers, metrics):
+        """Add floating ips to instances and ping all of them at once"""
+        count = len(servers)
+        with metrics.phase('floating_ip', count):
+            fips = bulk.create_floating_ips(self.nova, count,
+                                            fip_list=self.floating_ips)
+            fip_all = [fip_info.ip
+                       for fip_info in self.nova.floating_ips.list()]
+            for fip in fips:
+                self.assertIn(fip.ip, fip_all)
+            fip_dict, latencies = bulk.associate_floating_ips(
+                self.nova, servers, [x.ip for x in fips])
+            metrics.add('floating_ip', latencies.values())
+
+        with metrics.phase('ping', count):
+            latencies, unreachable = bulk.ping_sweep(fip_dict.values())
+            metrics.add('ping', latencies.values())
+        metrics.log_report()
+        self.assertFalse(unreachable, "Instances with floating ips {0} are "
+                                      "not reachable".format(unreachable))
+
     def test_543356_NovaMassivelySpawnVMsWithBootLocal(self):
         """ This test case creates a lot of VMs with boot local, checks it
         state and availability and then deletes it.
             Steps:
-                1. Boot 10-100 instances from image.
+                1. Boot 10-1000 instances from image.
                 2. Check that list of instances contains created VMs.
                 3. Check state of created instances
                 4. Add the floating ips to the instances
                 5. Ping the instances by the floating ips
         """
-        initial_instances = self.nova.servers.list()
         primary_name = "testVM_543356"
-        count = 10
         image_dict = {im.name: im.id for im in self.nova.images.list()}
         image_id = image_dict["TestVM"]
-        flavor_dict = {f.name: f.id for f in self.nova.flavors.list()}
-        flavor_id = flavor_dict["m1.micro"]
+        flavor = self.nova.flavors.find(name="m1.micro")
         networks = self.neutron.list_networks()["networks"]
         net_dict = {net["name"]: net["id"] for net in networks}
         net_internal_id = net_dict["admin_internal_net"]
+        count = self.get_scale_count(flavor, floating_ips=True)
+        metrics = bulk.BulkMetrics()
 
-        self.floating_ips = [self.nova.floating_ips.create()
-                             for _ in xrange(count)]
-        fip_new = [fip_info.ip for fip_info in self.floating_ips]
-        fip_all = [fip_info.ip for fip_info in self.nova.floating_ips.list()]
-        for fip in fip_new:
-            self.assertIn(fip, fip_all)
-
-        self.nova.servers.create(primary_name, image_id, flavor_id,
-                                 max_count=count,
-                                 security_groups=[self.sec_group.name],
-                                 nics=[{"net-id": net_internal_id}])
-        start_time = time()
-        timeout = 5
-        while len(self.nova.servers.list()) < len(initial_instances) + count \
-                and time() < start_time + timeout * 60:
-            sleep(5)
-
-        instances = [inst for inst in self.nova.servers.list()
-                     if inst not in initial_instances]
-        self.instances = [inst.id for inst in instances]
-        for inst_id in self.instances:
-            self.assertTrue(common_functions.check_inst_status(self.nova,
-                                                               inst_id,
-                                                               'ACTIVE'))
-        fip_dict = {}
-        for inst in instances:
-            fip = fip_new.pop()
-            inst.add_floating_ip(fip)
-            fip_dict[inst.id] = fip
-
-        for inst_id in self.instances:
-            self.assertTrue(common_functions.check_ip(
-                self.nova, inst_id, fip_dict[inst_id]))
-
-        for inst_id in self.instances:
-            ping = common_functions.ping_command(fip_dict[inst_id], i=8)
-            self.assertTrue(ping,
-                            "Instance {} is not reachable".format(inst_id))
+        with metrics.phase('boot', count):
+            servers, latencies = bulk.boot_servers(
+                self.nova, primary_name, count, image_id, flavor.id,
+                security_groups=[self.sec_group.name],
+                nics=[{"net-id": net_internal_id}],
+                inst_list=self.instances)
+            metrics.add('boot', latencies.values())
+
+        self.check_massive_spawn(servers, metrics)
 
     def test_543357_NovaMassivelySpawnVMsBootFromCinder(self):
         """ This test case creates a lot of VMs which boot from Cinder, checks
         it state and availability and then deletes it.
             Steps:
-                1. Create 10-100 volumes.
-                2. Boot 10-100 instances from volumes.
+                1. Create 10-1000 volumes.
+                2. Boot 10-1000 instances from volumes.
                 3. Check that list of instances contains created VMs.
                 4. Check state of created instances
                 5. Add the floating ips to the instances
                 6. Ping the instances by the floating ips
         """
-        initial_instances = self.nova.servers.list()
-        count = 10
         primary_name = "testVM_543357"
         image_dict = {im.name: im.id for im in self.nova.images.list()}
         image_id = image_dict["TestVM"]
-        flavor_dict = {f.name: f.id for f in self.nova.flavors.list()}
-        flavor_id = flavor_dict["m1.tiny"]
+        flavor = self.nova.flavors.find(name="m1.tiny")
         networks = self.neutron.list_networks()["networks"]
         net_dict = {net["name"]: net["id"] for net in networks}
         net_internal_id = net_dict["admin_internal_net"]
-
-        initial_volumes = self.cinder.volumes.list()
-        for i in xrange(count):
-            common_functions.create_volume(self.cinder, image_id, size=1)
-        self.volumes = [volume for volume in self.cinder.volumes.list()
-                        if volume not in initial_volumes]
+        count = self.get_scale_count(flavor, floating_ips=True,
+                                     cinder_client=self.cinder)
+        metrics = bulk.BulkMetrics()
+
+        with metrics.phase('volume', count):
+            volumes, latencies = bulk.create_volumes(
+                self.cinder, count, size=1, image_id=image_id,
+                volume_list=self.volumes)
+            metrics.add('volume', latencies.values())
         msg = "Count of created volumes is incorrect!"
-        self.assertEqual(len(self.volumes), 10, msg)
+        self.assertEqual(len(volumes), count, msg)
 
-        self.floating_ips = [self.nova.floating_ips.create()
-                             for _ in xrange(count)]
-        fip_new = [fip_info.ip for fip_info in self.floating_ips]
-        fip_all = [fip_info.ip for fip_info in self.nova.floating_ips.list()]
-        for fip in fip_new:
-            self.assertIn(fip, fip_all)
+        with metrics.phase('boot', count):
+            servers, latencies = bulk.boot_servers_from_volumes(
+                self.nova, primary_name, volumes, flavor.id,
+                security_groups=[self.sec_group.name],
+                nics=[{"net-id": net_internal_id}],
+                inst_list=self.instances)
+            metrics.add('boot', latencies.values())
 
-        for volume in self.volumes:
-            bdm = {'vda': volume.id}
-            self.nova.servers.create(primary_name, '', flavor_id,
-                                     security_groups=[self.sec_group.name],
-                                     block_device_mapping=bdm,
-                                     nics=[{"net-id": net_internal_id}])
-        start_time = time()
-        timeout = 5
-        while len(self.nova.servers.list()) < len(initial_instances) + count \
-                and time() < start_time + timeout * 60:
-            sleep(5)
-
-        instances = [inst for inst in self.nova.servers.list()
-                     if inst not in initial_instances]
-        self.instances = [inst.id for inst in instances]
-        for inst_id in self.instances:
-            self.assertTrue(common_functions.check_inst_status(self.nova,
-                                                               inst_id,
-                                                               'ACTIVE'))
-        fip_dict = {}
-        for inst in instances:
-            fip = fip_new.pop()
-            inst.add_floating_ip(fip)
-            fip_dict[inst.id] = fip
-
-        for inst_id in self.instances:
-            self.assertTrue(common_functions.check_ip(
-                self.nova, inst_id, fip_dict[inst_id]))
-
-        for inst_id in self.instances:
-            ping = common_functions.ping_command(fip_dict[inst_id], i=8)
-            self.assertTrue(ping,
-                            "Instance {} is not reachable".format(inst_id))
+        self.check_massive_spawn(servers, metrics)
 
     def test_2238776_NetworkConnectivityToVMDuringLiveMigration(self):
         """ This test checks network connectivity to VM during Live Migration
@@ -461,25 +434,24 @@ class NovaIntegrationTests(unittest.TestCase):
                        in self.nova.hypervisors.list()}
         old_hyper = getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname")
         new_hyper = [h for h in hypervisors.keys() if h != old_hyper][0]
-        ping = subprocess.Popen(["/bin/ping", "-c100", "-i1", floating_ip.ip],
-                                stdout=subprocess.PIPE)
-        self.nova.servers.live_migrate(inst, new_hyper, block_migration=False,
-                                       disk_over_commit=False)
-        inst = self.nova.servers.get(inst.id)
-        timeout = 5
-        end_time = time() + 60 * timeout
-        while getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname") != \
-                new_hyper:
-            if time() > end_time:
-                msg = "Hypervisor is not changed after live migration"
-                raise AssertionError(msg)
-            sleep(1)
+        meter = OutageMeter(restore=10)
+        meter.add_host_probe(floating_ip.ip)
+        with meter:
+            self.nova.servers.live_migrate(inst, new_hyper,
+                                           block_migration=False,
+                                           disk_over_commit=False)
             inst = self.nova.servers.get(inst.id)
-        self.assertEqual(inst.status, 'ACTIVE')
-        ping.wait()
-        output = ping.stdout.read().split('\n')[-3].split()
-        packets = {'transmitted': int(output[0]), 'received': int(output[3])}
-        loss = packets['transmitted'] - packets['received']
+            timeout = 5
+            end_time = time() + 60 * timeout
+            while getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname") != \
+                    new_hyper:
+                if time() > end_time:
+                    msg = "Hypervisor is not changed after live migration"
+                    raise AssertionError(msg)
+                sleep(1)
+                inst = self.nova.servers.get(inst.id)
+            self.assertEqual(inst.status, 'ACTIVE')
+        loss = meter.report().values()[0]['lost']
         if loss > 5:
             msg = "Packets loss exceeds the limit, {} packets were lost"
             raise AssertionError(msg.format(loss))
@@ -548,25 +520,24 @@ class NovaIntegrationTests(unittest.TestCase):
                        self.nova.hypervisors.list()}
         old_hyper = getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname")
         new_hyper = [h for h in hypervisors.keys() if h != old_hyper][0]
-        ping = subprocess.Popen(["/bin/ping", "-c100", "-i1", floating_ip.ip],
-                                stdout=subprocess.PIPE)
-        self.nova.servers.live_migrate(inst, new_hyper, block_migration=False,
-                                       disk_over_commit=False)
-        inst = self.nova.servers.get(inst.id)
-        timeout = 10
-        end_time = time() + 60 * timeout
-        while getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname") != \
-                new_hyper:
-            if time() > end_time:
-                msg = "Hypervisor is not changed after live migration"
-                raise AssertionError(msg)
-            sleep(1)
+        meter = OutageMeter(restore=10)
+        meter.add_host_probe(floating_ip.ip)
+        with meter:
+            self.nova.servers.live_migrate(inst, new_hyper,
+                                           block_migration=False,
+                                           disk_over_commit=False)
             inst = self.nova.servers.get(inst.id)
-        self.assertEqual(inst.status, 'ACTIVE')
-        ping.wait()
-        output = ping.stdout.read().split('\n')[-3].split()
-        packets = {'transmitted': int(output[0]), 'received': int(output[3])}
-        loss = packets['transmitted'] - packets['received']
+            timeout = 10
+            end_time = time() + 60 * timeout
+            while getattr(inst, "OS-EXT-SRV-ATTR:hypervisor_hostname") != \
+                    new_hyper:
+                if time() > end_time:
+                    msg = "Hypervisor is not changed after live migration"
+                    raise AssertionError(msg)
+                sleep(1)
+                inst = self.nova.servers.get(inst.id)
+            self.assertEqual(inst.status, 'ACTIVE')
+        loss = meter.report().values()[0]['lost']
         if loss > 5:
             msg = "Packets loss exceeds the limit, {} packets were lost"
             raise AssertionError(msg.format(loss))
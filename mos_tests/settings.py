@@ -35,3 +35,11 @@ PUBLIC_TEST_IP = os.environ.get('PUBLIC_TEST_IP', '8.8.8.8')
 # Path to folder with required images
 TEST_IMAGE_PATH = os.path.expanduser('~/images')
 UBUNTU_IPERF_QCOW2 = 'ubuntu-iperf.qcow2'
+
+# Path to SQLite database with tests durations history, history is not
+# stored if it's not set
+DURATIONS_DB = os.environ.get('DURATIONS_DB')
+
+# Count of instances for Nova massive spawn tests (10..1000)
+NOVA_SCALE_COUNT = min(max(int(os.environ.get('NOVA_SCALE_COUNT', 10)), 10),
+                       1000)